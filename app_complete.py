@@ -1,5 +1,7 @@
-from flask import Flask, render_template_string, request, jsonify
+from flask import Flask, render_template_string, request, jsonify, g, Response
 import os
+import json
+import hmac
 try:
     from werkzeug.utils import secure_filename
 except ImportError:
@@ -10,6 +12,10 @@ except ImportError:
 from utils.pdf_processor import PDFProcessor
 from utils.ai_assistant import AIAssistant
 from utils.vector_store import VectorStore
+from utils.namespaces import NamespaceError, NamespaceRegistry
+from utils.single_flight import SingleFlight, normalize_question
+from utils.tracing import TRACER, start_trace, end_trace, render_metrics
+from utils.snapshot import SnapshotError, activate_snapshot
 
 try:
     from dotenv import load_dotenv
@@ -25,11 +31,47 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # Initialize components
 pdf_processor = PDFProcessor()
-vector_store = VectorStore()
+# VECTOR_INDEX_TYPE: "flat" (exact), "sq8" or "pq" (compressed codes with exact re-ranking)
+# VECTOR_SEARCH_SHARDS: number of search worker processes (0 searches in this process)
+# VECTOR_INDEX_PATH: index directory, e.g. a snapshot unpacked by index_snapshot.py import
+# EMBEDDING_MODEL: an index built with another model keeps serving while it is re-embedded in the background
+vector_store_options = dict(
+    index_type=os.getenv("VECTOR_INDEX_TYPE", "flat"),
+    num_shards=int(os.getenv("VECTOR_SEARCH_SHARDS", "0")),
+    dedup_threshold=float(os.getenv("VECTOR_DEDUP_THRESHOLD", "0.95")),
+    mmr_lambda=float(os.getenv("VECTOR_MMR_LAMBDA", "0.7")),
+    route_sections=int(os.getenv("VECTOR_ROUTE_SECTIONS", "0"))
+)
+vector_store = VectorStore(
+    model_name=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+    index_path=os.getenv("VECTOR_INDEX_PATH", "vector_index"),
+    **vector_store_options
+)
+# Per-course indexes (requests with a "course" field), loaded on demand and unloaded
+# least recently used first beyond VECTOR_NAMESPACE_MEMORY_MB
+namespaces = NamespaceRegistry(
+    vector_store,
+    max_memory_mb=int(os.getenv("VECTOR_NAMESPACE_MEMORY_MB", "1024")),
+    **vector_store_options
+)
 ai_assistant = AIAssistant()
+if vector_store.migration_due and vector_store.target_embedder.model:
+    # EMBEDDING_MIGRATION_RATE caps re-embedding in chunks per second (0 = unthrottled)
+    vector_store.migrate_model(max_chunks_per_second=float(os.getenv("EMBEDDING_MIGRATION_RATE", "200")) or None)
 
-# Store for tracking uploaded documents
-uploaded_documents = []
+# Identical questions asked while one is being answered share its retrieval and model call
+ask_flights = SingleFlight("ask")
+
+# Store for tracking uploaded documents, starting with those already in the index (e.g. from bulk_ingest.py)
+uploaded_documents = list(vector_store.get_stats()["sources"])
+
+# Requests sending this header get their stage timings back in the JSON response
+DEBUG_TRACE_HEADER = 'X-StudyMate-Debug'
+
+# POST /snapshot (swap to another index snapshot) is only enabled when a token is configured
+SNAPSHOT_ADMIN_TOKEN = os.getenv("SNAPSHOT_ADMIN_TOKEN")
+ADMIN_TOKEN_HEADER = 'X-StudyMate-Admin-Token'
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
 
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
@@ -682,6 +724,49 @@ HTML_TEMPLATE = '''
 def index():
     return render_template_string(HTML_TEMPLATE, uploaded_files=uploaded_documents)
 
+@app.before_request
+def begin_request_trace():
+    g.trace, g.trace_token = start_trace(f"{request.method} {request.path}")
+
+@app.after_request
+def finish_request_trace(response):
+    trace = g.get('trace')
+    if trace is None or request.endpoint == 'metrics':
+        return response
+    TRACER.observe(f"http.{request.endpoint}", trace.to_dict()['total_ms'] / 1000)
+    
+    # Attach the trace to JSON responses when the caller asked for it
+    if request.headers.get(DEBUG_TRACE_HEADER) and response.is_json:
+        payload = response.get_json()
+        if isinstance(payload, dict):
+            payload['trace'] = trace.to_dict()
+            response.set_data(json.dumps(payload))
+    return response
+
+@app.teardown_request
+def end_request_trace(error=None):
+    token = g.pop('trace_token', None)
+    if token is not None:
+        end_trace(token)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Stage latency histograms in the Prometheus text format"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/migration', methods=['GET'])
+def migration():
+    """Embedding model in use and progress of a background model migration"""
+    status = {"model_name": vector_store.model_name, "migration_due": vector_store.migration_due}
+    if vector_store.migration:
+        status["migration"] = vector_store.migration.progress()
+    return jsonify(status)
+
+@app.route('/namespaces', methods=['GET'])
+def list_namespaces():
+    """Course namespaces and the memory held by the loaded ones"""
+    return jsonify(namespaces.get_stats())
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({"status": "healthy", "message": "StudyMate Flask API is running"})
@@ -693,6 +778,10 @@ def upload():
         if not file or not file.filename.endswith('.pdf'):
             return jsonify({"success": False, "error": "Please upload a valid PDF file."})
         
+        course = request.form.get('course', '')
+        if course:
+            namespaces.path(course)  # Reject an invalid course name before doing any work
+        
         # Save file temporarily
         filename = secure_filename(file.filename)
         temp_path = os.path.join(UPLOAD_FOLDER, filename)
@@ -700,20 +789,27 @@ def upload():
         
         # Process PDF
         try:
-            # Extract text from PDF
-            text = pdf_processor.extract_text_from_pdf(temp_path)
+            # Extract the text of each page from PDF
+            pages = pdf_processor.extract_pages(temp_path)
             
-            if not text.strip():
+            if not pages:
                 return jsonify({"success": False, "error": f"Could not extract text from {filename}. Please ensure it's a text-based PDF."})
             
-            # Create documents for vector store
-            documents = pdf_processor.create_documents(text, filename)
-            
-            # Add to vector store
-            vector_store.add_documents(documents, filename)
+            with namespaces.use(course, create=True) as store:
+                # Chunk only pages that are new or changed since this file was last uploaded,
+                # with page numbers and offsets in the chunk metadata
+                update = pdf_processor.plan_page_update(
+                    pages,
+                    filename,
+                    store.get_page_manifest(filename),
+                    store.get_source_metadata(filename)
+                )
+                
+                # Update the vector store
+                store.apply_page_update(filename, update)
             
             # Track uploaded file
-            if filename not in uploaded_documents:
+            if not course and filename not in uploaded_documents:
                 uploaded_documents.append(filename)
             
             # Clean up temp file
@@ -730,6 +826,108 @@ def upload():
     except Exception as e:
         return jsonify({"success": False, "error": f"Upload error: {str(e)}"})
 
+@app.route('/search', methods=['GET', 'POST'])
+def search():
+    """Exact word and "quoted phrase" search over the ingested documents"""
+    try:
+        query = request.values.get('q', '')
+        if not query.strip():
+            return jsonify({"success": False, "error": "Please enter search terms."})
+        
+        source = request.values.get('source') or None
+        limit = min(request.values.get('limit', 20, type=int), 100)
+        with namespaces.use(request.values.get('course', '')) as store:
+            results = store.keyword_search(query, source=source, limit=limit)
+        
+        return jsonify({
+            "success": True,
+            "query": query,
+            "results": [{
+                "source": result['source'],
+                "page": result['page'],
+                "chunk_id": result['chunk_id'],
+                "context": result['context'],
+                "highlighted": result['highlighted'],
+                "match_count": result['match_count']
+            } for result in results]
+        })
+    
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Search error: {str(e)}"})
+
+@app.route('/page', methods=['GET'])
+def page():
+    """Text of one page of an uploaded document, read from the page store"""
+    source = request.args.get('source', '')
+    number = request.args.get('page', type=int)
+    if not source or number is None:
+        return jsonify({"success": False, "error": "Please give a source and a page number."})
+    
+    try:
+        with namespaces.use(request.args.get('course', '')) as store:
+            stored_page = store.get_page(source, number)
+    except NamespaceError as e:
+        return jsonify({"success": False, "error": str(e)})
+    if stored_page is None:
+        return jsonify({"success": False, "error": f"Page {number} of {source} is not available."})
+    return jsonify({"success": True, **stored_page})
+
+@app.route('/tables', methods=['GET'])
+def tables():
+    """Extracted tables of an uploaded document, optionally of one page or one cited chunk"""
+    source = request.args.get('source', '')
+    if not source:
+        return jsonify({"success": False, "error": "Please give a source."})
+    
+    try:
+        with namespaces.use(request.args.get('course', '')) as store:
+            found = store.get_tables(source, page=request.args.get('page', type=int),
+                                     chunk_id=request.args.get('chunk_id', type=int))
+    except NamespaceError as e:
+        return jsonify({"success": False, "error": str(e)})
+    return jsonify({"success": True, "source": source, "tables": found})
+
+@app.route('/preview', methods=['GET'])
+def preview():
+    """A cited chunk with the surrounding text of its pages"""
+    source = request.args.get('source', '')
+    chunk_id = request.args.get('chunk_id', type=int)
+    if not source or chunk_id is None:
+        return jsonify({"success": False, "error": "Please give a source and a chunk id."})
+    
+    try:
+        with namespaces.use(request.args.get('course', '')) as store:
+            citation = store.get_citation_preview(source, chunk_id)
+    except NamespaceError as e:
+        return jsonify({"success": False, "error": str(e)})
+    if citation is None:
+        return jsonify({"success": False, "error": f"Chunk {chunk_id} of {source} was not found."})
+    return jsonify({"success": True, **citation})
+
+@app.route('/snapshot', methods=['POST'])
+def snapshot():
+    """Import an index snapshot bundle from this machine and serve it without a restart"""
+    token = request.headers.get(ADMIN_TOKEN_HEADER, '')
+    if not SNAPSHOT_ADMIN_TOKEN or not hmac.compare_digest(token, SNAPSHOT_ADMIN_TOKEN):
+        return jsonify({"success": False, "error": "Not allowed."}), 403
+    
+    bundle = (request.get_json(silent=True) or {}).get('bundle', '')
+    if not bundle or not os.path.isfile(bundle):
+        return jsonify({"success": False, "error": f"No snapshot bundle at {bundle!r}."}), 400
+    
+    try:
+        manifest = activate_snapshot(vector_store, bundle, SNAPSHOT_DIR)
+    except (SnapshotError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    uploaded_documents[:] = list(vector_store.get_stats()["sources"])
+    return jsonify({
+        "success": True,
+        "snapshot_id": manifest['snapshot_id'],
+        "total_documents": len(vector_store.documents),
+        "version": vector_store.version
+    })
+
 @app.route('/ask', methods=['POST'])
 def ask():
     try:
@@ -737,25 +935,32 @@ def ask():
         if not question or not question.strip():
             return jsonify({"success": False, "error": "Please enter a question."})
         
-        if not uploaded_documents:
+        course = request.form.get('course', '')
+        if not (namespaces.exists(course) if course else uploaded_documents):
             return jsonify({"success": False, "error": "Please upload a PDF document first before asking questions."})
         
-        # Get relevant context from vector store
-        context = vector_store.get_relevant_context(question, max_tokens=3000)
-        
-        if not context.strip():
-            return jsonify({"success": False, "error": "Could not find relevant information in the uploaded documents."})
-        
-        # Generate answer using AI assistant
-        response = ai_assistant.generate_response(question, context)
-        
-        return jsonify({
-            "success": True, 
-            "answer": response['answer'],
-            "confidence": response.get('confidence', 0),
-            "sources": response.get('sources_used', []),
-            "follow_up_questions": response.get('follow_up_questions', [])
-        })
+        with namespaces.use(course) as store:
+            def answer():
+                # Get relevant context from the course's vector store only
+                context = store.get_relevant_context(question, max_tokens=3000)
+                
+                if not context.strip():
+                    return {"success": False, "error": "Could not find relevant information in the uploaded documents."}
+                
+                # Generate answer using AI assistant
+                response = ai_assistant.generate_response(question, context)
+                
+                return {
+                    "success": True, 
+                    "answer": response['answer'],
+                    "confidence": response.get('confidence', 0),
+                    "sources": response.get('sources_used', []),
+                    "follow_up_questions": response.get('follow_up_questions', [])
+                }
+            
+            # The index version is part of the key, so no one gets an answer from before their upload
+            key = (course, store.version, normalize_question(question))
+            return jsonify(ask_flights.do(key, answer))
     
     except Exception as e:
         return jsonify({"success": False, "error": f"Error processing question: {str(e)}"})
@@ -0,0 +1,127 @@
+"""
+Quantized index benchmark
+
+Compares the current IndexFlatIP against SQ8 and PQ codes (with and without exact
+re-ranking) on synthetic clustered embeddings. Reports resident memory, recall@k
+against exact search, and query latency.
+
+    python benchmarks/bench_quantization.py --vectors 200000 --dimension 384
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.quantized_index import QuantizedVectorIndex
+
+
+def make_corpus(num_vectors: int, dimension: int, num_queries: int, seed: int = 7):
+    """Clustered unit vectors resembling sentence embeddings, plus noisy queries"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(16, num_vectors // 500), dimension)).astype(np.float32)
+    assignments = rng.integers(0, len(centers), num_vectors)
+    corpus = centers[assignments] + 0.6 * rng.standard_normal((num_vectors, dimension)).astype(np.float32)
+    faiss.normalize_L2(corpus)
+
+    queries = corpus[rng.integers(0, num_vectors, num_queries)] + 0.4 * rng.standard_normal(
+        (num_queries, dimension)).astype(np.float32)
+    faiss.normalize_L2(queries)
+    return corpus, queries
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray, k: int) -> float:
+    """Fraction of the exact top-k neighbours that were returned"""
+    hits = sum(len(set(found[i, :k]) & set(truth[i, :k])) for i in range(len(truth)))
+    return hits / float(truth.shape[0] * k)
+
+
+def time_search(index, queries: np.ndarray, k: int):
+    """Search one query at a time (as the app does) and return ids and mean latency in ms"""
+    all_ids = []
+    start = time.perf_counter()
+    for query in queries:
+        _, ids = index.search(query.reshape(1, -1), k)
+        all_ids.append(ids[0])
+    elapsed = time.perf_counter() - start
+    return np.vstack(all_ids), elapsed * 1000 / len(queries)
+
+
+def run(num_vectors: int, dimension: int, num_queries: int, k: int, rerank_factor: int = None) -> dict:
+    corpus, queries = make_corpus(num_vectors, dimension, num_queries)
+
+    flat = faiss.IndexFlatIP(dimension)
+    flat.add(corpus)
+    truth, flat_latency = time_search(flat, queries, k)
+    flat_bytes = num_vectors * dimension * 4
+
+    results = [{
+        'config': 'flat',
+        'memory_bytes': flat_bytes,
+        'memory_saving': 1.0,
+        f'recall@{k}': 1.0,
+        'latency_ms': round(flat_latency, 3)
+    }]
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for index_type in QuantizedVectorIndex.SUPPORTED_TYPES:
+            default_factor = QuantizedVectorIndex(dimension, index_type, os.devnull).rerank_factor
+            for factor in (1, rerank_factor or default_factor):
+                index = QuantizedVectorIndex(
+                    dimension,
+                    index_type=index_type,
+                    vector_path=os.path.join(workdir, f"{index_type}_{factor}.f32"),
+                    rerank_factor=factor
+                )
+                index.add(corpus)
+                found, latency = time_search(index, queries, k)
+                memory = index.memory_usage()
+                results.append({
+                    'config': f"{index_type} rerank x{factor}",
+                    'memory_bytes': memory,
+                    'memory_saving': round(flat_bytes / max(memory, 1), 1),
+                    f'recall@{k}': round(recall_at_k(found, truth, k), 4),
+                    'latency_ms': round(latency, 3)
+                })
+                index.reset()
+
+    return {
+        'vectors': num_vectors,
+        'dimension': dimension,
+        'queries': num_queries,
+        'k': k,
+        'results': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQ8/PQ indexes against IndexFlatIP")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank-factor", type=int, help="Candidates re-ranked per result (default per index type)")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    report = run(args.vectors, args.dimension, args.queries, args.k, args.rerank_factor)
+
+    print(f"{'config':<18}{'memory (MB)':>14}{'saving':>10}{'recall@' + str(args.k):>12}{'latency (ms)':>15}")
+    for row in report['results']:
+        print(f"{row['config']:<18}{row['memory_bytes'] / 1e6:>14.1f}{row['memory_saving']:>9}x"
+              f"{row[f'recall@{args.k}']:>12.4f}{row['latency_ms']:>15.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
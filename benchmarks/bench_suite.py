@@ -0,0 +1,359 @@
+"""
+Ingestion and retrieval benchmark suite
+
+Runs the whole pipeline on generated PDFs (see synthetic_corpus.py) without
+network access and writes one JSON report for regression tracking:
+
+- extraction pages/s per backend (pdfplumber, pymupdf, pypdf2, pdfminer, ocr)
+- chunking and embedding throughput
+- VectorStore add latency per upload and search latency percentiles
+- save_index / load_index time and size on disk
+- SessionVectorStore add and search latency (in process, or through the session service)
+- resident memory after each stage
+
+    python benchmarks/bench_suite.py --pages 200 --json results.json
+    python benchmarks/bench_suite.py --pages 200 --compare results.json
+
+Without a cached sentence-transformers model the stores fall back to hashing
+embeddings (VectorStore) or are skipped (SessionVectorStore); the report records
+which embedder was measured.
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Never reach out to the Hugging Face hub; use a cached model or the fallback
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_corpus import make_pages, make_queries, write_pdf
+from utils.pdf_processor import PDFProcessor
+from utils.vector_store import VectorStore
+
+BACKENDS = ['pdfplumber', 'pymupdf', 'pypdf2', 'pdfminer', 'ocr']
+
+
+def rss_mb() -> float:
+    """Current resident set size"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        import resource  # Peak instead of current outside Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def percentiles(samples_seconds) -> dict:
+    samples = np.asarray(samples_seconds, dtype=np.float64) * 1000
+    if not len(samples):
+        return {}
+    return {
+        'count': int(len(samples)),
+        'mean_ms': round(float(samples.mean()), 3),
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'p99_ms': round(float(np.percentile(samples, 99)), 3),
+        'max_ms': round(float(samples.max()), 3)
+    }
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_extraction(processor: PDFProcessor, pdf_path: str, num_pages: int, backends) -> dict:
+    results = {}
+    for backend in backends:
+        try:
+            pages, seconds = timed(getattr(processor, f"_pages_with_{backend}"), pdf_path)
+        except Exception as e:
+            results[backend] = {'skipped': f"{type(e).__name__}: {e}"}
+            continue
+        results[backend] = {
+            'seconds': round(seconds, 4),
+            'pages_per_s': round(num_pages / seconds, 2) if seconds else None,
+            'pages_with_text': len(pages),
+            'characters': sum(len(page.text) for page in pages)
+        }
+    return results
+
+
+def bench_chunking(processor: PDFProcessor, pdf_path: str) -> tuple:
+    pages, extract_seconds = timed(processor.extract_pages, pdf_path)
+    (text, _, chunks, _), split_seconds = timed(processor.split_pages, pages)
+    documents = processor.create_page_documents(pages, "synthetic.pdf")
+    return documents, {
+        'extract_and_clean_seconds': round(extract_seconds, 4),
+        'characters': len(text),
+        'chunks': len(chunks),
+        'split_seconds': round(split_seconds, 4),
+        'split_mb_per_s': round(len(text) / 1e6 / split_seconds, 2) if split_seconds else None
+    }
+
+
+def bench_embedding(store: VectorStore, texts) -> dict:
+    store.embed_texts(texts[:8])  # Warm up
+    _, seconds = timed(store.embed_texts, texts)
+    return {
+        'embedder': store.model_name if store.embedding_model else 'hashing-fallback',
+        'dimension': store.dimension,
+        'chunks': len(texts),
+        'seconds': round(seconds, 4),
+        'chunks_per_s': round(len(texts) / seconds, 2) if seconds else None
+    }
+
+
+def bench_vector_store(documents, queries, index_type: str, uploads: int, k: int) -> dict:
+    index_path = tempfile.mkdtemp(prefix="studymate_bench_")
+    try:
+        store = VectorStore(index_path=index_path, index_type=index_type)
+        embedding = bench_embedding(store, [doc['content'] for doc in documents])
+
+        # Each upload is one add_documents call, as the app does per PDF
+        add_seconds = []
+        for upload, batch in enumerate(np.array_split(np.arange(len(documents)), uploads)):
+            contents = [documents[i]['content'] for i in batch]
+            metadata = [dict(documents[i]['metadata'], source=f"upload-{upload}.pdf") for i in batch]
+            _, seconds = timed(store.add_documents, contents, metadata)
+            add_seconds.append(seconds)
+
+        search_seconds = [timed(store.search_similar, query['query'], k)[1] for query in queries]
+        context_seconds = [timed(store.get_relevant_context, query['query'])[1] for query in queries]
+
+        _, save_seconds = timed(store.save_index)
+        disk_bytes = sum(os.path.getsize(os.path.join(root, name))
+                         for root, _, names in os.walk(index_path) for name in names)
+        _, load_seconds = timed(store.load_index)
+        chunks_loaded = store.index.ntotal  # load_index falls back to an empty store on errors
+
+        return {
+            'index_type': index_type,
+            'embedding': embedding,
+            'chunks_indexed': store.index.ntotal,
+            'add_latency': percentiles(add_seconds),
+            'search_latency': percentiles(search_seconds),
+            'context_latency': percentiles(context_seconds),
+            'save_seconds': round(save_seconds, 4),
+            'load_seconds': round(load_seconds, 4),
+            'chunks_loaded': chunks_loaded,
+            'disk_mb': round(disk_bytes / 1e6, 3),
+            'rss_mb': round(rss_mb(), 1)
+        }
+    finally:
+        shutil.rmtree(index_path, ignore_errors=True)
+
+
+def bench_sessions(documents, queries, k: int, num_sessions: int, socket_path: str = None) -> dict:
+    spill_dir = None
+    try:
+        if socket_path:
+            # Through a running session service, as the web workers use it
+            from utils.session_service import SessionServiceClient
+            store = SessionServiceClient(socket_path)
+        else:
+            from utils.session_vector_store import SessionVectorStore
+            spill_dir = tempfile.mkdtemp(prefix="studymate_bench_sessions_")
+            store = SessionVectorStore(spill_dir=spill_dir, reaper_interval=0)
+    except Exception as e:
+        return {'skipped': f"{type(e).__name__}: {e}"}
+
+    session_ids = []
+    try:
+        contents = [doc['content'] for doc in documents]
+        metadata = [doc['metadata'] for doc in documents]
+        add_seconds, search_seconds = [], []
+        for _ in range(num_sessions):
+            session_id = store.create_session()
+            session_ids.append(session_id)
+            add_seconds.append(timed(store.add_documents, session_id, contents, metadata)[1])
+            search_seconds.extend(timed(store.search, session_id, query['query'], k)[1] for query in queries)
+        return {
+            'sessions': num_sessions,
+            'service': bool(socket_path),
+            'add_latency': percentiles(add_seconds),
+            'search_latency': percentiles(search_seconds),
+            'rss_mb': round(rss_mb(), 1)
+        }
+    finally:
+        if socket_path:
+            for session_id in session_ids:
+                store.clear_session(session_id)
+        store.close()
+        if spill_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run(args) -> dict:
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'pages': args.pages,
+            'queries': args.queries,
+            'seed': args.seed
+        },
+        'rss_mb': {'start': round(rss_mb(), 1)}
+    }
+
+    workdir = tempfile.mkdtemp(prefix="studymate_bench_pdf_")
+    try:
+        pages = make_pages(args.pages, seed=args.seed)
+        queries = make_queries(pages, args.queries)
+        pdf_path, write_seconds = timed(write_pdf, pages, os.path.join(workdir, "synthetic.pdf"))
+        report['corpus'] = {
+            'pdf_mb': round(os.path.getsize(pdf_path) / 1e6, 3),
+            'write_seconds': round(write_seconds, 3),
+            'pages_by_kind': {kind: sum(1 for page in pages if page['kind'] == kind)
+                              for kind in ('text', 'table', 'image')}
+        }
+
+        processor = PDFProcessor()
+        report['extraction'] = bench_extraction(processor, pdf_path, args.pages, args.backends)
+        report['rss_mb']['after_extraction'] = round(rss_mb(), 1)
+
+        documents, report['chunking'] = bench_chunking(processor, pdf_path)
+        report['rss_mb']['after_chunking'] = round(rss_mb(), 1)
+
+        report['vector_store'] = [bench_vector_store(documents, queries, index_type, args.uploads, args.k)
+                                  for index_type in args.index_types]
+        report['rss_mb']['after_vector_store'] = round(rss_mb(), 1)
+
+        if args.sessions:
+            report['session_store'] = bench_sessions(documents, queries, args.k, args.sessions,
+                                                     args.session_socket)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+# Metrics where a larger number is an improvement; everything else timed is better smaller
+HIGHER_IS_BETTER = ('per_s',)
+TRACKED_SUFFIXES = ('seconds', '_ms', 'per_s', 'disk_mb')
+# Timings below this are mostly timer and scheduler noise
+NOISE_FLOOR_MS = 1.0
+
+
+def flatten(value, prefix: str = "") -> dict:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}.{key}" if prefix else key))
+        return flat
+    if isinstance(value, list):
+        flat = {}
+        for item in value:
+            label = item.get('index_type', '') if isinstance(item, dict) else ''
+            flat.update(flatten(item, f"{prefix}[{label}]"))
+        return flat
+    return {prefix: value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Tracked metrics that got worse than the baseline by more than tolerance"""
+    current, previous = flatten(report), flatten(baseline)
+    regressions = []
+    for name, value in current.items():
+        old = previous.get(name)
+        if not old or not name.endswith(TRACKED_SUFFIXES) or name.startswith('meta.'):
+            continue
+        if name.endswith(('seconds', '_ms')):
+            scale = 1000 if name.endswith('seconds') else 1
+            if max(value, old) * scale < NOISE_FLOOR_MS:
+                continue
+        change = (value - old) / old
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        if worse > tolerance:
+            regressions.append({'metric': name, 'baseline': old, 'current': value,
+                                'change_pct': round(change * 100, 1)})
+    return regressions
+
+
+def print_summary(report: dict):
+    print(f"\nExtraction ({report['meta']['pages']} pages)")
+    for backend, result in report['extraction'].items():
+        rate = result.get('pages_per_s', result.get('skipped'))
+        print(f"  {backend:<12}{rate}")
+    chunking = report['chunking']
+    print(f"Chunking: {chunking['chunks']} chunks, {chunking['split_mb_per_s']} MB/s")
+    for result in report['vector_store']:
+        print(f"VectorStore[{result['index_type']}]: embed {result['embedding']['chunks_per_s']} chunks/s "
+              f"({result['embedding']['embedder']}), add p50 {result['add_latency']['p50_ms']} ms, "
+              f"search p50/p95/p99 {result['search_latency']['p50_ms']}/{result['search_latency']['p95_ms']}/"
+              f"{result['search_latency']['p99_ms']} ms, save {result['save_seconds']}s, load {result['load_seconds']}s")
+    if 'session_store' in report:
+        sessions = report['session_store']
+        if 'skipped' in sessions:
+            print(f"SessionVectorStore: skipped ({sessions['skipped']})")
+        else:
+            print(f"SessionVectorStore: add p50 {sessions['add_latency']['p50_ms']} ms, "
+                  f"search p95 {sessions['search_latency']['p95_ms']} ms")
+    print(f"RSS (MB): {report['rss_mb']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion and retrieval benchmarks on synthetic PDFs")
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--uploads", type=int, default=4, help="add_documents calls the chunks are spread over")
+    parser.add_argument("--sessions", type=int, default=2, help="SessionVectorStore sessions (0 to skip)")
+    parser.add_argument("--session-socket", help="Measure sessions through the session service at this socket")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--index-types", nargs="+", default=["flat"], choices=["flat", "sq8", "pq"])
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON report to check for regressions")
+    parser.add_argument("--verbose", action="store_true", help="Show the stores' own logging")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    # The stores log every call; keep that out of the timings and the summary
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, "w")):
+        report = run(args)
+    print_summary(report)
+
+    if args.compare:
+        with open(args.compare) as f:
+            report['regressions'] = compare(report, json.load(f), args.tolerance)
+        for regression in report['regressions']:
+            print(f"⚠️  {regression['metric']}: {regression['baseline']} -> {regression['current']} "
+                  f"({regression['change_pct']:+}%)")
+        if not report['regressions']:
+            print("No regressions against the baseline")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Text cleaning benchmark
+
+Cleans synthetic textbooks of growing size with the old six-pass regex pipeline and
+with the streaming TextCleaner. Reports time per MB and peak extra memory (as a
+multiple of the input size) so linear time and flat memory are easy to check.
+"stream" builds the full cleaned string; "pages" feeds pages and hands each cleaned
+piece on without keeping it, which shows the cleaner's own working memory.
+
+    python benchmarks/bench_text_cleaning.py --sizes 1 2 4 8 16
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.text_cleaner import TextCleaner
+
+WORDS = ("the cell membrane regulates transport of molecules through diffusion osmosis and active "
+         "transport proteins which require energy in the form of ATP Figure 3 shows the structure "
+         "photosynthesis converts light energy into chemical energy stored in glucose").split()
+
+
+def legacy_clean(text: str) -> str:
+    """The previous PDFProcessor.enhanced_clean_text: six full-document passes"""
+    text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)
+    text = re.sub(r'(\w)-\s*\n\s*(\w)', r'\1\2', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'([.!?])\s*([A-Z])', r'\1\n\n\2', text)
+    text = re.sub(r'\n\s*(\d+\.|\•|\*|\-)\s*', r'\n\1 ', text)
+    text = re.sub(r'[^\w\s\.,;:!?()\-+=/\'"°%$#@&\[\]{}]', '', text)
+    return text.strip()
+
+
+def make_document(size_mb: float, seed: int = 3) -> str:
+    """Page-marked text with line breaks, hyphenation, bullets and stray symbols"""
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    pages = []
+    size = 0
+    page_num = 0
+    while size < target:
+        page_num += 1
+        lines = []
+        for _ in range(40):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(8, 14))]
+            if rng.random() < 0.1:
+                words[-1] = words[-1][:3] + "-"  # Hyphenated across the line break
+            if rng.random() < 0.05:
+                words.insert(0, "•")
+            lines.append(" ".join(words) + rng.choice([".", "", "", ",", "?"]))
+        page = f"\n\n--- Page {page_num} ---\n" + "\n".join(lines)
+        pages.append(page)
+        size += len(page)
+    return "".join(pages)
+
+
+def measure(clean, text: str) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    clean(text)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    size_mb = len(text) / (1024 * 1024)
+    return {
+        'seconds': round(elapsed, 3),
+        'seconds_per_mb': round(elapsed / size_mb, 4),
+        'peak_extra_memory_x_input': round(peak / len(text), 2)
+    }
+
+
+def iter_pages(text: str):
+    """Yield one page at a time, as an extractor would"""
+    start = 0
+    while start < len(text):
+        end = text.find("\n\n--- Page ", start + 1)
+        end = len(text) if end == -1 else end
+        yield text[start:end]
+        start = end
+
+
+def stream_pages(text: str):
+    """Feed the document page by page and discard the cleaned output as it is produced"""
+    cleaner = TextCleaner()
+    cleaned_chars = 0
+    for piece in cleaner.clean_pieces(iter_pages(text)):
+        cleaned_chars += len(piece)
+    return cleaned_chars
+
+
+def run(sizes) -> dict:
+    cleaner = TextCleaner()
+    results = []
+    for size_mb in sizes:
+        text = make_document(size_mb)
+        assert cleaner.clean(text[:200000]) == legacy_clean(text[:200000])
+        results.append({
+            'size_mb': size_mb,
+            'legacy': measure(legacy_clean, text),
+            'streaming': measure(cleaner.clean, text),
+            'pages': measure(stream_pages, text)
+        })
+    return {'results': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the streaming text cleaner against the six-pass pipeline")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    report = run(args.sizes)
+
+    columns = ('legacy', 'streaming', 'pages')
+    print(f"{'size (MB)':>10}" + "".join(f"{name + ' s/MB':>16}{name + ' mem':>14}" for name in columns))
+    for row in report['results']:
+        print(f"{row['size_mb']:>10}" + "".join(
+            f"{row[name]['seconds_per_mb']:>16.4f}{row[name]['peak_extra_memory_x_input']:>13}x" for name in columns))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
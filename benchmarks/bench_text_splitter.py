@@ -0,0 +1,108 @@
+"""
+Text splitter benchmark
+
+Checks that FastTextSplitter produces exactly the chunks of LangChain's
+RecursiveCharacterTextSplitter (PDFProcessor's configuration) and compares split
+throughput and import time. LangChain is only needed for this comparison:
+
+    pip install langchain-text-splitters
+    python benchmarks/bench_text_splitter.py --sizes 1 4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_text_cleaning import make_document
+from utils.text_cleaner import TextCleaner
+from utils.text_splitter import FastTextSplitter
+
+SEPARATORS = ["\n\n\n", "\n\n", "\n", ". ", "? ", "! ", "; ", ", ", " ", ""]
+
+
+def import_seconds(statement: str) -> float:
+    """Wall time of a fresh interpreter running one import"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", statement], check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def best_of(function, text: str, repeats: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(sizes, chunk_size: int, chunk_overlap: int) -> dict:
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+    except ImportError:
+        RecursiveCharacterTextSplitter = None
+        print("langchain-text-splitters is not installed; skipping parity and LangChain timings")
+
+    fast = FastTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=SEPARATORS)
+    reference = None
+    if RecursiveCharacterTextSplitter is not None:
+        reference = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=len, separators=SEPARATORS
+        )
+
+    results = []
+    for size_mb in sizes:
+        raw = make_document(size_mb)
+        # Raw extractor output and cleaned text exercise different separator levels
+        for variant, text in (("raw", raw), ("cleaned", TextCleaner().clean(raw))):
+            row = {'size_mb': size_mb, 'text': variant, 'chunks': len(fast.split_text(text))}
+            fast_seconds = best_of(fast.split_text, text)
+            row['fast_mb_per_s'] = round(size_mb / fast_seconds, 2)
+            if reference is not None:
+                row['parity'] = fast.split_text(text) == reference.split_text(text)
+                row['langchain_mb_per_s'] = round(size_mb / best_of(reference.split_text, text), 2)
+                row['speedup'] = round(row['fast_mb_per_s'] / row['langchain_mb_per_s'], 1)
+            results.append(row)
+
+    report = {
+        'chunk_size': chunk_size,
+        'chunk_overlap': chunk_overlap,
+        'import_seconds': {
+            'fast': round(import_seconds("import utils.text_splitter"), 3)
+        },
+        'results': results
+    }
+    if reference is not None:
+        report['import_seconds']['langchain'] = round(import_seconds("import langchain.text_splitter"), 3)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity and throughput of FastTextSplitter vs LangChain")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4])
+    parser.add_argument("--chunk-size", type=int, default=1200)
+    parser.add_argument("--chunk-overlap", type=int, default=300)
+    parser.add_argument("--json", help="Write results to this JSON file")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    report = run(args.sizes, args.chunk_size, args.chunk_overlap)
+
+    print(f"import time: " + ", ".join(f"{name} {seconds}s" for name, seconds in report['import_seconds'].items()))
+    print(f"{'size (MB)':>10}{'text':>9}{'chunks':>9}{'parity':>8}{'fast MB/s':>11}{'langchain MB/s':>16}{'speedup':>9}")
+    for row in report['results']:
+        print(f"{row['size_mb']:>10}{row['text']:>9}{row['chunks']:>9}{str(row.get('parity', '-')):>8}"
+              f"{row['fast_mb_per_s']:>11}{row.get('langchain_mb_per_s', '-'):>16}{row.get('speedup', '-'):>8}x")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
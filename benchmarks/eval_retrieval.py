@@ -0,0 +1,316 @@
+"""
+Retrieval quality vs speed evaluation
+
+Ingests a corpus into one VectorStore per configuration and scores the same
+labeled questions against each, so an index, quantization, chunking or MMR
+change can be judged on recall as well as latency:
+
+- recall@k: share of a question's targets (pages, answer snippets or chunk ids)
+  found in the top k chunks
+- MRR: reciprocal rank of the first relevant chunk
+- nDCG@k: binary relevance, normalized by the relevant chunks the store holds
+- search latency percentiles and ingest time
+
+The summary ends with a Pareto table: a configuration is marked when no other
+one is at least as accurate and at least as fast.
+
+    python benchmarks/eval_retrieval.py --pages 120 --configs flat sq8 "flat,mmr=0.7" "flat,chunk_size=600"
+    python benchmarks/eval_retrieval.py --pdf notes.pdf --labels notes_labels.json --json eval.json
+    python benchmarks/eval_retrieval.py --pdf notes.pdf --headings
+
+Labels are a JSON list of questions, each with one or more kinds of target:
+
+    [{"query": "What limits the Calvin cycle?", "source": "notes.pdf", "pages": [12],
+      "text": "optional answer snippet", "chunk_ids": [40, 41]}]
+
+Without labels, questions are generated from section headings in the PDFs (the
+heading is the question, the pages of its section are the targets). Chunk ids
+depend on the chunking, so only use them with a fixed chunk_size.
+
+Config strings are comma separated: an index type (flat, sq8, pq) and any of
+shards=N, mmr=LAMBDA, dedup=THRESHOLD (0 disables), chunk_size=N, overlap=N,
+route=SECTIONS (two-level search over that many routed sections).
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import re
+import shutil
+import sys
+import tempfile
+from collections import Counter
+from typing import Dict, List, Optional
+
+# Never reach out to the Hugging Face hub; use a cached model or the fallback
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_suite import git_commit, percentiles, timed
+from synthetic_corpus import make_pages, make_queries, write_pdf
+from utils.chunk_records import ExtractedPage
+from utils.pdf_processor import PDFProcessor
+from utils.vector_store import VectorStore
+
+DEFAULT_CONFIGS = ["flat", "sq8", "pq", "flat,mmr=0.7", "flat,chunk_size=600,overlap=150"]
+QUALITY_METRICS = ('recall', 'mrr', 'ndcg')
+
+NUMBERED_HEADING = re.compile(r'^(?:(?:chapter|section|part|unit|lesson)\s+)?\d+(?:\.\d+)*[.:)]?\s+(?=[A-Za-z])',
+                              re.IGNORECASE)
+WHITESPACE = re.compile(r'\s+')
+
+
+def parse_config(spec: str) -> Dict:
+    config = {'name': spec, 'index_type': 'flat', 'shards': 0, 'mmr': None, 'dedup': 0.95,
+              'chunk_size': 1200, 'overlap': 300, 'route': 0}
+    for part in filter(None, (item.strip() for item in spec.split(','))):
+        if '=' not in part:
+            config['index_type'] = part
+            continue
+        key, value = part.split('=', 1)
+        if key not in config or key in ('name', 'index_type'):
+            raise ValueError(f"Unknown config option '{key}' in '{spec}'")
+        config[key] = float(value) if key in ('mmr', 'dedup') else int(value)
+    if config['index_type'] not in ('flat', 'sq8', 'pq'):
+        raise ValueError(f"Unknown index type '{config['index_type']}' in '{spec}'")
+    return config
+
+
+def _is_heading(line: str, next_line: str) -> bool:
+    words = line.split()
+    if not 2 <= len(words) <= 14 or len(line) > 90 or '|' in line:
+        return False
+    if line[-1] in '.,;:' or not any(c.isalpha() for c in line):
+        return False
+    # A section starts with prose, not with another short line such as a table row
+    if len(next_line.split()) < 4 and next_line[-1] not in '.?!':
+        return False
+    if NUMBERED_HEADING.match(line):
+        return True
+    # Unnumbered headings are mostly capitalized words
+    long_words = [word for word in words if len(word) > 3]
+    return bool(long_words) and sum(word[0].isupper() for word in long_words) >= 0.6 * len(long_words)
+
+
+def heading_questions(raw_pages: List[ExtractedPage], source: str, max_section_pages: int = 3) -> List[Dict]:
+    """One question per section heading; its targets are the pages up to the next heading"""
+    lines_by_page = [(page.number, [line.strip() for line in page.text.splitlines() if line.strip()])
+                     for page in raw_pages]
+    # Running headers and footers repeat on many pages; they are not sections
+    repeats = Counter(line for _, lines in lines_by_page for line in set(lines))
+    repeated = {line for line, count in repeats.items() if count > max(2, len(raw_pages) * 0.3)}
+
+    headings = []
+    for number, lines in lines_by_page:
+        for line, next_line in zip(lines, lines[1:]):
+            if line not in repeated and _is_heading(line, next_line):
+                headings.append((number, NUMBERED_HEADING.sub('', line).strip()))
+
+    questions = []
+    last_page = raw_pages[-1].number if raw_pages else 0
+    for i, (page, title) in enumerate(headings):
+        end = headings[i + 1][0] - 1 if i + 1 < len(headings) else last_page
+        end = min(max(end, page), page + max_section_pages - 1)
+        questions.append({'query': title, 'source': source, 'pages': list(range(page, end + 1))})
+    return questions
+
+
+def _normalize(text: str) -> str:
+    return WHITESPACE.sub(' ', text).strip().lower()
+
+
+def _targets(label: Dict) -> List[tuple]:
+    pages = label.get('pages', label.get('relevant_pages', []))
+    targets = [('page', int(page)) for page in pages]
+    if label.get('text'):
+        targets.append(('text', _normalize(label['text'])))
+    targets.extend(('chunk', int(chunk_id)) for chunk_id in label.get('chunk_ids', []))
+    return targets
+
+
+def _hits(targets: List[tuple], source: Optional[str], content: str, metadata: Dict) -> set:
+    """Targets a stored chunk satisfies"""
+    if source and metadata.get('source') != source:
+        return set()
+    hits = set()
+    normalized = None
+    for kind, value in targets:
+        if kind == 'page':
+            for location in metadata.get('locations') or [metadata]:
+                first = location.get('page')
+                if isinstance(first, int) and first <= value <= location.get('page_end', first):
+                    hits.add((kind, value))
+        elif kind == 'text':
+            normalized = normalized if normalized is not None else _normalize(content)
+            if value in normalized:
+                hits.add((kind, value))
+        elif any(location.get('chunk_id') == value for location in metadata.get('locations') or [metadata]):
+            hits.add((kind, value))
+    return hits
+
+
+def score_question(store: VectorStore, label: Dict, results: List[Dict], k: int) -> Dict:
+    targets = _targets(label)
+    source = label.get('source')
+    found, first_rank, dcg = set(), None, 0.0
+    for rank, result in enumerate(results[:k], 1):
+        hits = _hits(targets, source, result['content'], result['metadata'])
+        if hits:
+            found |= hits
+            first_rank = first_rank or rank
+            dcg += 1 / math.log2(rank + 1)
+
+    # Ideal ranking puts every relevant chunk the store holds first
+    relevant_total = sum(1 for content, metadata in zip(store.documents, store.document_metadata)
+                         if _hits(targets, source, content, metadata))
+    ideal = sum(1 / math.log2(rank + 1) for rank in range(1, min(k, relevant_total) + 1))
+    return {
+        'recall': len(found) / len(targets) if targets else 0.0,
+        'mrr': 1 / first_rank if first_rank else 0.0,
+        'ndcg': dcg / ideal if ideal else 0.0
+    }
+
+
+def load_corpus(processor: PDFProcessor, pdf_paths: List[str]) -> Dict[str, Dict]:
+    """Raw and cleaned pages of every PDF, extracted once for all configurations"""
+    corpus = {}
+    for path in pdf_paths:
+        raw_pages = processor._extract_best_pages(path)
+        pages = []
+        for page in raw_pages:
+            text = processor.enhanced_clean_text(page.text)
+            if text:
+                pages.append(page._replace(text=text))
+        corpus[os.path.basename(path)] = {'raw_pages': raw_pages, 'pages': pages}
+    return corpus
+
+
+def evaluate_config(config: Dict, corpus: Dict[str, Dict], labels: List[Dict], k: int, threshold: float) -> Dict:
+    processor = PDFProcessor(chunk_size=config['chunk_size'], chunk_overlap=config['overlap'])
+    index_path = tempfile.mkdtemp(prefix="studymate_eval_")
+    store = None
+    try:
+        store = VectorStore(index_path=index_path, index_type=config['index_type'], num_shards=config['shards'],
+                            dedup_threshold=config['dedup'] or None, route_sections=config['route'])
+        ingest_seconds = 0.0
+        for source, entry in corpus.items():
+            documents = processor.create_page_documents(entry['pages'], source)
+            _, seconds = timed(store.add_documents, [doc['content'] for doc in documents],
+                               [doc['metadata'] for doc in documents])
+            ingest_seconds += seconds
+
+        store.search_similar(labels[0]['query'], k, threshold, config['mmr'])  # Warm up
+        scores, search_seconds = [], []
+        for label in labels:
+            results, seconds = timed(store.search_similar, label['query'], k, threshold, config['mmr'])
+            search_seconds.append(seconds)
+            scores.append(score_question(store, label, results, k))
+
+        result = {
+            'config': config['name'],
+            'settings': {key: value for key, value in config.items() if key != 'name'},
+            'embedder': store.model_name if store.embedding_model else 'hashing-fallback',
+            'chunks_indexed': store.index.ntotal,
+            'ingest_seconds': round(ingest_seconds, 4),
+            'search_latency': percentiles(search_seconds)
+        }
+        for metric in QUALITY_METRICS:
+            result[metric] = round(sum(score[metric] for score in scores) / len(scores), 4)
+        return result
+    finally:
+        if store is not None:
+            store.close()  # Stops the shard workers, also when the run failed
+        shutil.rmtree(index_path, ignore_errors=True)
+
+
+def pareto_front(results: List[Dict], quality: str, latency: str = 'p95_ms') -> List[str]:
+    """Configs no other config beats on both quality and latency"""
+    front = []
+    for result in results:
+        score, speed = result[quality], result['search_latency'][latency]
+        dominated = any(other is not result and other[quality] >= score
+                        and other['search_latency'][latency] <= speed
+                        and (other[quality] > score or other['search_latency'][latency] < speed)
+                        for other in results)
+        if not dominated:
+            front.append(result['config'])
+    return front
+
+
+def print_table(report: Dict):
+    k, quality = report['meta']['k'], report['meta']['quality']
+    print(f"\n{len(report['meta']['questions'])} questions, k={k}, embedder {report['results'][0]['embedder']}")
+    header = f"{'config':<34}{'chunks':>8}{f'recall@{k}':>11}{'MRR':>8}{f'nDCG@{k}':>9}{'p50 ms':>9}{'p95 ms':>9}{'ingest s':>10}"
+    print(header)
+    print('-' * (len(header) + 8))
+    for result in sorted(report['results'], key=lambda item: item['search_latency']['p95_ms']):
+        marker = '  pareto' if result['config'] in report['pareto'] else ''
+        print(f"{result['config']:<34}{result['chunks_indexed']:>8}{result['recall']:>11.3f}{result['mrr']:>8.3f}"
+              f"{result['ndcg']:>9.3f}{result['search_latency']['p50_ms']:>9.3f}"
+              f"{result['search_latency']['p95_ms']:>9.3f}{result['ingest_seconds']:>10.3f}{marker}")
+    print(f"Pareto front ({quality} vs p95 latency): {', '.join(report['pareto'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall, MRR and nDCG vs latency for VectorStore configurations")
+    parser.add_argument("--pdf", nargs="+", help="Corpus PDFs (default: a generated synthetic corpus)")
+    parser.add_argument("--labels", help="JSON list of labeled questions")
+    parser.add_argument("--headings", action="store_true", help="Also generate questions from section headings")
+    parser.add_argument("--pages", type=int, default=80, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=60, help="Synthetic questions")
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--configs", nargs="+", default=DEFAULT_CONFIGS)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=-1.0,
+                        help="Similarity cutoff applied before scoring (the app uses 0.3)")
+    parser.add_argument("--quality", default="recall", choices=QUALITY_METRICS, help="Metric for the Pareto front")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show the stores' own logging")
+    args = parser.parse_args()
+    configs = [parse_config(spec) for spec in args.configs]
+
+    workdir = tempfile.mkdtemp(prefix="studymate_eval_pdf_")
+    try:
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else open(os.devnull, "w")):
+            labels = []
+            if args.pdf:
+                pdf_paths = args.pdf
+            else:
+                pages = make_pages(args.pages, seed=args.seed, headings=True)
+                pdf_paths = [write_pdf(pages, os.path.join(workdir, "synthetic.pdf"))]
+                if not args.labels:
+                    labels = [dict(query, source="synthetic.pdf") for query in make_queries(pages, args.queries)]
+
+            corpus = load_corpus(PDFProcessor(), pdf_paths)
+            if args.labels:
+                with open(args.labels) as f:
+                    labels = json.load(f)
+            if args.headings or not labels:
+                for source, entry in corpus.items():
+                    labels.extend(heading_questions(entry['raw_pages'], source))
+            if not labels:
+                parser.error("No labeled questions and no headings found in the corpus")
+
+            results = [evaluate_config(config, corpus, labels, args.k, args.threshold) for config in configs]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {'commit': git_commit(), 'k': args.k, 'threshold': args.threshold, 'quality': args.quality,
+                 'sources': list(corpus), 'questions': [label['query'] for label in labels]},
+        'results': results,
+        'pareto': pareto_front(results, args.quality)
+    }
+    print_table(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
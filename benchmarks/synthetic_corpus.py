@@ -0,0 +1,149 @@
+"""
+Synthetic study material for benchmarks
+
+Generates PDFs with PyMuPDF - no network or sample files needed - made of text
+pages, pages with a ruled table and image-only pages (text rendered to a bitmap,
+so only OCR can read them). Every text page is about one topic and contains one
+key sentence (and, with ``headings=True``, a numbered section heading naming it);
+``make_queries`` paraphrases key sentences into questions whose relevant page is
+known, for latency runs and retrieval evaluation.
+
+    python benchmarks/synthetic_corpus.py --pages 50 --output /tmp/synthetic.pdf
+"""
+
+import argparse
+import json
+import random
+from typing import Dict, List
+
+import fitz  # PyMuPDF
+
+TOPICS = {
+    'photosynthesis': ['chlorophyll', 'thylakoid', 'stroma', 'glucose', 'carbon', 'light', 'calvin', 'stomata'],
+    'thermodynamics': ['entropy', 'enthalpy', 'heat', 'temperature', 'equilibrium', 'carnot', 'work', 'reservoir'],
+    'algorithms': ['recursion', 'complexity', 'sorting', 'heap', 'graph', 'dynamic', 'greedy', 'traversal'],
+    'economics': ['inflation', 'demand', 'supply', 'elasticity', 'monopoly', 'tariff', 'interest', 'market'],
+    'genetics': ['allele', 'chromosome', 'mutation', 'genotype', 'phenotype', 'meiosis', 'dominant', 'locus'],
+    'databases': ['transaction', 'index', 'normalization', 'schema', 'query', 'isolation', 'replication', 'join'],
+    'optics': ['refraction', 'lens', 'wavelength', 'diffraction', 'prism', 'focal', 'polarization', 'mirror'],
+    'statistics': ['variance', 'regression', 'sample', 'hypothesis', 'median', 'distribution', 'bias', 'estimator'],
+    'neuroscience': ['neuron', 'synapse', 'axon', 'dendrite', 'cortex', 'potential', 'plasticity', 'receptor'],
+    'geology': ['tectonic', 'magma', 'sediment', 'erosion', 'mineral', 'fault', 'stratum', 'basalt'],
+}
+
+VERBS = ['controls', 'depends on', 'increases', 'limits', 'describes', 'determines', 'reduces', 'explains']
+FILLER = ['In practice', 'By definition', 'For example', 'As a result', 'In most textbooks', 'Typically']
+
+
+def _sentence(rng: random.Random, terms: List[str]) -> str:
+    first, second = rng.sample(terms, 2)
+    return f"{rng.choice(FILLER)}, the {first} {rng.choice(VERBS)} the {second}."
+
+
+def make_pages(num_pages: int, table_every: int = 7, image_every: int = 11, seed: int = 5,
+               headings: bool = False) -> List[Dict]:
+    """Page specs: kind ('text', 'table' or 'image'), topic, paragraphs, the key sentence and heading"""
+    rng = random.Random(seed)
+    topic_names = sorted(TOPICS)
+    pages = []
+    for number in range(1, num_pages + 1):
+        topic = topic_names[rng.randrange(len(topic_names))]
+        terms = TOPICS[topic]
+        kind = 'text'
+        if image_every and number % image_every == 0:
+            kind = 'image'
+        elif table_every and number % table_every == 0:
+            kind = 'table'
+
+        # The key sentence pairs two terms with a page-specific quantity, so it is unique
+        key_terms = rng.sample(terms, 2)
+        key_sentence = (f"The {key_terms[0]} of {topic} measured in experiment {number} "
+                        f"changes the {key_terms[1]} by {rng.randint(2, 97)} percent.")
+        paragraphs = [' '.join(_sentence(rng, terms) for _ in range(rng.randint(3, 6))) for _ in range(4)]
+        paragraphs.insert(rng.randint(0, len(paragraphs)), key_sentence)
+        heading = f"{number}. The {key_terms[0].title()} and the {key_terms[1].title()} in {topic.title()}"
+        pages.append({
+            'number': number,
+            'kind': kind,
+            'topic': topic,
+            'key_terms': key_terms,
+            'key_sentence': key_sentence,
+            'heading': heading if headings else None,
+            'paragraphs': paragraphs,
+            'table': [[topic.title(), 'Value', 'Unit']] + [[term, str(rng.randint(1, 999)), 'mg'] for term in terms[:5]]
+        })
+    return pages
+
+
+def _draw_table(page, rows: List[List[str]], top: float):
+    """A ruled table that pdfplumber's table finder detects"""
+    left, cell_width, cell_height = 72, 140, 18
+    for r, row in enumerate(rows):
+        for c, cell in enumerate(row):
+            rect = fitz.Rect(left + c * cell_width, top + r * cell_height,
+                             left + (c + 1) * cell_width, top + (r + 1) * cell_height)
+            page.draw_rect(rect, color=(0, 0, 0), width=0.5)
+            page.insert_text((rect.x0 + 4, rect.y1 - 5), cell, fontsize=9)
+    return top + len(rows) * cell_height
+
+
+def write_pdf(pages: List[Dict], path: str) -> str:
+    doc = fitz.open()
+    for spec in pages:
+        text = "\n\n".join(spec['paragraphs'])
+        if spec.get('heading'):
+            text = f"{spec['heading']}\n{text}"
+        if spec['kind'] == 'image':
+            # Render the page on its own, then keep only the bitmap
+            scratch = fitz.open()
+            scratch_page = scratch.new_page()
+            scratch_page.insert_textbox(fitz.Rect(72, 72, 540, 760), text, fontsize=10)
+            pixmap = scratch_page.get_pixmap(dpi=110)
+            scratch.close()
+            page = doc.new_page()
+            page.insert_image(page.rect, pixmap=pixmap)
+            continue
+
+        page = doc.new_page()
+        text_bottom = 72 + 500 if spec['kind'] == 'table' else 760
+        page.insert_textbox(fitz.Rect(72, 72, 540, text_bottom), text, fontsize=10)
+        if spec['kind'] == 'table':
+            _draw_table(page, spec['table'], text_bottom + 20)
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def make_queries(pages: List[Dict], num_queries: int, seed: int = 11) -> List[Dict]:
+    """Questions about key sentences, each with the page that answers it"""
+    rng = random.Random(seed)
+    readable = [spec for spec in pages if spec['kind'] != 'image']
+    queries = []
+    for spec in rng.sample(readable, min(num_queries, len(readable))):
+        first, second = spec['key_terms']
+        queries.append({
+            'query': f"How does the {first} in experiment {spec['number']} affect the {second} in {spec['topic']}?",
+            'relevant_pages': [spec['number']],
+            'topic': spec['topic']
+        })
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic study PDF and its query set")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--output", default="synthetic.pdf")
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    pages = make_pages(args.pages, seed=args.seed)
+    write_pdf(pages, args.output)
+    query_path = args.output.rsplit('.', 1)[0] + "_queries.json"
+    with open(query_path, "w") as f:
+        json.dump(make_queries(pages, args.queries), f, indent=2)
+    print(f"Wrote {args.output} ({args.pages} pages) and {query_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Bulk offline ingestion of a directory of PDFs into the vector store
+
+Walks a directory for PDFs and ingests them the way /upload does (page extraction,
+page-diff chunking, deduplication, page and table stores), with these differences:
+
+- extraction, cleaning, chunking and embedding run in a pool of worker processes
+- finished files are committed in batches: one published generation and one
+  save_index per batch instead of per file
+- every committed file is appended to a checkpoint (JSON lines), so an interrupted
+  run resumes where it stopped; files changed since their checkpoint entry are
+  ingested again, re-embedding only their changed pages
+
+    python bulk_ingest.py /srv/course-library --workers 4
+    python bulk_ingest.py /srv/course-library --report ingest_report.json
+
+Sources are named by their path relative to the directory. Each worker loads its
+own copy of the embedding model; without the model, embedding happens in this
+process with the hashing fallback, which is cheap enough not to need the pool.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHECKPOINT_FILE = "bulk_ingest_checkpoint.jsonl"
+
+# Per-process state of the pool workers
+_worker = {}
+
+
+def find_pdfs(root: str) -> List[str]:
+    paths = []
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories.sort()
+        paths.extend(os.path.join(directory, name) for name in sorted(filenames) if name.lower().endswith(".pdf"))
+    return paths
+
+
+def read_checkpoint(path: str) -> Dict[str, Dict]:
+    """Last checkpoint entry of every source (a torn last line from a crash is ignored)"""
+    entries = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                entries[entry['source']] = entry
+    return entries
+
+
+def _init_worker(model_name: str, chunk_size: int, chunk_overlap: int, embed: bool):
+    # Quiet workers: the parent reports progress
+    sys.stdout = open(os.devnull, "w")
+    from utils.pdf_processor import PDFProcessor
+    _worker['processor'] = PDFProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    _worker['store'] = None
+    if embed:
+        from utils.vector_store import VectorStore
+        # A private empty store that is never saved: only its document preparation and model are used
+        index_path = os.path.join(tempfile.gettempdir(), f"studymate_bulk_worker_{os.getpid()}")
+        _worker['store'] = VectorStore(model_name=model_name, index_path=index_path)
+
+
+def _process_file(path: str, source: str, old_manifest, old_metadata) -> Dict:
+    """Extract, chunk and (with a model) embed one PDF in a worker process"""
+    from utils.page_diff import PageManifest
+    processor, store = _worker['processor'], _worker['store']
+    result = {'source': source, 'path': path, 'timings': {}}
+    try:
+        start = time.perf_counter()
+        pages = processor.extract_pages(path)
+        result['timings']['extract'] = time.perf_counter() - start
+        result['pages'] = len(pages)
+        if not pages:
+            result['status'] = 'empty'
+            return result
+
+        start = time.perf_counter()
+        manifest = PageManifest.from_dict(old_manifest) if old_manifest else None
+        update = processor.plan_page_update(pages, source, manifest, old_metadata)
+        result['timings']['chunk'] = time.perf_counter() - start
+        result['update'] = update
+        result['chunks'] = len(update.documents)
+        result['characters'] = sum(len(page.text) for page in pages)
+
+        if store is not None and store.embedding_model is not None and update.documents:
+            start = time.perf_counter()
+            documents, metadata = store._prepare_documents(
+                [doc['content'] for doc in update.documents], [doc['metadata'] for doc in update.documents])
+            result['prepared'] = (documents, metadata, store.embed_texts(documents))
+            result['timings']['embed'] = time.perf_counter() - start
+        result['status'] = 'done'
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+class BulkIngester:
+    """Feeds PDFs through a process pool and commits the results to a VectorStore in batches"""
+
+    def __init__(self, vector_store, root: str, checkpoint_path: str, workers: int, batch_chunks: int,
+                 embed_in_workers: bool, chunk_size: int, chunk_overlap: int, retry_failed: bool = False):
+        self.vector_store = vector_store
+        self.root = root
+        self.checkpoint_path = checkpoint_path
+        self.workers = workers
+        self.batch_chunks = batch_chunks
+        self.embed_in_workers = embed_in_workers and vector_store.embedding_model is not None
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.retry_failed = retry_failed
+        self.worker_model = vector_store.model_name
+
+        self.stats = {'files_found': 0, 'files_skipped': 0, 'files_done': 0, 'files_failed': 0, 'files_empty': 0,
+                      'pages': 0, 'chunks': 0, 'characters': 0, 'bytes': 0, 'batches': 0,
+                      'worker_seconds': {'extract': 0.0, 'chunk': 0.0, 'embed': 0.0}, 'commit_seconds': 0.0}
+        self.failures = []
+        self._batch = []
+        self._batch_size = 0
+
+    def pending_files(self) -> List[tuple]:
+        """(path, source, size, mtime) of files not yet ingested in their current version"""
+        checkpoint = read_checkpoint(self.checkpoint_path)
+        pending = []
+        for path in find_pdfs(self.root):
+            source = os.path.relpath(path, self.root).replace(os.sep, "/")
+            stat = os.stat(path)
+            entry = checkpoint.get(source)
+            self.stats['files_found'] += 1
+            unchanged = entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime
+            if unchanged and entry['status'] == 'failed' and self.retry_failed:
+                unchanged = False
+            # Done files are skipped only while the store still has them
+            if unchanged and (entry['status'] != 'done' or source in self.vector_store.page_manifests):
+                self.stats['files_skipped'] += 1
+                continue
+            pending.append((path, source, stat.st_size, stat.st_mtime))
+        return pending
+
+    def run(self) -> Dict:
+        started = time.perf_counter()
+        pending = self.pending_files()
+        print(f"📚 {self.stats['files_found']} PDFs found, {self.stats['files_skipped']} already ingested, "
+              f"{len(pending)} to process with {self.workers} workers")
+
+        context = multiprocessing.get_context("spawn")  # Never fork a process holding model and FAISS threads
+        self.worker_model = self.vector_store.model_name
+        with ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(self.worker_model, self.chunk_size, self.chunk_overlap,
+                                           self.embed_in_workers)) as pool:
+            queue = iter(pending)
+            running = {}
+            # Keep a bounded number of files in flight so results never pile up in memory
+            for _ in range(self.workers * 2):
+                self._submit(pool, queue, running)
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path, source, size, mtime = running.pop(future)
+                    self._collect(future.result(), size, mtime)
+                    self._submit(pool, queue, running)
+            self._commit()
+
+        self.stats['wall_seconds'] = time.perf_counter() - started
+        return self.report()
+
+    def _submit(self, pool, queue, running):
+        item = next(queue, None)
+        if item is None:
+            return
+        path, source, _, _ = item
+        old_metadata = self.vector_store.get_source_metadata(source) if source in self.vector_store.page_manifests \
+            else []
+        old_manifest = self.vector_store.page_manifests.get(source)
+        running[pool.submit(_process_file, path, source, old_manifest, old_metadata)] = item
+
+    def _collect(self, result: Dict, size: int, mtime: float):
+        for stage, seconds in result['timings'].items():
+            self.stats['worker_seconds'][stage] += seconds
+        entry = {'source': result['source'], 'size': size, 'mtime': mtime, 'status': result['status']}
+
+        if result['status'] != 'done':
+            self.stats[f"files_{result['status']}"] += 1
+            if result['status'] == 'failed':
+                entry['error'] = result['error']
+                self.failures.append(entry)
+                print(f"❌ {result['source']}: {result['error']}")
+            self._write_checkpoint([entry])
+            return
+
+        entry.update(pages=result['pages'], chunks=result['chunks'])
+        self._batch.append((result, entry, size))
+        self._batch_size += result['chunks']
+        if self._batch_size >= self.batch_chunks:
+            self._commit()
+
+    def _commit(self):
+        """Publish and save the batch, then checkpoint its files"""
+        if not self._batch:
+            return
+        start = time.perf_counter()
+        updates = {result['source']: result['update'] for result, _, _ in self._batch}
+        prepared = {result['source']: result['prepared'] for result, _, _ in self._batch if 'prepared' in result}
+        # Workers embedded with the model the store had when they started
+        self.vector_store.apply_page_updates(updates, prepared, embedded_by=self.worker_model)
+        self.stats['commit_seconds'] += time.perf_counter() - start
+
+        self._write_checkpoint([entry for _, entry, _ in self._batch])
+        for result, _, size in self._batch:
+            self.stats['files_done'] += 1
+            self.stats['pages'] += result['pages']
+            self.stats['chunks'] += result['chunks']
+            self.stats['characters'] += result['characters']
+            self.stats['bytes'] += size
+        self.stats['batches'] += 1
+        print(f"💾 Committed {len(self._batch)} files ({self._batch_size} chunks) - "
+              f"{self.stats['files_done']} done, {self.stats['files_failed']} failed")
+        self._batch, self._batch_size = [], 0
+
+    def _write_checkpoint(self, entries: List[Dict]):
+        with open(self.checkpoint_path, "a") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def report(self) -> Dict:
+        stats = self.stats
+        wall = stats.get('wall_seconds') or 1e-9
+        return dict(stats, failures=self.failures, throughput={
+            'files_per_s': round(stats['files_done'] / wall, 3),
+            'pages_per_s': round(stats['pages'] / wall, 2),
+            'chunks_per_s': round(stats['chunks'] / wall, 2),
+            'mb_per_s': round(stats['bytes'] / 1e6 / wall, 3)
+        }, embedding='workers' if self.embed_in_workers else 'main process')
+
+
+def print_report(report: Dict):
+    throughput = report['throughput']
+    print("\n📊 Bulk ingestion report")
+    print(f"   • Files: {report['files_done']} ingested, {report['files_skipped']} skipped, "
+          f"{report['files_empty']} without text, {report['files_failed']} failed")
+    print(f"   • Content: {report['pages']} pages, {report['chunks']} chunks, {report['bytes'] / 1e6:.1f} MB of PDF")
+    print(f"   • Wall time: {report['wall_seconds']:.1f}s in {report['batches']} batches "
+          f"(commits {report['commit_seconds']:.1f}s, embedding in {report['embedding']})")
+    workers = report['worker_seconds']
+    print(f"   • Worker time: extract {workers['extract']:.1f}s, chunk {workers['chunk']:.1f}s, "
+          f"embed {workers['embed']:.1f}s")
+    print(f"   • Throughput: {throughput['files_per_s']} files/s, {throughput['pages_per_s']} pages/s, "
+          f"{throughput['chunks_per_s']} chunks/s, {throughput['mb_per_s']} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a directory of PDFs into the StudyMate vector store")
+    parser.add_argument("directory", help="Directory searched recursively for PDFs")
+    parser.add_argument("--index-path", default="vector_index")
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+                        help="Embedding model (the one the server is configured with)")
+    parser.add_argument("--index-type", default=os.getenv("VECTOR_INDEX_TYPE", "flat"), choices=["flat", "sq8", "pq"])
+    parser.add_argument("--shards", type=int, default=int(os.getenv("VECTOR_SEARCH_SHARDS", "0")))
+    parser.add_argument("--dedup-threshold", type=float, default=float(os.getenv("VECTOR_DEDUP_THRESHOLD", "0.95")))
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 2) - 1, 1))
+    parser.add_argument("--batch-chunks", type=int, default=4096, help="Chunks per committed batch")
+    parser.add_argument("--chunk-size", type=int, default=1200)
+    parser.add_argument("--chunk-overlap", type=int, default=300)
+    parser.add_argument("--embed-in-main", action="store_true",
+                        help="Embed in this process instead of loading the model in every worker")
+    parser.add_argument("--retry-failed", action="store_true", help="Process files that failed in an earlier run")
+    parser.add_argument("--checkpoint", help=f"Checkpoint file (default: <index-path>/{CHECKPOINT_FILE})")
+    parser.add_argument("--report", help="Write the throughput report to this JSON file")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"{args.directory} is not a directory")
+
+    from utils.vector_store import VectorStore
+    vector_store = VectorStore(model_name=args.model, index_path=args.index_path, index_type=args.index_type,
+                               num_shards=args.shards, dedup_threshold=args.dedup_threshold or None)
+    os.makedirs(args.index_path, exist_ok=True)
+    ingester = BulkIngester(
+        vector_store,
+        root=args.directory,
+        checkpoint_path=args.checkpoint or os.path.join(args.index_path, CHECKPOINT_FILE),
+        workers=args.workers,
+        batch_chunks=args.batch_chunks,
+        embed_in_workers=not args.embed_in_main,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        retry_failed=args.retry_failed
+    )
+    try:
+        report = ingester.run()
+    except KeyboardInterrupt:
+        print("\n⏸️ Interrupted - committed files are checkpointed; run again to resume")
+        sys.exit(130)
+
+    print_report(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if report['files_failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Export, verify, import and activate portable index snapshots
+
+Build the index once (uploads or bulk_ingest.py), export it, and ship the bundle
+to any number of read-serving nodes:
+
+    python index_snapshot.py export --index-path vector_index course-2024-10.snap
+    python index_snapshot.py verify course-2024-10.snap
+    python index_snapshot.py import course-2024-10.snap --snapshots-dir snapshots
+    python index_snapshot.py activate course-2024-10.snap --server http://node-3:8001
+
+``import`` unpacks a verified copy for a node that is not running yet; start it with
+VECTOR_INDEX_PATH set to the printed directory. ``activate`` asks a running server
+to import the bundle (a path on the server's machine) and swap to it without a
+restart; the server must have SNAPSHOT_ADMIN_TOKEN set and the same token is read
+from this environment.
+"""
+
+import argparse
+import json
+import os
+import sys
+import urllib.error
+import urllib.request
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from utils.snapshot import INDEX_INFO_FILE, SnapshotError, export_snapshot, import_snapshot, verify_snapshot
+
+ADMIN_TOKEN_HEADER = "X-StudyMate-Admin-Token"
+
+
+def describe(manifest: dict) -> str:
+    info = manifest['index']
+    size = sum(entry['size'] for entry in manifest['files'].values())
+    return (f"{manifest['snapshot_id']}: {info['model_name']} ({info['embedder']}, {info['dimension']}d, "
+            f"{info['index_type']}{', sharded' if info.get('sharded') else ''}), "
+            f"{len(manifest['files'])} files, {size / 1e6:.1f} MB")
+
+
+def export_command(args):
+    if not os.path.exists(os.path.join(args.index_path, INDEX_INFO_FILE)):
+        # Indexes saved before index_info.json existed: load and save once to write it
+        from utils.vector_store import VectorStore
+        vector_store = VectorStore(index_path=args.index_path, index_type=args.index_type, num_shards=args.shards)
+        if not vector_store.documents:
+            raise SnapshotError(f"No index could be loaded from {args.index_path}")
+        vector_store.save_index()
+    manifest = export_snapshot(args.index_path, args.bundle)
+    print(f"📦 Exported {describe(manifest)} to {args.bundle}")
+
+
+def verify_command(args):
+    manifest = verify_snapshot(args.bundle)
+    print(f"✅ {describe(manifest)} - all checksums match")
+
+
+def import_command(args):
+    path, manifest = import_snapshot(args.bundle, args.snapshots_dir)
+    print(f"📥 Imported {describe(manifest)}")
+    print(f"   Start a server on it with VECTOR_INDEX_PATH={path}")
+
+
+def activate_command(args):
+    token = os.getenv("SNAPSHOT_ADMIN_TOKEN")
+    if not token:
+        raise SnapshotError("Set SNAPSHOT_ADMIN_TOKEN to the server's token")
+    request = urllib.request.Request(
+        args.server.rstrip("/") + "/snapshot",
+        data=json.dumps({'bundle': args.bundle}).encode('utf-8'),
+        headers={'Content-Type': 'application/json', ADMIN_TOKEN_HEADER: token},
+        method="POST"
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=args.timeout) as response:
+            result = json.load(response)
+    except urllib.error.HTTPError as e:
+        raise SnapshotError(f"Server refused the snapshot: {e.read().decode('utf-8', 'replace')}")
+    print(f"🔀 {args.server} now serves snapshot {result['snapshot_id']} "
+          f"({result['total_documents']} chunks, version {result['version']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Portable StudyMate index snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Write a saved index to a snapshot bundle")
+    export.add_argument("bundle", help="Bundle file to write")
+    export.add_argument("--index-path", default=os.getenv("VECTOR_INDEX_PATH", "vector_index"))
+    export.add_argument("--index-type", default=os.getenv("VECTOR_INDEX_TYPE", "flat"), choices=["flat", "sq8", "pq"])
+    export.add_argument("--shards", type=int, default=int(os.getenv("VECTOR_SEARCH_SHARDS", "0")))
+    export.set_defaults(handler=export_command)
+
+    verify = commands.add_parser("verify", help="Check every file of a bundle against its manifest")
+    verify.add_argument("bundle")
+    verify.set_defaults(handler=verify_command)
+
+    importer = commands.add_parser("import", help="Unpack a verified bundle for a server to start on")
+    importer.add_argument("bundle")
+    importer.add_argument("--snapshots-dir", default=os.getenv("SNAPSHOT_DIR", "snapshots"))
+    importer.set_defaults(handler=import_command)
+
+    activate = commands.add_parser("activate", help="Make a running server swap to a bundle")
+    activate.add_argument("bundle", help="Path of the bundle on the server's machine")
+    activate.add_argument("--server", default="http://localhost:8001")
+    activate.add_argument("--timeout", type=float, default=600)
+    activate.set_defaults(handler=activate_command)
+
+    args = parser.parse_args()
+    try:
+        args.handler(args)
+    except (SnapshotError, OSError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from utils.single_flight import SingleFlight, normalize_question
+
+
+def test_case_spacing_and_closing_punctuation_are_folded():
+    assert normalize_question("  What is   photosynthesis?? ") == normalize_question("what is photosynthesis")
+    assert normalize_question("Explain recursion!") == normalize_question("explain recursion.")
+
+
+def test_operator_bearing_questions_stay_distinct():
+    questions = ["What is 2+2?", "what is 2-2", "What is 2*2", "What is 2/2", "What is 2 2"]
+    assert len({normalize_question(question) for question in questions}) == len(questions)
+    assert normalize_question("Explain C++") != normalize_question("Explain C")
+    assert normalize_question("Explain C#") != normalize_question("Explain C")
+
+
+def test_concurrent_calls_share_one_computation():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flights.do("key", compute)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flights.do("key", compute))) for _ in range(5)]
+    for follower in followers:
+        follower.start()
+    deadline = time.monotonic() + 5
+    while flights.get_stats()['waiting'] < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    waiting = flights.get_stats()['waiting']
+    release.set()
+    assert waiting == 5, "followers did not join the running computation"
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == ["answer"] * 6
+    assert flights.get_stats() == {'computed': 1, 'coalesced': 5, 'in_flight': 0, 'waiting': 0}
+
+
+def test_distinct_keys_do_not_share_results():
+    flights = SingleFlight()
+    assert flights.do(normalize_question("What is 2+2?"), lambda: 4) == 4
+    assert flights.do(normalize_question("What is 2-2?"), lambda: 0) == 0
@@ -5,6 +5,7 @@ import tiktoken
 from datetime import datetime
 import requests
 import json
+from utils.tracing import span, traced
 
 load_dotenv()
 
@@ -71,6 +72,7 @@ FORMAT REQUIREMENTS:
             # Fallback: approximate 4 characters per token
             return len(text) // 4
 
+    @traced("ai_assistant.generate_response")
     def generate_response(self, question: str, context: str, chat_history: list = None) -> dict:
         """Generate highly accurate response using IBM Granite"""
         try:
@@ -158,8 +160,9 @@ CRITICAL: Do not add information not present in the context. Be precise and cite
                 "apikey": self.ibm_api_key
             }
             
-            token_response = requests.post(token_url, headers=token_headers, data=token_data)
-            access_token = token_response.json()["access_token"]
+            with span("ai_assistant.iam_token"):
+                token_response = requests.post(token_url, headers=token_headers, data=token_data)
+                access_token = token_response.json()["access_token"]
             
             # Prepare the request for IBM Granite
             headers = {
@@ -183,7 +186,8 @@ CRITICAL: Do not add information not present in the context. Be precise and cite
                 "project_id": self.ibm_project_id
             }
             
-            response = requests.post(self.ibm_url, headers=headers, data=json.dumps(body))
+            with span("ai_assistant.granite_generate", model=self.model):
+                response = requests.post(self.ibm_url, headers=headers, data=json.dumps(body))
             
             if response.status_code == 200:
                 result = response.json()
@@ -302,6 +306,7 @@ CRITICAL: Do not add information not present in the context. Be precise and cite
         """Backward compatibility method - delegates to enhanced version"""
         return self._calculate_enhanced_confidence(context, query, "")
 
+    @traced("ai_assistant.follow_up_questions")
     def _generate_follow_up_questions(self, original_query: str, response: str, context: str = "") -> List[str]:
         """Generate more targeted and context-aware follow-up questions"""
         try:
@@ -0,0 +1,271 @@
+"""
+Single-pass chunk analysis.
+
+PDFProcessor and VectorStore both derive metadata from every chunk: content type,
+academic elements, key concepts and phrases, text quality and page number. This
+module computes those features with precompiled patterns, lowercasing each chunk
+once and finding every keyword category with a single scan.
+"""
+
+from typing import Dict, Iterable, List, Set
+from collections import Counter
+from itertools import filterfalse
+import re
+
+try:
+    import ahocorasick  # pyahocorasick: C Aho-Corasick automaton
+except ImportError:
+    ahocorasick = None
+
+# Patterns shared by PDFProcessor and VectorStore, compiled once at import
+LIST_PATTERN = re.compile(r'\d+\.\s|\•\s|\*\s')
+REFERENCE_PATTERN = re.compile(r'figure\s+\d+|table\s+\d+|diagram')
+PAGE_MARKER_PATTERN = re.compile(r'--- Page (\d+) ---')
+UNREADABLE_CHAR_PATTERN = re.compile(r'[^a-zA-Z0-9\s\.,;:!?()\-]')
+QUALITY_PATTERNS = [re.compile(p) for p in (r'\b\w+\b', r'[.!?]', r'\d+', r'[A-Z][a-z]+')]
+
+# PDFProcessor key concepts: capitalized terms or lowercase (underscore) terms, in order of appearance
+CONCEPT_PATTERN = re.compile(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b|\b[a-z]+(?:_[a-z]+)*\b')
+CONCEPT_STOPWORDS = {'page', 'chapter', 'section'}
+
+# VectorStore key phrases. Leading \b checks are done by hand so the engine only tries
+# positions that can start a match: capital letters for phrases, and underscore or
+# camelCase joins for technical terms
+CAPITALIZED_PHRASE_PATTERN = re.compile(r'[A-Z][a-z]+(?:\s+[A-Z][a-z]+)+\b')
+TECHNICAL_TERM_PATTERN = re.compile(r'[a-z]+(?:_[a-z]+)+\b|[a-z]+[A-Z][a-z]+\b')
+TECHNICAL_TERM_HINT = re.compile(r'[a-z][_A-Z]')
+LOWERCASE = frozenset('abcdefghijklmnopqrstuvwxyz')
+IMPORTANT_WORD_PATTERN = re.compile(r'\b[a-zA-Z]{6,}\b')
+COMMON_WORDS = {'system', 'process', 'example', 'definition', 'important', 'different', 'various', 'general'}
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Regex for a set of literals laid out as a prefix trie
+
+    Every branch point tests one character, so the engine walks the keyword set like
+    an Aho-Corasick goto function instead of retrying each keyword at every position.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}  # End of a keyword
+
+    def build(node: Dict) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Finds which keyword categories occur (as substrings) in a text with one scan
+
+    Uses a pyahocorasick automaton when the package is installed and a trie-shaped
+    regex otherwise; both report exactly the categories of substring matching.
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]]):
+        keyword_categories = {}
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                keyword_categories.setdefault(keyword.lower(), set()).add(category)
+        self._category_count = len(categories)
+
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for keyword, keyword_cats in keyword_categories.items():
+                self._automaton.add_word(keyword, frozenset(keyword_cats))
+            self._automaton.make_automaton()
+            return
+        self._automaton = None
+
+        # The scan reports the longest keyword starting at each position, so a match also
+        # stands for every shorter keyword that is a prefix of it
+        self._categories = {
+            keyword: frozenset().union(*(cats for other, cats in keyword_categories.items()
+                                         if keyword.startswith(other)))
+            for keyword in keyword_categories
+        }
+        # Zero-width lookahead finds overlapping matches at every start position
+        self._pattern = re.compile(f'(?=({_trie_pattern(keyword_categories)}))')
+
+    def match(self, text_lower: str) -> Set[str]:
+        """Categories with at least one keyword in the (already lowercased) text"""
+        found = set()
+        if self._automaton is not None:
+            for _, keyword_cats in self._automaton.iter(text_lower):
+                found |= keyword_cats
+                if len(found) == self._category_count:
+                    break
+            return found
+
+        for keyword in set(self._pattern.findall(text_lower)):
+            found |= self._categories[keyword]
+        return found
+
+
+def text_quality(text: str, words: List[str] = None) -> float:
+    """Readability score in [0, 1] used to pick an extraction method and rate chunks"""
+    if not text or len(text.strip()) < 10:
+        return 0.0
+
+    # Count readable characters vs total characters (unreadable ones are rare, so count those)
+    total_chars = len(text)
+    readability_score = (total_chars - len(UNREADABLE_CHAR_PATTERN.findall(text))) / total_chars
+
+    # Bonus for having complete words and sentences
+    if words is None:
+        words = text.split()
+    # Count short words and non-ASCII long words instead of testing every word in Python
+    lengths = Counter(map(len, words))
+    complete_words = len(words) - lengths[1] - lengths[2]
+    if not text.isascii():
+        complete_words -= sum(1 for w in filterfalse(str.isascii, words) if len(w) > 2)
+    word_score = complete_words / len(words) if words else 0
+
+    # Only two of the document patterns can count towards the score
+    pattern_score = 0
+    for pattern in QUALITY_PATTERNS:
+        if pattern.search(text):
+            pattern_score += 0.1
+            if pattern_score >= 0.2:
+                break
+
+    quality = (readability_score * 0.5 + word_score * 0.3 + min(pattern_score, 0.2))
+    return min(quality, 1.0)
+
+
+def key_concepts(chunk: str, limit: int = 10) -> List[str]:
+    """Capitalized and technical terms, unique, in order of first appearance"""
+    concepts = {}
+    for match in CONCEPT_PATTERN.finditer(chunk):
+        word = match.group()
+        if len(word) > 3 and word.lower() not in CONCEPT_STOPWORDS:
+            concepts[word] = None
+            if len(concepts) == limit:
+                break
+    return list(concepts)
+
+
+def _at_word_start(text: str, position: int) -> bool:
+    return position == 0 or not (text[position - 1].isalnum() or text[position - 1] == '_')
+
+
+def technical_terms(text: str) -> List[str]:
+    """snake_case and camelCase terms, same as findall of the \\b-anchored pattern"""
+    terms = []
+    position = 0
+    for hint in TECHNICAL_TERM_HINT.finditer(text):
+        start = hint.start()
+        if start < position:
+            continue
+        # Walk back to the start of the lowercase run the hint belongs to
+        while start > position and text[start - 1] in LOWERCASE:
+            start -= 1
+        if not _at_word_start(text, start):
+            continue
+        match = TECHNICAL_TERM_PATTERN.match(text, start)
+        if match:
+            terms.append(match.group())
+            position = match.end()
+    return terms
+
+
+def key_phrases(text: str, limit: int = 15) -> List[str]:
+    """Capitalized phrases, technical terms and a few long words, unique, in order found"""
+    phrases = []
+    position = 0
+    while True:
+        match = CAPITALIZED_PHRASE_PATTERN.search(text, position)
+        if match is None:
+            break
+        start = match.start()
+        if not _at_word_start(text, start):
+            # Not at a word boundary; a later word of this run may still start a phrase
+            position = start + 1
+            continue
+        phrases.append(match.group())
+        position = match.end()
+
+    phrases.extend(technical_terms(text))
+
+    important_words = []
+    for match in IMPORTANT_WORD_PATTERN.finditer(text):
+        word = match.group()
+        if word.lower() not in COMMON_WORDS:
+            important_words.append(word)
+            if len(important_words) == 5:
+                break
+    phrases.extend(important_words)
+
+    unique_phrases = dict.fromkeys(phrase.strip() for phrase in phrases if len(phrase.strip()) > 3)
+    return list(unique_phrases)[:limit]
+
+
+class ChunkAnalyzer:
+    """Computes all PDFProcessor chunk features in one pass over each chunk"""
+
+    # Order in which keyword categories decide a chunk's content type
+    CONTENT_TYPE_PRIORITY = ('definition', 'example', 'process', 'comparison')
+
+    # Found by the same keyword scan; the reference regex only runs when this is present
+    REFERENCE_HINT = '_reference_hint'
+
+    def __init__(self, academic_keywords: Dict[str, List[str]]):
+        self.academic_keywords = academic_keywords
+        self.matcher = KeywordMatcher(dict(academic_keywords, **{self.REFERENCE_HINT: ['figure', 'table', 'diagram']}))
+
+    def keyword_categories(self, chunk: str) -> Set[str]:
+        return self.matcher.match(chunk.lower())
+
+    def content_type(self, chunk: str, categories: Set[str] = None) -> str:
+        if categories is None:
+            categories = self.keyword_categories(chunk)
+        for content_type in self.CONTENT_TYPE_PRIORITY:
+            if content_type in categories:
+                return content_type
+        if LIST_PATTERN.search(chunk):
+            return 'list'
+        if '?' in chunk:
+            return 'question'
+        return 'general'
+
+    def academic_elements(self, chunk: str, categories: Set[str] = None, chunk_lower: str = None) -> List[str]:
+        if chunk_lower is None:
+            chunk_lower = chunk.lower()
+        if categories is None:
+            categories = self.matcher.match(chunk_lower)
+
+        elements = [element_type for element_type in self.academic_keywords if element_type in categories]
+        if LIST_PATTERN.search(chunk):
+            elements.append('list')
+        if self.REFERENCE_HINT in categories and REFERENCE_PATTERN.search(chunk_lower):
+            elements.append('reference')
+        if '?' in chunk:
+            elements.append('question')
+        return elements
+
+    @staticmethod
+    def page_number(chunk: str) -> str:
+        page_match = PAGE_MARKER_PATTERN.search(chunk) if '--- Page' in chunk else None
+        return page_match.group(1) if page_match else 'Unknown'
+
+    def analyze(self, chunk: str) -> Dict:
+        """Every chunk feature, with the chunk lowercased and keyword-scanned once"""
+        chunk_lower = chunk.lower()
+        categories = self.matcher.match(chunk_lower)
+        words = chunk.split()
+        return {
+            'page': self.page_number(chunk),
+            'content_type': self.content_type(chunk, categories),
+            'key_concepts': key_concepts(chunk),
+            'academic_elements': self.academic_elements(chunk, categories, chunk_lower),
+            'word_count': len(words),
+            'sentence_count': sum(1 for s in chunk.split('.') if s.strip()),
+            'text_quality': text_quality(chunk, words)
+        }
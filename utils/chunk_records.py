@@ -0,0 +1,151 @@
+"""
+Page-aware chunk records.
+
+Extraction used to embed ``--- Page N ---`` markers in the text and recover page
+numbers by searching each chunk for one, which fails for most chunks. Here pages are
+joined without markers, a ``PageMap`` keeps where each page starts in the joined
+text, and every chunk gets a record with its character offsets and page span.
+Records live in flat integer arrays, a few bytes per chunk.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Pages are joined with a paragraph break, so the splitter prefers cutting between pages
+PAGE_SEPARATOR = "\n\n"
+
+
+class ExtractedTable(NamedTuple):
+    """Cell text of one table, row by row, and where it sits on its page"""
+    rows: List[List[str]]
+    bbox: Tuple[float, float, float, float]  # x0, top, x1, bottom in PDF points
+
+
+class ExtractedPage(NamedTuple):
+    """Text of one PDF page, without markers"""
+    number: int  # 1-based page number
+    text: str
+    is_ocr: bool = False
+    # Tables found on the page, in the order of their [TABLE] blocks in the text
+    tables: Tuple[ExtractedTable, ...] = ()
+
+
+class ChunkRecord(NamedTuple):
+    chunk_id: int
+    start: int  # Character offsets of the chunk in the source text
+    end: int
+    page_start: int  # First and last page the chunk covers
+    page_end: int
+
+
+class PageMap:
+    """Page boundaries in a document's joined text"""
+
+    def __init__(self, numbers: Iterable[int], starts: Iterable[int], text_length: int, ocr_pages: Iterable[int] = ()):
+        self.numbers = array('i', numbers)
+        self.starts = array('q', starts)
+        self.text_length = text_length
+        self.ocr_pages = frozenset(ocr_pages)
+        self._index = {number: i for i, number in enumerate(self.numbers)}
+
+    @classmethod
+    def join_pages(cls, pages: List[ExtractedPage]) -> Tuple[str, "PageMap"]:
+        """Joined text of the non-empty pages and the map of where each one starts"""
+        pages = [page for page in pages if page.text]
+        starts = []
+        position = 0
+        for page in pages:
+            starts.append(position)
+            position += len(page.text) + len(PAGE_SEPARATOR)
+        text = PAGE_SEPARATOR.join(page.text for page in pages)
+        return text, cls((page.number for page in pages), starts, len(text),
+                         (page.number for page in pages if page.is_ocr))
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def page_at(self, offset: int) -> Optional[int]:
+        """Page number containing a character offset"""
+        if not self.numbers:
+            return None
+        return self.numbers[max(bisect_right(self.starts, offset) - 1, 0)]
+
+    def page_span(self, start: int, end: int) -> Tuple[Optional[int], Optional[int]]:
+        """First and last page of the text in [start, end)"""
+        return self.page_at(start), self.page_at(max(end - 1, start))
+
+    def page_bounds(self, number: int) -> Optional[Tuple[int, int]]:
+        """Offsets of a page's text in the joined text"""
+        i = self._index.get(number)
+        if i is None:
+            return None
+        end = self.starts[i + 1] - len(PAGE_SEPARATOR) if i + 1 < len(self.starts) else self.text_length
+        return self.starts[i], end
+
+    def page_text(self, text: str, number: int) -> Optional[str]:
+        bounds = self.page_bounds(number)
+        return text[bounds[0]:bounds[1]] if bounds else None
+
+
+class ChunkRecords:
+    """Offsets and page spans of a document's chunks, one array per column"""
+
+    def __init__(self):
+        self.starts = array('q')
+        self.ends = array('q')
+        self.page_starts = array('i')
+        self.page_ends = array('i')
+
+    @classmethod
+    def from_offsets(cls, chunks: List[Tuple[str, int]], page_map: PageMap) -> "ChunkRecords":
+        """Records for (chunk, start offset) pairs, as returned by split_text_with_offsets"""
+        records = cls()
+        for chunk, start in chunks:
+            records.append(start, start + len(chunk), *page_map.page_span(start, start + len(chunk)))
+        return records
+
+    def append(self, start: int, end: int, page_start: Optional[int], page_end: Optional[int]):
+        self.starts.append(start)
+        self.ends.append(end)
+        self.page_starts.append(page_start or 0)  # 0: page unknown
+        self.page_ends.append(page_end or 0)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, chunk_id: int) -> ChunkRecord:
+        return ChunkRecord(chunk_id, self.starts[chunk_id], self.ends[chunk_id],
+                           self.page_starts[chunk_id], self.page_ends[chunk_id])
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def chunks_on_pages(self, first_page: int, last_page: int = None) -> range:
+        """Ids of the chunks overlapping a page range
+
+        Chunks are in text order, so both page columns are sorted and the range is
+        found by bisection.
+        """
+        last_page = first_page if last_page is None else last_page
+        return range(bisect_left(self.page_ends, first_page), bisect_right(self.page_starts, last_page))
+
+    def metadata(self, chunk_id: int) -> Dict:
+        """Citation fields for a chunk's metadata"""
+        record = self[chunk_id]
+        return {
+            'page': record.page_start or 'Unknown',
+            'page_end': record.page_end or 'Unknown',
+            'char_start': record.start,
+            'char_end': record.end
+        }
+
+
+def format_pages(metadata: Dict) -> str:
+    """'page 3' or 'pages 3-4' for a chunk's metadata, '' when the page is unknown"""
+    page, page_end = metadata.get('page'), metadata.get('page_end', metadata.get('page'))
+    if not isinstance(page, int):
+        return ''
+    if isinstance(page_end, int) and page_end != page:
+        return f"pages {page}-{page_end}"
+    return f"page {page}"
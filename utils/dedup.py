@@ -0,0 +1,161 @@
+"""
+Near-duplicate chunk detection and diversified retrieval.
+
+Overlapping chunks, repeated headers and footers and boilerplate pages produce
+chunks that say the same thing. ``NearDuplicateDetector`` finds them at ingest time
+(cosine similarity of embeddings, or SimHash of the words) so they can be stored as
+one vector whose metadata lists every location. ``mmr`` re-ranks search candidates
+with Maximal Marginal Relevance so the top-k is not filled with near-copies.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+import hashlib
+import re
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w\w+")
+
+# Metadata fields copied into each location of a collapsed chunk
+LOCATION_FIELDS = ('chunk_id', 'page', 'page_end', 'char_start', 'char_end')
+
+
+def _token_hash(token: str, cache: Dict[str, int]) -> int:
+    token_hash = cache.get(token)
+    if token_hash is None:
+        # blake2b is stable across processes, unlike hash()
+        token_hash = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+        if len(cache) < 200000:
+            cache[token] = token_hash
+    return token_hash
+
+
+def simhashes(texts: Sequence[str]) -> np.ndarray:
+    """64-bit SimHash fingerprint of each text's lowercased words"""
+    cache = {}
+    bit_values = np.uint64(1) << np.arange(64, dtype=np.uint64)
+    fingerprints = np.zeros(len(texts), dtype=np.uint64)
+    for i, text in enumerate(texts):
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        if not tokens:
+            continue
+        hashes = np.fromiter((_token_hash(token, cache) for token in tokens), dtype=np.uint64, count=len(tokens))
+        # Each bit of the fingerprint is set when most token hashes have it set
+        votes = ((hashes[:, None] & bit_values) != 0).sum(axis=0)
+        fingerprints[i] = np.bitwise_or.reduce(bit_values[votes * 2 > len(tokens)], initial=np.uint64(0))
+    return fingerprints
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, 'bitwise_count'):  # numpy >= 2.0
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8).reshape(*values.shape, 8), axis=-1).sum(axis=-1)
+
+
+class NearDuplicateDetector:
+    """Maps every chunk to the first earlier chunk it nearly duplicates
+
+    ``method="embedding"`` compares normalized embeddings by cosine similarity,
+    ``method="simhash"`` compares word SimHash fingerprints by Hamming distance.
+    Only chunks with the same group key (the source document) are compared, and a
+    chunk is only ever matched to a representative, never to another duplicate, so
+    similarity does not chain across a long run of overlapping chunks.
+    """
+
+    def __init__(self, threshold: float = 0.95, method: str = "embedding", max_hamming: int = 3,
+                 block_size: int = 1024):
+        if method not in ("embedding", "simhash"):
+            raise ValueError(f"Unknown deduplication method: {method}")
+        self.threshold = threshold
+        self.method = method
+        self.max_hamming = max_hamming
+        self.block_size = block_size
+
+    def representatives(self, embeddings: np.ndarray = None, texts: Sequence[str] = None,
+                        groups: Sequence = None) -> np.ndarray:
+        """Index of each chunk's representative (its own index when it is not a duplicate)"""
+        count = len(texts) if self.method == "simhash" else len(embeddings)
+        features = simhashes(texts) if self.method == "simhash" else np.asarray(embeddings, dtype=np.float32)
+
+        members = {}
+        for i, group in enumerate(groups if groups is not None else [None] * count):
+            members.setdefault(group, []).append(i)
+
+        representative = np.arange(count)
+        for rows in members.values():
+            rows = np.asarray(rows)
+            representative[rows] = rows[self._group_representatives(features[rows])]
+        return representative
+
+    def _similar(self, block: np.ndarray, features: np.ndarray) -> np.ndarray:
+        """Boolean matrix: block rows that nearly duplicate each of the features"""
+        if self.method == "simhash":
+            return _popcount(block[:, None] ^ features[None, :]) <= self.max_hamming
+        return block @ features.T >= self.threshold
+
+    def _group_representatives(self, features: np.ndarray) -> np.ndarray:
+        representative = np.arange(len(features))
+        for block_start in range(0, len(features), self.block_size):
+            block_end = min(block_start + self.block_size, len(features))
+            similar = self._similar(features[block_start:block_end], features[:block_end])
+            # Only earlier chunks can be representatives
+            similar &= np.arange(block_end)[None, :] < np.arange(block_start, block_end)[:, None]
+            for offset in np.flatnonzero(similar.any(axis=1)):
+                for candidate in np.flatnonzero(similar[offset]):
+                    if representative[candidate] == candidate:
+                        representative[block_start + offset] = candidate
+                        break
+        return representative
+
+
+def collapse_duplicates(documents: List[str], metadata: List[Dict], embeddings: np.ndarray,
+                        representative: np.ndarray) -> Tuple[List[str], List[Dict], np.ndarray]:
+    """Keep one chunk per duplicate set; its metadata lists the locations of all of them
+
+    Kept chunks get ``locations`` (their own first) and ``duplicate_count`` only when
+    something was collapsed into them.
+    """
+    locations = {}
+    for i, rep in enumerate(representative):
+        if rep != i:
+            locations.setdefault(int(rep), [_location(metadata[rep])]).append(_location(metadata[i]))
+
+    keep = np.flatnonzero(representative == np.arange(len(representative)))
+    kept_metadata = []
+    for i in keep:
+        chunk_metadata = metadata[i]
+        if i in locations:
+            chunk_metadata = dict(chunk_metadata, locations=locations[i], duplicate_count=len(locations[i]) - 1)
+        kept_metadata.append(chunk_metadata)
+    return [documents[i] for i in keep], kept_metadata, embeddings[keep]
+
+
+def _location(metadata: Dict) -> Dict:
+    return {field: metadata[field] for field in LOCATION_FIELDS if field in metadata}
+
+
+def mmr(query_embedding: np.ndarray, candidate_embeddings: np.ndarray, k: int, lambda_mult: float = 0.7,
+        relevance: Optional[np.ndarray] = None) -> List[int]:
+    """Maximal Marginal Relevance: pick k candidates trading relevance against redundancy
+
+    Each step takes the candidate maximizing
+    ``lambda_mult * sim(query, c) - (1 - lambda_mult) * max sim(c, selected)``;
+    ``lambda_mult=1`` is plain relevance order. Returns candidate indices in pick order.
+    """
+    if len(candidate_embeddings) == 0:
+        return []
+    if relevance is None:
+        relevance = candidate_embeddings @ query_embedding
+    pairwise = candidate_embeddings @ candidate_embeddings.T
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = pairwise[selected[0]].copy()
+    available = np.ones(len(relevance), dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < min(k, len(relevance)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, pairwise[best], out=redundancy)
+    return selected
@@ -0,0 +1,99 @@
+"""
+Embedding models as recorded with an index.
+
+Vectors from different models are not comparable, so every index generation
+carries the ``Embedder`` that built it and queries against that generation are
+embedded by the same one. ``index_info.json`` records the model of a saved index,
+which lets a store keep serving it with that model while a migration to another
+model re-embeds the corpus (see utils/model_migration.py).
+"""
+
+from typing import Dict, List
+import os
+import threading
+
+import faiss
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from utils.hashing_embedder import HashingEmbedder
+
+# Dimension of the hashing TF-IDF fallback
+FALLBACK_DIMENSION = 512
+
+
+class Embedder:
+    """A sentence-transformers model, or the hashing fallback when the model is unavailable"""
+
+    def __init__(self, model_name: str, model=None, dimension: int = FALLBACK_DIMENSION):
+        self.model_name = model_name
+        self.model = model
+        self.dimension = model.get_sentence_embedding_dimension() if model else dimension
+        # Deterministic hashing TF-IDF embedder used whenever the model is unavailable
+        self.fallback = None if model else HashingEmbedder(self.dimension)
+
+    @property
+    def kind(self) -> str:
+        return 'sentence-transformers' if self.model else 'hashing'
+
+    def info(self) -> Dict:
+        return {'model_name': self.model_name, 'embedder': self.kind, 'dimension': self.dimension}
+
+    def matches(self, info: Dict) -> bool:
+        """Whether vectors recorded with this info came from this embedder"""
+        return (info.get('model_name'), info.get('embedder'), info.get('dimension')) == \
+            (self.model_name, self.kind, self.dimension)
+
+    def fresh(self) -> "Embedder":
+        """The same model with empty fallback statistics, for loading another index"""
+        return self if self.model else Embedder(self.model_name, None, self.dimension)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Normalized float32 embeddings (cosine similarity as inner product)"""
+        if self.model:
+            embeddings = np.asarray(self.model.encode(texts), dtype=np.float32)
+            faiss.normalize_L2(embeddings)
+            return embeddings
+        # Hashing fallback, computed for the whole batch at once
+        return self.fallback.transform(texts)
+
+    def encode_queries(self, texts: List[str]) -> np.ndarray:
+        """Like encode; the hashing fallback also weights query terms by the corpus IDF"""
+        if self.model:
+            return self.encode(texts)
+        return self.fallback.transform_queries(texts)
+
+
+def load_embedder(model_name: str, timeout: int = 30) -> Embedder:
+    """Load a sentence-transformers model, falling back to hashing TF-IDF embeddings"""
+    # Set Hugging Face token if available
+    hf_token = os.getenv("HF_TOKEN")
+    if hf_token:
+        os.environ["HUGGINGFACE_HUB_TOKEN"] = hf_token
+        print("✅ Using Hugging Face token for enhanced model access")
+
+    try:
+        print(f"🔄 Loading embedding model: {model_name}")
+        # Add timeout for model loading to avoid hanging (alarms only work in the main thread)
+        import signal
+        use_alarm = threading.current_thread() is threading.main_thread()
+
+        def timeout_handler(signum, frame):
+            raise TimeoutError("Model loading timed out")
+
+        if use_alarm:
+            signal.signal(signal.SIGALRM, timeout_handler)
+            signal.alarm(timeout)
+
+        try:
+            embedder = Embedder(model_name, SentenceTransformer(model_name))
+            print(f"✅ Embedding model loaded successfully with dimension: {embedder.dimension}")
+            return embedder
+        finally:
+            if use_alarm:
+                signal.alarm(0)  # Cancel timeout
+
+    except Exception as e:
+        print(f"⚠️ Error loading embedding model: {e}")
+        print("🔄 Falling back to simple TF-IDF embeddings...")
+        return Embedder(model_name)
@@ -0,0 +1,144 @@
+import numpy as np
+from typing import List
+import os
+import re
+import zlib
+
+
+class HashingEmbedder:
+    """Deterministic hashing-vectorizer embeddings used when no transformer model is available
+
+    Documents are embedded as normalized sublinear term frequencies and queries as
+    normalized TF-IDF (the SMART lnc.ltc scheme), so IDF is applied at query time
+    only: stored vectors never depend on the corpus statistics, which change with
+    every added and deleted document, and never need re-embedding when they do.
+    """
+
+    # Word tokens of two or more characters, same rule as scikit-learn's default
+    TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+    def __init__(self, dimension: int = 512, ngram_range: tuple = (1, 2)):
+        self.dimension = dimension
+        self.ngram_range = ngram_range
+
+        # Document frequency per hash bucket, used for IDF weighting
+        self.document_frequency = np.zeros(dimension, dtype=np.float64)
+        self.document_count = 0
+
+        # Cache of token -> signed bucket so repeated vocabulary is hashed once
+        self._bucket_cache = {}
+
+    def _signed_bucket(self, token: str) -> int:
+        """Map a token to a stable signed bucket id (crc32 is identical across processes)"""
+        bucket = self._bucket_cache.get(token)
+        if bucket is None:
+            token_hash = zlib.crc32(token.encode('utf-8'))
+            index = token_hash % self.dimension
+            # Use the top bit as the sign so collisions tend to cancel instead of pile up
+            bucket = -index - 1 if token_hash & 0x80000000 else index + 1
+            if len(self._bucket_cache) < 200000:
+                self._bucket_cache[token] = bucket
+        return bucket
+
+    def _ngrams(self, text: str) -> List[str]:
+        """Tokenize the full text and expand it into word n-grams"""
+        tokens = self.TOKEN_PATTERN.findall(text.lower())
+        min_n, max_n = self.ngram_range
+
+        grams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), max_n + 1):
+            grams.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return grams
+
+    def _term_counts(self, texts: List[str]) -> np.ndarray:
+        """Build the signed term-count matrix for a batch as one sparse-to-dense scatter"""
+        rows = []
+        columns = []
+        signs = []
+
+        for row, text in enumerate(texts):
+            buckets = [self._signed_bucket(gram) for gram in self._ngrams(text)]
+            rows.append(np.full(len(buckets), row, dtype=np.int64))
+            bucket_array = np.asarray(buckets, dtype=np.int64)
+            columns.append(np.abs(bucket_array) - 1)
+            signs.append(np.sign(bucket_array).astype(np.float32))
+
+        counts = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        if not rows:
+            return counts
+
+        flat_index = np.concatenate(rows) * self.dimension + np.concatenate(columns)
+        if flat_index.size:
+            counts += np.bincount(
+                flat_index,
+                weights=np.concatenate(signs),
+                minlength=len(texts) * self.dimension
+            ).reshape(len(texts), self.dimension).astype(np.float32)
+        return counts
+
+    def partial_fit(self, texts: List[str]):
+        """Update document frequencies with a batch of corpus documents"""
+        if not texts:
+            return
+        counts = self._term_counts(texts)
+        # Assign new arrays instead of updating in place so concurrent readers see whole values
+        self.document_frequency = self.document_frequency + np.count_nonzero(counts, axis=0)
+        self.document_count += len(texts)
+
+    def remove(self, texts: List[str]):
+        """Take documents deleted from the corpus back out of the document frequencies"""
+        if not texts:
+            return
+        counts = self._term_counts(texts)
+        self.document_frequency = np.maximum(self.document_frequency - np.count_nonzero(counts, axis=0), 0)
+        self.document_count = max(self.document_count - len(texts), 0)
+
+    def idf(self) -> np.ndarray:
+        """Smoothed inverse document frequency per bucket"""
+        return (np.log((1.0 + self.document_count) / (1.0 + self.document_frequency)) + 1.0).astype(np.float32)
+
+    def transform(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of documents as L2-normalized float32 term-frequency vectors"""
+        return self._normalized(self._term_frequencies(texts))
+
+    def transform_queries(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of queries as L2-normalized float32 TF-IDF vectors, with the current IDF"""
+        embeddings = self._term_frequencies(texts)
+        embeddings *= self.idf()
+        return self._normalized(embeddings)
+
+    def _term_frequencies(self, texts: List[str]) -> np.ndarray:
+        counts = self._term_counts(texts)
+        # Sublinear term frequency keeps long chunks from being dominated by repeated words
+        return np.sign(counts) * np.log1p(np.abs(counts))
+
+    @staticmethod
+    def _normalized(embeddings: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        np.divide(embeddings, norms, out=embeddings, where=norms > 0)
+        return embeddings.astype(np.float32, copy=False)
+
+    def save(self, path: str):
+        """Persist the IDF statistics next to the index"""
+        np.savez(
+            path,
+            document_frequency=self.document_frequency,
+            document_count=np.array([self.document_count]),
+            dimension=np.array([self.dimension])
+        )
+
+    def load(self, path: str) -> bool:
+        """Restore IDF statistics; returns False when nothing compatible is on disk"""
+        if not os.path.exists(path):
+            return False
+        state = np.load(path)
+        if int(state['dimension'][0]) != self.dimension:
+            return False
+        self.document_frequency = state['document_frequency'].astype(np.float64)
+        self.document_count = int(state['document_count'][0])
+        return True
+
+    def reset(self):
+        """Forget all corpus statistics"""
+        self.document_frequency = np.zeros(self.dimension, dtype=np.float64)
+        self.document_count = 0
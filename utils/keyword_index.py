@@ -0,0 +1,158 @@
+"""
+Positional inverted index for exact word and phrase search.
+
+Every chunk is tokenized once at ingest; each token maps to the chunks it occurs in
+and its token positions there. A query like ``calvin "light reactions"`` is answered
+from the postings alone (every word present, every quoted phrase at consecutive
+positions), so a lookup never touches the PDF or scans chunk text. Only the chunks
+returned are re-tokenized, to turn token positions into highlighted context.
+"""
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+import threading
+
+TOKEN_PATTERN = re.compile(r"\w+")
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def parse_query(query: str) -> List[Tuple[str, ...]]:
+    """Query clauses: one term per bare word, the terms of each quoted phrase together"""
+    clauses = []
+    for phrase, word in QUERY_PATTERN.findall(query):
+        terms = tuple(tokenize(phrase if phrase else word))
+        if terms:
+            clauses.append(terms)
+    return clauses
+
+
+class KeywordIndex:
+    """Token -> {chunk uid: token positions}, kept in step with the vector store's chunks"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[int, array]] = {}
+        self.doc_terms: Dict[int, Tuple[str, ...]] = {}  # Distinct terms per chunk, for removal
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.doc_terms)
+
+    def add(self, items: Iterable[Tuple[int, str]]):
+        """Index (uid, text) pairs; a uid already present is replaced"""
+        tokenized = []
+        for uid, text in items:
+            positions = {}
+            for position, term in enumerate(tokenize(text)):
+                positions.setdefault(term, array('I')).append(position)
+            tokenized.append((uid, positions))
+
+        with self._lock:
+            for uid, positions in tokenized:
+                if uid in self.doc_terms:
+                    self._remove(uid)
+                for term, term_positions in positions.items():
+                    self.postings.setdefault(term, {})[uid] = term_positions
+                self.doc_terms[uid] = tuple(positions)
+
+    def remove(self, uids: Iterable[int]):
+        with self._lock:
+            for uid in uids:
+                self._remove(uid)
+
+    def _remove(self, uid: int):
+        for term in self.doc_terms.pop(uid, ()):
+            documents = self.postings.get(term)
+            if documents is not None:
+                documents.pop(uid, None)
+                if not documents:
+                    del self.postings[term]
+
+    def clear(self):
+        with self._lock:
+            self.postings.clear()
+            self.doc_terms.clear()
+
+    def search(self, query: str) -> List[Tuple[int, List[Tuple[int, int]]]]:
+        """Chunks matching every clause, most matches first
+
+        Returns (uid, [(token position, token count), ...]) pairs; each pair locates one
+        occurrence of a word or phrase in the chunk.
+        """
+        clauses = parse_query(query)
+        if not clauses:
+            return []
+
+        with self._lock:
+            # Rarest clause first keeps the candidate set small
+            matches = None
+            for terms in sorted(clauses, key=self._clause_frequency):
+                clause_matches = self._match_clause(terms, matches)
+                if not clause_matches:
+                    return []
+                if matches is None:
+                    matches = clause_matches
+                else:
+                    matches = {uid: matches[uid] + spans for uid, spans in clause_matches.items()}
+
+        ranked = sorted(matches.items(), key=lambda item: (-len(item[1]), item[0]))
+        return [(uid, sorted(spans)) for uid, spans in ranked]
+
+    def _clause_frequency(self, terms: Tuple[str, ...]) -> int:
+        return min(len(self.postings.get(term, ())) for term in terms)
+
+    def _match_clause(self, terms: Tuple[str, ...],
+                      candidates: Optional[Dict] = None) -> Dict[int, List[Tuple[int, int]]]:
+        """uid -> occurrences of a word or phrase, among candidates if given (caller holds the lock)"""
+        term_postings = [self.postings.get(term) for term in terms]
+        if not all(term_postings):
+            return {}
+
+        uids = min(term_postings, key=len).keys()
+        if candidates is not None:
+            uids = uids & candidates.keys()
+
+        matches = {}
+        for uid in uids:
+            if not all(uid in documents for documents in term_postings):
+                continue
+            starts = set(term_postings[0][uid])
+            for offset, documents in enumerate(term_postings[1:], 1):
+                starts &= {position - offset for position in documents[uid]}
+                if not starts:
+                    break
+            if starts:
+                matches[uid] = [(start, len(terms)) for start in starts]
+        return matches
+
+
+def highlight(text: str, spans: List[Tuple[int, int]], window: int = 100,
+              markers: Tuple[str, str] = ("**", "**")) -> Dict:
+    """Character offsets of matched token spans and a highlighted window around the first one"""
+    tokens = [match.span() for match in TOKEN_PATTERN.finditer(text)]
+    offsets = [(tokens[start][0], tokens[start + length - 1][1]) for start, length in spans
+               if start + length <= len(tokens)]
+    if not offsets:
+        return {'context': text[:2 * window], 'highlighted': text[:2 * window], 'matches': []}
+
+    context_start = max(0, offsets[0][0] - window)
+    context_end = min(len(text), offsets[0][1] + window)
+    parts, cursor = [], context_start
+    for start, end in offsets:
+        if start < cursor or end > context_end:
+            continue
+        parts.extend((text[cursor:start], markers[0], text[start:end], markers[1]))
+        cursor = end
+    parts.append(text[cursor:context_end])
+
+    prefix = "..." if context_start > 0 else ""
+    suffix = "..." if context_end < len(text) else ""
+    return {
+        'context': prefix + text[context_start:context_end] + suffix,
+        'highlighted': prefix + "".join(parts) + suffix,
+        'matches': offsets
+    }
@@ -0,0 +1,136 @@
+"""
+Online migration of a vector store to another embedding model.
+
+A background thread re-embeds every chunk of the live store with the new model,
+a batch at a time and at a bounded rate, while the store keeps serving and
+accepting uploads with its current model. Each pass picks up the chunks added
+since the last one; once only a batch or so is left, the store embeds those under
+its write lock and publishes the new vectors together with the new model as one
+generation (VectorStore._cut_over_model). Readers see the old model and index or
+the new ones, never a mix.
+"""
+
+from typing import Dict, Optional
+import threading
+import time
+
+import numpy as np
+
+from utils.embedding_model import Embedder, load_embedder
+
+
+class ModelMigration:
+    """Background re-embedding of a VectorStore's chunks, ending in an atomic cutover"""
+
+    def __init__(self, vector_store, model_name: str, embedder: Optional[Embedder] = None,
+                 batch_size: int = 64, max_chunks_per_second: float = None):
+        self.vector_store = vector_store
+        self.model_name = model_name
+        self.embedder = embedder  # Loaded in the background thread when not given
+        self.batch_size = batch_size
+        # Throttle so re-embedding does not starve query embedding of CPU (None: as fast as possible)
+        self.max_chunks_per_second = max_chunks_per_second
+
+        self.state = 'pending'
+        self.error = None
+        self.embedded = 0
+        self.started_at = None
+        self.finished_at = None
+        self._rate_start = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="model-migration", daemon=True)
+        self._thread.start()
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def cancel(self):
+        """Stop re-embedding; the store keeps its current model and index"""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def wait(self, timeout: float = None) -> bool:
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.is_running()
+
+    def _run(self):
+        self.started_at = time.monotonic()
+        try:
+            self.state = 'loading model'
+            if self.embedder is None:
+                self.embedder = load_embedder(self.model_name)
+            if not self.embedder.model:
+                raise RuntimeError(f"{self.model_name} could not be loaded")
+
+            self.state = 're-embedding'
+            self._rate_start = time.monotonic()
+            vectors = self._embed_until_caught_up()
+            if vectors is None:
+                self.state = 'cancelled'
+                return
+
+            self.state = 'cutting over'
+            stragglers = self.vector_store._cut_over_model(self.embedder, vectors)
+            self.embedded += stragglers
+            self.state = 'done'
+            print(f"🔁 Switched embedding model to {self.model_name}: {self.embedded} chunks re-embedded "
+                  f"in {time.monotonic() - self.started_at:.1f}s")
+        except Exception as e:
+            self.state = 'failed'
+            self.error = str(e)
+            print(f"⚠️ Embedding model migration to {self.model_name} failed: {e}")
+        finally:
+            self.finished_at = time.monotonic()
+
+    def _embed_until_caught_up(self) -> Optional[Dict[int, np.ndarray]]:
+        """chunk uid -> new vector for all but the last few chunks of the live store, None if cancelled"""
+        vectors = {}
+        while True:
+            # Each pass works on a pinned generation; chunks written meanwhile are left for the next
+            generation = self.vector_store._generation
+            live_uids = {metadata['chunk_uid'] for metadata in generation.document_metadata}
+            vectors = {uid: vector for uid, vector in vectors.items() if uid in live_uids}
+            pending = [(metadata['chunk_uid'], document)
+                       for document, metadata in zip(generation.documents, generation.document_metadata)
+                       if metadata['chunk_uid'] not in vectors]
+            if len(pending) <= self.batch_size:
+                return vectors  # The rest is embedded during the cutover
+
+            for start in range(0, len(pending), self.batch_size):
+                if self._stop.is_set():
+                    return None
+                batch = pending[start:start + self.batch_size]
+                embeddings = self.embedder.encode([document for _, document in batch])
+                for (uid, _), vector in zip(batch, embeddings):
+                    vectors[uid] = vector
+                self.embedded += len(batch)
+                self._throttle()
+
+    def _throttle(self):
+        if not self.max_chunks_per_second:
+            return
+        ahead = self.embedded / self.max_chunks_per_second - (time.monotonic() - self._rate_start)
+        if ahead > 0:
+            self._stop.wait(ahead)
+
+    def progress(self) -> Dict:
+        total = len(self.vector_store._generation.documents)
+        elapsed = ((self.finished_at or time.monotonic()) - self.started_at) if self.started_at else 0.0
+        rate = self.embedded / elapsed if elapsed > 0 else 0.0
+        progress = {
+            'model_name': self.model_name,
+            'state': self.state,
+            'embedded': self.embedded,
+            'total': total,
+            'chunks_per_second': round(rate, 1)
+        }
+        if self.state == 're-embedding' and rate > 0:
+            progress['eta_seconds'] = round(max(total - self.embedded, 0) / rate, 1)
+        if self.error:
+            progress['error'] = self.error
+        return progress
@@ -0,0 +1,170 @@
+"""
+Per-course namespaces of the vector store.
+
+Each namespace is a VectorStore of its own (index, chunks, page and table stores)
+persisted in ``<index_path>/namespaces/<name>``, so a search, the stats and
+clear_index only ever touch one course. The store at ``index_path`` itself is the
+default namespace and works as before.
+
+All namespaces share the embedding model of the default store. They are loaded
+on first use and kept in LRU order under a memory budget: when the resident
+namespaces exceed it, the least recently used ones that no request is using are
+unloaded (their indexes are already saved after every write) and loaded again
+from disk on their next use.
+
+Namespaces keep their vectors in this process even when the default store is
+sharded. Shard workers per namespace would multiply the worker processes, and
+the memory they hold would escape the budget.
+"""
+
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List
+import os
+import re
+import shutil
+import threading
+
+from utils.snapshot import NAMESPACES_DIR
+from utils.vector_store import VectorStore
+
+# Namespace names become directory names
+NAMESPACE_PATTERN = re.compile(r"[A-Za-z0-9][\w.-]{0,63}")
+
+
+class NamespaceError(ValueError):
+    """An invalid or unknown namespace"""
+
+
+class NamespaceRegistry:
+    """Lazily loaded per-course VectorStores beside a default store, under one memory budget"""
+
+    def __init__(self, default_store: VectorStore, max_memory_mb: int = 1024, **store_options):
+        self.default_store = default_store
+        self.root = os.path.join(default_store.index_path, NAMESPACES_DIR)
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        # Passed to every namespace's VectorStore (index type, dedup, MMR, routing), never with shards
+        self.store_options = dict(store_options, num_shards=0)
+
+        self._stores = OrderedDict()  # name -> VectorStore, least recently used first
+        self._leases = Counter()  # name -> requests currently using the store
+        self._load_locks = {}  # name -> lock, so a namespace is loaded once
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> str:
+        if not NAMESPACE_PATTERN.fullmatch(name or ""):
+            raise NamespaceError(f"Invalid namespace name {name!r}")
+        return os.path.join(self.root, name)
+
+    def exists(self, name: str) -> bool:
+        return name in self._stores or os.path.isdir(self.path(name))
+
+    def names(self) -> List[str]:
+        """Every namespace, loaded or only on disk"""
+        on_disk = os.listdir(self.root) if os.path.isdir(self.root) else []
+        return sorted(set(self._stores) | {name for name in on_disk if NAMESPACE_PATTERN.fullmatch(name)})
+
+    @contextmanager
+    def use(self, name: str = None, create: bool = False):
+        """The store of a namespace (the default store for an empty name), kept loaded while in use
+
+        Unknown namespaces raise NamespaceError unless create is set.
+        """
+        if not name:
+            yield self.default_store
+            return
+        if not create and not self.exists(name):
+            raise NamespaceError(f"No namespace {name!r}")
+
+        store = self._acquire(name)
+        try:
+            yield store
+        finally:
+            with self._lock:
+                self._leases[name] -= 1
+            self._enforce_memory_budget()
+
+    def _acquire(self, name: str) -> VectorStore:
+        path = self.path(name)
+        with self._lock:
+            self._leases[name] += 1
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Loading can take a while; only requests for the same namespace wait for it
+        with load_lock:
+            with self._lock:
+                store = self._stores.get(name)
+                if store is not None:
+                    self._stores.move_to_end(name)
+                    return store
+            try:
+                store = VectorStore(index_path=path, embedder=self.default_store.target_embedder,
+                                    **self.store_options)
+            except Exception:
+                with self._lock:
+                    self._leases[name] -= 1
+                raise
+            with self._lock:
+                self._stores[name] = store
+            print(f"📂 Loaded namespace {name} ({len(store.documents)} chunks)")
+            return store
+
+    def resident_memory_bytes(self) -> int:
+        with self._lock:
+            stores = list(self._stores.values())
+        return sum(store.resident_memory_bytes() for store in stores)
+
+    def _enforce_memory_budget(self):
+        """Unload least recently used namespaces no request is using until the rest fit the budget"""
+        with self._lock:
+            resident = {name: store.resident_memory_bytes() for name, store in self._stores.items()}
+            total = sum(resident.values())
+            evicted = []
+            for name in list(self._stores):
+                if total <= self.max_memory_bytes:
+                    break
+                if self._leases[name] > 0:
+                    continue
+                evicted.append((name, self._stores.pop(name)))
+                total -= resident[name]
+
+        for name, store in evicted:
+            store.close()
+            print(f"💾 Unloaded namespace {name} ({resident[name] / 1e6:.1f} MB freed)")
+
+    def unload(self, name: str) -> bool:
+        """Drop a namespace from memory if no request is using it; it is reloaded on next use"""
+        with self._lock:
+            if self._leases[name] > 0 or name not in self._stores:
+                return False
+            store = self._stores.pop(name)
+        store.close()
+        return True
+
+    def delete(self, name: str):
+        """Remove a namespace and everything saved for it"""
+        with self.use(name) as store:
+            store.clear_index()
+            store.close()
+        with self._lock:
+            self._stores.pop(name, None)
+        shutil.rmtree(self.path(name), ignore_errors=True)
+        print(f"🗑️  Deleted namespace {name}")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            loaded = {name: store.resident_memory_bytes() for name, store in self._stores.items()}
+        return {
+            'namespaces': self.names(),
+            'loaded': {name: round(size / 1e6, 2) for name, size in loaded.items()},  # MB
+            'resident_memory_bytes': sum(loaded.values()),
+            'max_memory_bytes': self.max_memory_bytes
+        }
+
+    def close(self):
+        """Stop the shard workers and migrations of every loaded namespace"""
+        with self._lock:
+            stores = list(self._stores.values())
+            self._stores.clear()
+        for store in stores:
+            store.close()
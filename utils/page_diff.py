@@ -0,0 +1,116 @@
+"""
+Incremental re-ingestion of revised documents.
+
+Each ingested source keeps a ``PageManifest``: a hash of every page's cleaned text
+and where the page sits in the joined source text. When a revised file comes in,
+``PageDiff`` aligns the old and new page hashes (so unchanged pages still match
+when pages were inserted or removed before them). Chunks lying on unchanged pages
+keep their vectors and only get new offsets and page numbers; just the text of the
+changed pages is re-chunked and embedded.
+"""
+
+from bisect import bisect_right
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Tuple
+import hashlib
+
+from utils.chunk_records import ExtractedPage, PageMap
+
+
+def page_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class PageManifest:
+    """Hash and position of every page of an ingested source"""
+
+    def __init__(self, numbers: List[int], starts: List[int], text_length: int, hashes: List[str]):
+        self.numbers = list(numbers)
+        self.starts = list(starts)
+        self.text_length = text_length
+        self.hashes = list(hashes)
+
+    @classmethod
+    def from_pages(cls, pages: List[ExtractedPage]) -> Tuple[str, PageMap, "PageManifest"]:
+        """Joined text, page map and manifest of a document's pages"""
+        text, page_map = PageMap.join_pages(pages)
+        hashes = [page_hash(page.text) for page in pages if page.text]
+        return text, page_map, cls(page_map.numbers, page_map.starts, page_map.text_length, hashes)
+
+    def page_index(self, offset: int) -> int:
+        return max(bisect_right(self.starts, offset) - 1, 0)
+
+    def to_dict(self) -> Dict:
+        return {'numbers': self.numbers, 'starts': self.starts, 'text_length': self.text_length, 'hashes': self.hashes}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "PageManifest":
+        return cls(data['numbers'], data['starts'], data['text_length'], data['hashes'])
+
+
+class PageDiff:
+    """Which pages of the old version survive unchanged, and where they are now"""
+
+    def __init__(self, old: PageManifest, new: PageManifest):
+        self.old = old
+        self.new = new
+        self.moves = {}  # Old page index -> new page index, for identical pages
+        matcher = SequenceMatcher(None, old.hashes, new.hashes, autojunk=False)
+        for tag, old_start, old_end, new_start, _ in matcher.get_opcodes():
+            if tag == 'equal':
+                for offset in range(old_end - old_start):
+                    self.moves[old_start + offset] = new_start + offset
+
+        kept_new = set(self.moves.values())
+        self.changed_pages = [number for i, number in enumerate(new.numbers) if i not in kept_new]
+        self.removed_pages = [number for i, number in enumerate(old.numbers) if i not in self.moves]
+
+    def remap(self, start: int, end: int) -> Optional[Tuple[int, int]]:
+        """New offsets of old text [start, end), or None if any page it covers changed
+
+        Text spanning several pages only survives if those pages are still adjacent,
+        so nothing was inserted into the middle of it.
+        """
+        first, last = self.old.page_index(start), self.old.page_index(max(end - 1, start))
+        new_first = self.moves.get(first)
+        if new_first is None:
+            return None
+        for page in range(first + 1, last + 1):
+            if self.moves.get(page) != new_first + page - first:
+                return None
+        shift = self.new.starts[new_first] - self.old.starts[first]
+        return start + shift, end + shift
+
+
+class PageUpdate:
+    """Everything needed to move a source's chunks to a new version of the document"""
+
+    def __init__(self, manifest: PageManifest, removed_chunk_ids: List[int], metadata_updates: Dict[int, Dict],
+                 documents: List[Dict], changed_pages: List[int], pages: List[ExtractedPage] = ()):
+        self.manifest = manifest
+        self.removed_chunk_ids = removed_chunk_ids  # Chunks whose text changed
+        self.metadata_updates = metadata_updates  # chunk_id -> new offsets and pages of kept chunks
+        self.documents = documents  # New chunks ({'content', 'metadata'}) to embed
+        self.changed_pages = changed_pages
+        self.pages = pages  # Cleaned text of every page, for the page store
+
+    @property
+    def is_noop(self) -> bool:
+        return not self.removed_chunk_ids and not self.documents
+
+
+def uncovered_regions(text: str, spans: List[Tuple[int, int]], margin: int = 0) -> List[Tuple[int, int]]:
+    """Ranges of text with non-whitespace that no span covers, widened by margin on both sides
+
+    The margin gives re-chunked text the usual overlap with the kept chunks around it.
+    """
+    regions = []
+    cursor = 0
+    for start, end in sorted(spans) + [(len(text), len(text))]:
+        if start > cursor and not text[cursor:start].isspace():
+            region = (max(cursor - margin, 0), min(start + margin, len(text)))
+            if regions and region[0] <= regions[-1][1]:
+                region = (regions.pop()[0], region[1])  # Widened into the previous region
+            regions.append(region)
+        cursor = max(cursor, end)
+    return regions
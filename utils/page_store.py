@@ -0,0 +1,179 @@
+"""
+Random-access store of extracted page text.
+
+Ingestion writes every page of a source into one file: a fixed-size offset table
+followed by each page's text, compressed on its own. Showing a page or a citation
+preview then costs one read of that page's bytes and one decompress - the PDF
+itself is never needed again (the upload is deleted once ingested).
+
+File layout (little endian)::
+
+    MAGIC | page count (u4) | PAGE_TABLE_DTYPE x count | zlib blob per page
+"""
+
+from bisect import bisect_right
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import hashlib
+import os
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+from utils.chunk_records import PAGE_SEPARATOR, ExtractedPage, PageMap
+
+MAGIC = b"SMPAGES1"
+PAGE_TABLE_DTYPE = np.dtype([
+    ('number', '<u4'),   # Page number in the PDF
+    ('start', '<u8'),    # Offset of the page in the joined source text (chunk char_start/char_end)
+    ('offset', '<u8'),   # Offset of the compressed blob from the start of the file
+    ('length', '<u4'),   # Compressed size
+    ('is_ocr', 'u1')
+])
+
+
+def source_path(store_dir: str, source: str, suffix: str) -> str:
+    """File of a source in a store directory; hashed names keep arbitrary source names out of the file system"""
+    digest = hashlib.blake2b(source.encode('utf-8'), digest_size=12).hexdigest()
+    return os.path.join(store_dir, f"{digest}{suffix}")
+
+
+class _PageFile:
+    """An open page file and its table; kept open so replaced files stay readable for in-flight reads"""
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.lock = threading.Lock()
+        # Reads in progress, and whether the store has let go of the file (both under the store's lock)
+        self.readers = 0
+        self.retired = False
+        header = self.file.read(len(MAGIC) + 4)
+        if header[:len(MAGIC)] != MAGIC:
+            self.file.close()
+            raise ValueError(f"{path} is not a page store file")
+        count, = struct.unpack("<I", header[len(MAGIC):])
+        self.table = np.frombuffer(self.file.read(count * PAGE_TABLE_DTYPE.itemsize), dtype=PAGE_TABLE_DTYPE)
+        self.numbers = self.table['number'].tolist()
+        self.starts = self.table['start'].tolist()
+
+    def read(self, row: int) -> ExtractedPage:
+        entry = self.table[row]
+        with self.lock:
+            self.file.seek(int(entry['offset']))
+            blob = self.file.read(int(entry['length']))
+        return ExtractedPage(int(entry['number']), zlib.decompress(blob).decode('utf-8'), bool(entry['is_ocr']))
+
+
+class PageStore:
+    """Compressed per-page text of every ingested source, one file per source"""
+
+    def __init__(self, store_dir: str, compression_level: int = 6):
+        self.store_dir = store_dir
+        self.compression_level = compression_level
+        self._files: Dict[str, _PageFile] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, source: str) -> str:
+        return source_path(self.store_dir, source, ".pages")
+
+    def write(self, source: str, pages: List[ExtractedPage]):
+        """Store a source's pages, replacing any earlier version of it"""
+        _, page_map = PageMap.join_pages(pages)
+        stored = [page for page in pages if page.text]
+        blobs = [zlib.compress(page.text.encode('utf-8'), self.compression_level) for page in stored]
+
+        table = np.zeros(len(stored), dtype=PAGE_TABLE_DTYPE)
+        table['number'] = [page.number for page in stored]
+        table['start'] = page_map.starts
+        table['length'] = [len(blob) for blob in blobs]
+        table['is_ocr'] = [page.is_ocr for page in stored]
+        # Blobs follow the table back to back
+        ends = np.cumsum(table['length'], dtype=np.uint64)
+        table['offset'] = len(MAGIC) + 4 + table.nbytes + ends - table['length']
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = self._path(source)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(stored)))
+            f.write(table.tobytes())
+            for blob in blobs:
+                f.write(blob)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._retire(self._files.pop(source, None))
+
+    @contextmanager
+    def _reading(self, source: str):
+        """The open file of a source, or None; a file replaced meanwhile is closed when the read is done"""
+        with self._lock:
+            page_file = self._files.get(source)
+            if page_file is None and os.path.exists(self._path(source)):
+                page_file = self._files[source] = _PageFile(self._path(source))
+            if page_file is not None:
+                page_file.readers += 1
+        if page_file is None:
+            yield None
+            return
+        try:
+            yield page_file
+        finally:
+            with self._lock:
+                page_file.readers -= 1
+                if page_file.retired and page_file.readers == 0:
+                    page_file.file.close()
+
+    @staticmethod
+    def _retire(page_file: Optional[_PageFile]):
+        """Let go of a file no longer in the cache, closing it now or after its last read (caller holds the lock)"""
+        if page_file is None:
+            return
+        page_file.retired = True
+        if page_file.readers == 0:
+            page_file.file.close()
+
+    def has_source(self, source: str) -> bool:
+        with self._reading(source) as page_file:
+            return page_file is not None
+
+    def page_numbers(self, source: str) -> List[int]:
+        with self._reading(source) as page_file:
+            return list(page_file.numbers) if page_file else []
+
+    def get_page(self, source: str, number: int) -> Optional[ExtractedPage]:
+        """One page of a source, or None if it was not stored"""
+        with self._reading(source) as page_file:
+            if page_file is None:
+                return None
+            row = bisect_right(page_file.numbers, number) - 1
+            if row < 0 or page_file.numbers[row] != number:
+                return None
+            return page_file.read(row)
+
+    def get_text_range(self, source: str, start: int, end: int) -> str:
+        """Text between two offsets of the joined source text (a chunk's char_start/char_end)"""
+        with self._reading(source) as page_file:
+            if page_file is None or start >= end:
+                return ""
+            first = max(bisect_right(page_file.starts, start) - 1, 0)
+            last = max(bisect_right(page_file.starts, end - 1) - 1, first)
+            text = PAGE_SEPARATOR.join(page_file.read(row).text for row in range(first, last + 1))
+        offset = page_file.starts[first]
+        return text[max(start - offset, 0):end - offset]
+
+    def delete(self, source: str):
+        with self._lock:
+            self._retire(self._files.pop(source, None))
+            path = self._path(source)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self):
+        """Close every open file once its reads are done (the caller removes the directory)"""
+        with self._lock:
+            for page_file in self._files.values():
+                self._retire(page_file)
+            self._files.clear()
@@ -10,8 +10,14 @@ from typing import List, Dict, Tuple, Optional
 import re
 import os
 import tempfile
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from collections import Counter
+from utils.chunk_analyzer import ChunkAnalyzer, text_quality, key_concepts
+from utils.text_cleaner import TextCleaner
+from utils.text_splitter import FastTextSplitter
+from utils.chunk_records import ChunkRecords, ExtractedPage, ExtractedTable, PageMap
+from utils.page_diff import PageDiff, PageManifest, PageUpdate, uncovered_regions
+from utils.keyword_index import KeywordIndex, highlight
+from utils.tracing import span, traced
 
 # Skip NLTK for now to avoid scipy dependency conflicts
 # try:
@@ -20,21 +26,29 @@ from collections import Counter
 # except LookupError:
 #     nltk.download('punkt', quiet=True)
 
+# A ruled table with a header, one body row and two columns has at least three horizontal
+# and three vertical edges. Page frames and boxed paragraphs (one column) do not count -
+# the finder used to return them as single-cell "tables" repeating the page text
+TABLE_MIN_HORIZONTAL_EDGES = 3
+TABLE_MIN_VERTICAL_EDGES = 3
+# Shorter edges are ignored, as by pdfplumber's default edge_min_length
+TABLE_MIN_EDGE_LENGTH = 3
+
 class PDFProcessor:
     def process_pdf_document(self, pdf_path: str) -> list:
         """Alias for process_pdf for compatibility with tests and API."""
         return self.process_pdf(pdf_path)
     """Enhanced PDF document processing with intelligent chunking and context preservation"""
     
-    def __init__(self, chunk_size: int = 1200, chunk_overlap: int = 300):
+    def __init__(self, chunk_size: int = 1200, chunk_overlap: int = 300, tokenizer=None):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         
-        # Enhanced text splitter with better separators for academic content
-        self.text_splitter = RecursiveCharacterTextSplitter(
+        # Enhanced text splitter with better separators for academic content.
+        # With an embedding tokenizer, chunk_size and chunk_overlap count tokens instead of characters
+        splitter_options = dict(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            length_function=len,
             separators=[
                 "\n\n\n",  # Major section breaks
                 "\n\n",    # Paragraph breaks
@@ -48,6 +62,10 @@ class PDFProcessor:
                 ""         # Character breaks
             ]
         )
+        if tokenizer is not None:
+            self.text_splitter = FastTextSplitter.from_tokenizer(tokenizer, **splitter_options)
+        else:
+            self.text_splitter = FastTextSplitter(length_function=len, **splitter_options)
         
         # Academic keywords for better context identification
         self.academic_keywords = {
@@ -58,24 +76,53 @@ class PDFProcessor:
             'comparison': ['compare', 'contrast', 'difference', 'similarity', 'versus'],
             'classification': ['types', 'categories', 'classification', 'kinds', 'varieties']
         }
+        
+        # Precompiled single-pass analysis of every chunk
+        self.analyzer = ChunkAnalyzer(self.academic_keywords)
+        
+        # Streaming one-pass cleaner for extracted text
+        self.text_cleaner = TextCleaner()
     
     def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Enhanced text extraction with multiple libraries for maximum PDF compatibility"""
+        """Enhanced text extraction with multiple libraries for maximum PDF compatibility
+        
+        Returns cleaned text with ``--- Page N ---`` markers; extract_pages gives the
+        pages separately, without markers.
+        """
+        return self.enhanced_clean_text(self._with_page_markers(self._extract_best_pages(pdf_path)))
+    
+    @traced("pdf_processor.extract_pages")
+    def extract_pages(self, pdf_path: str) -> List[ExtractedPage]:
+        """Cleaned text of each page, using the same extraction method as extract_text_from_pdf"""
+        raw_pages = self._extract_best_pages(pdf_path)
+        pages = []
+        with span("pdf_processor.clean_text", pages=len(raw_pages)):
+            for page in raw_pages:
+                text = self.enhanced_clean_text(page.text)
+                if text:
+                    pages.append(page._replace(text=text))
+        return pages
+    
+    def _extract_best_pages(self, pdf_path: str) -> List[ExtractedPage]:
+        """Raw pages from the first method with good quality text, else from the longest extraction"""
         extraction_methods = [
-            ("pdfplumber", self._extract_with_pdfplumber),
-            ("pymupdf", self._extract_with_pymupdf),
-            ("pypdf2", self._extract_with_pypdf2),
-            ("pdfminer", self._extract_with_pdfminer),
-            ("ocr", self._extract_with_ocr)
+            ("pdfplumber", self._pages_with_pdfplumber),
+            ("pymupdf", self._pages_with_pymupdf),
+            ("pypdf2", self._pages_with_pypdf2),
+            ("pdfminer", self._pages_with_pdfminer),
+            ("ocr", self._pages_with_ocr)
         ]
         
-        best_text = ""
+        best_pages = []
+        best_length = 0
         best_method = "none"
         
         for method_name, method_func in extraction_methods:
             try:
                 print(f"Attempting extraction with {method_name}...")
-                text = method_func(pdf_path)
+                with span(f"pdf_processor.extract.{method_name}"):
+                    pages = method_func(pdf_path)
+                text = self._with_page_markers(pages)
                 
                 if text and len(text.strip()) > 100:  # Minimum viable text length
                     text_quality = self._assess_text_quality(text)
@@ -83,47 +130,85 @@ class PDFProcessor:
                     # If we get good quality text, use it
                     if text_quality > 0.7:
                         print(f"✅ Successfully extracted text using {method_name} (quality: {text_quality:.2f})")
-                        return self.enhanced_clean_text(text)
+                        return pages
                     
                     # Keep track of the best extraction so far
-                    if len(text) > len(best_text):
-                        best_text = text
+                    if len(text) > best_length:
+                        best_pages = pages
+                        best_length = len(text)
                         best_method = method_name
                         
             except Exception as e:
                 print(f"⚠️  {method_name} extraction failed: {str(e)}")
                 continue
         
-        if best_text:
+        if best_pages:
             print(f"✅ Using best available extraction from {best_method}")
-            return self.enhanced_clean_text(best_text)
+            return best_pages
         
         raise Exception("❌ Failed to extract text using any method. This PDF may be corrupted, password-protected, or contain only images without OCR-readable text.")
 
-    def _extract_with_pdfplumber(self, pdf_path: str) -> str:
-        """Extract text using pdfplumber (best for tables and complex layouts)"""
-        text = ""
+    @staticmethod
+    def _with_page_markers(pages: List[ExtractedPage]) -> str:
+        """Pages joined into one text with the legacy page markers"""
+        return "".join(
+            f"\n\n--- Page {page.number} (OCR) ---\n{page.text}" if page.is_ocr
+            else f"\n\n--- Page {page.number} ---\n{page.text}"
+            for page in pages
+        )
+
+    def _pages_with_pdfplumber(self, pdf_path: str) -> List[ExtractedPage]:
+        """Extract pages using pdfplumber (best for tables and complex layouts)"""
+        pages = []
         with pdfplumber.open(pdf_path) as pdf:
             for page_num, page in enumerate(pdf.pages):
                 try:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += f"\n\n--- Page {page_num + 1} ---\n{page_text}"
+                    parts = [page.extract_text() or ""]
+                    
+                    # Also extract tables if present - the table finder only runs on ruled pages
+                    tables = []
+                    if self._may_have_tables(page):
+                        with span("pdf_processor.find_tables"):
+                            found = page.find_tables()
+                        for table in found:
+                            rows = [[str(cell) if cell else "" for cell in row] for row in table.extract()]
+                            if rows:
+                                tables.append(ExtractedTable(rows, tuple(table.bbox)))
+                                table_text = "\n".join(" | ".join(row) for row in rows)
+                                parts.append(f"\n\n[TABLE]\n{table_text}\n[/TABLE]\n")
                     
-                    # Also extract tables if present
-                    tables = page.extract_tables()
-                    for table in tables:
-                        if table:
-                            table_text = "\n".join([" | ".join([str(cell) if cell else "" for cell in row]) for row in table])
-                            text += f"\n\n[TABLE]\n{table_text}\n[/TABLE]\n"
+                    page_text = "".join(parts)
+                    if page_text:
+                        pages.append(ExtractedPage(page_num + 1, page_text, tables=tuple(tables)))
                             
                 except Exception:
                     continue
-        return text
+        return pages
+    
+    @staticmethod
+    def _may_have_tables(page) -> bool:
+        """Whether a page has the ruling lines pdfplumber's table finder needs
+        
+        The finder builds cells from the intersections of ruling edges, so a page
+        without rules at TABLE_MIN_HORIZONTAL_EDGES distinct heights and
+        TABLE_MIN_VERTICAL_EDGES distinct x positions cannot yield a (multi-column)
+        table. Collecting them from the page's already parsed lines and rects is far
+        cheaper than running the finder.
+        """
+        rows, columns = set(), set()
+        for edge in page.edges:
+            if edge['orientation'] == 'h':
+                if edge['x1'] - edge['x0'] >= TABLE_MIN_EDGE_LENGTH:
+                    rows.add(round(edge['top']))
+            elif edge['bottom'] - edge['top'] >= TABLE_MIN_EDGE_LENGTH:
+                columns.add(round(edge['x0']))
+            if len(rows) >= TABLE_MIN_HORIZONTAL_EDGES and len(columns) >= TABLE_MIN_VERTICAL_EDGES:
+                return True
+        return False
 
-    def _extract_with_pymupdf(self, pdf_path: str) -> str:
-        """Extract text using PyMuPDF (best for general PDFs and metadata)"""
-        text = ""
+    def _pages_with_pymupdf(self, pdf_path: str) -> List[ExtractedPage]:
+        """Extract pages using PyMuPDF (best for general PDFs and metadata)"""
+        pages = []
         doc = fitz.open(pdf_path)
         
         for page_num in range(len(doc)):
@@ -131,16 +216,16 @@ class PDFProcessor:
                 page = doc.load_page(page_num)
                 page_text = page.get_text()
                 if page_text:
-                    text += f"\n\n--- Page {page_num + 1} ---\n{page_text}"
+                    pages.append(ExtractedPage(page_num + 1, page_text))
             except Exception:
                 continue
                 
         doc.close()
-        return text
+        return pages
 
-    def _extract_with_pypdf2(self, pdf_path: str) -> str:
-        """Extract text using PyPDF2 (original method, kept as fallback)"""
-        text = ""
+    def _pages_with_pypdf2(self, pdf_path: str) -> List[ExtractedPage]:
+        """Extract pages using PyPDF2 (original method, kept as fallback)"""
+        pages = []
         with open(pdf_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
             
@@ -148,13 +233,13 @@ class PDFProcessor:
                 try:
                     page_text = page.extract_text()
                     if page_text:
-                        text += f"\n\n--- Page {page_num + 1} ---\n{page_text}"
+                        pages.append(ExtractedPage(page_num + 1, page_text))
                 except Exception:
                     continue
-        return text
+        return pages
 
-    def _extract_with_pdfminer(self, pdf_path: str) -> str:
-        """Extract text using pdfminer (best for academic papers and complex formatting)"""
+    def _pages_with_pdfminer(self, pdf_path: str) -> List[ExtractedPage]:
+        """Extract pages using pdfminer (best for academic papers and complex formatting)"""
         laparams = LAParams(
             detect_vertical=True,
             word_margin=0.1,
@@ -165,27 +250,24 @@ class PDFProcessor:
         
         text = pdfminer_extract_text(pdf_path, laparams=laparams)
         
-        # Add page markers (approximate, since pdfminer doesn't give page info easily)
-        if text:
-            # Split by form feed characters or large gaps to approximate pages
-            pages = re.split(r'\f|\n\s*\n\s*\n\s*\n', text)
-            formatted_text = ""
-            for i, page_content in enumerate(pages):
-                if page_content.strip():
-                    formatted_text += f"\n\n--- Page {i + 1} ---\n{page_content.strip()}"
-            return formatted_text
-        
-        return text
+        # Page numbers are approximate, since pdfminer doesn't give page info easily
+        if not text:
+            return []
+        
+        # Split by form feed characters or large gaps to approximate pages
+        page_texts = re.split(r'\f|\n\s*\n\s*\n\s*\n', text)
+        return [ExtractedPage(i + 1, page_content.strip())
+                for i, page_content in enumerate(page_texts) if page_content.strip()]
 
-    def _extract_with_ocr(self, pdf_path: str) -> str:
-        """Extract text using OCR for scanned PDFs or image-based content"""
+    def _pages_with_ocr(self, pdf_path: str) -> List[ExtractedPage]:
+        """Extract pages using OCR for scanned PDFs or image-based content"""
         try:
             # Check if tesseract is available
             pytesseract.get_tesseract_version()
         except Exception:
             raise Exception("Tesseract OCR not installed. Cannot process image-based PDFs.")
         
-        text = ""
+        pages = []
         doc = fitz.open(pdf_path)
         
         for page_num in range(len(doc)):
@@ -207,66 +289,29 @@ class PDFProcessor:
                     # Extract text using OCR
                     ocr_text = pytesseract.image_to_string(img, config='--psm 6')
                     if ocr_text.strip():
-                        text += f"\n\n--- Page {page_num + 1} (OCR) ---\n{ocr_text}"
+                        pages.append(ExtractedPage(page_num + 1, ocr_text, is_ocr=True))
                 else:
-                    text += f"\n\n--- Page {page_num + 1} ---\n{page_text}"
+                    pages.append(ExtractedPage(page_num + 1, page_text))
                     
             except Exception as e:
                 print(f"OCR failed for page {page_num + 1}: {str(e)}")
                 continue
                 
         doc.close()
-        return text
+        return pages
 
     def _assess_text_quality(self, text: str) -> float:
         """Assess the quality of extracted text to choose the best method"""
-        if not text or len(text.strip()) < 10:
-            return 0.0
-        
-        # Count readable characters vs total characters
-        readable_chars = len(re.findall(r'[a-zA-Z0-9\s\.,;:!?()\-]', text))
-        total_chars = len(text)
-        
-        if total_chars == 0:
-            return 0.0
-        
-        readability_score = readable_chars / total_chars
-        
-        # Bonus for having complete words and sentences
-        words = text.split()
-        complete_words = [w for w in words if len(w) > 2 and w.isascii()]
-        word_score = len(complete_words) / len(words) if words else 0
-        
-        # Check for common academic/document patterns
-        pattern_score = 0
-        patterns = [r'\b\w+\b', r'[.!?]', r'\d+', r'[A-Z][a-z]+']
-        for pattern in patterns:
-            if re.search(pattern, text):
-                pattern_score += 0.1
-        
-        # Combined quality score
-        quality = (readability_score * 0.5 + word_score * 0.3 + min(pattern_score, 0.2))
-        return min(quality, 1.0)
+        return text_quality(text)
     
     def enhanced_clean_text(self, text: str) -> str:
-        """Enhanced text cleaning with better academic content preservation"""
-        # Preserve section headers and important formatting
-        text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)  # Normalize multiple newlines
-        
-        # Fix common PDF extraction issues
-        text = re.sub(r'(\w)-\s*\n\s*(\w)', r'\1\2', text)  # Fix hyphenated words split across lines
-        text = re.sub(r'\s+', ' ', text)  # Normalize whitespace
+        """Enhanced text cleaning with better academic content preservation
         
-        # Preserve important academic formatting
-        text = re.sub(r'([.!?])\s*([A-Z])', r'\1\n\n\2', text)  # Add breaks after sentences starting new topics
-        
-        # Preserve numbered lists and bullet points
-        text = re.sub(r'\n\s*(\d+\.|\•|\*|\-)\s*', r'\n\1 ', text)
-        
-        # Remove problematic characters but preserve academic symbols
-        text = re.sub(r'[^\w\s\.,;:!?()\-+=/\'"°%$#@&\[\]{}]', '', text)
-        
-        return text.strip()
+        Fixes words hyphenated across lines, normalizes whitespace, adds breaks after
+        sentences starting new topics and removes problematic characters while
+        preserving academic symbols - all in one streaming pass (see TextCleaner).
+        """
+        return self.text_cleaner.clean(text)
     
     def create_enhanced_chunks(self, text: str, filename: str) -> List[Dict]:
         """Create intelligent chunks with enhanced context and metadata"""
@@ -296,71 +341,31 @@ class PDFProcessor:
     
     def analyze_chunk_content(self, chunk: str, filename: str, chunk_index: int) -> Dict:
         """Analyze chunk content to extract meaningful metadata"""
+        features = self.analyzer.analyze(chunk)
         metadata = {
             'source': filename,
             'chunk_id': chunk_index,
-            'page': self.extract_page_number(chunk),
-            'content_type': self.identify_content_type(chunk),
-            'key_concepts': self.extract_key_concepts(chunk),
-            'academic_elements': self.identify_academic_elements(chunk),
-            'word_count': len(chunk.split()),
-            'sentence_count': len([s for s in chunk.split('.') if s.strip()])
+            'page': features['page'],
+            'content_type': features['content_type'],
+            'key_concepts': features['key_concepts'],
+            'academic_elements': features['academic_elements'],
+            'word_count': features['word_count'],
+            'sentence_count': features['sentence_count']
         }
         
         return metadata
     
     def identify_content_type(self, chunk: str) -> str:
         """Identify the type of academic content in the chunk"""
-        chunk_lower = chunk.lower()
-        
-        # Check for different types of academic content
-        if any(keyword in chunk_lower for keyword in self.academic_keywords['definition']):
-            return 'definition'
-        elif any(keyword in chunk_lower for keyword in self.academic_keywords['example']):
-            return 'example'
-        elif any(keyword in chunk_lower for keyword in self.academic_keywords['process']):
-            return 'process'
-        elif any(keyword in chunk_lower for keyword in self.academic_keywords['comparison']):
-            return 'comparison'
-        elif re.search(r'\d+\.\s|\•\s|\*\s', chunk):
-            return 'list'
-        elif '?' in chunk:
-            return 'question'
-        else:
-            return 'general'
+        return self.analyzer.content_type(chunk)
     
     def extract_key_concepts(self, chunk: str) -> List[str]:
         """Extract key concepts and technical terms from the chunk"""
-        # Simple keyword extraction (can be enhanced with NLP)
-        words = re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b', chunk)  # Capitalized terms
-        technical_terms = re.findall(r'\b[a-z]+(?:_[a-z]+)*\b', chunk)  # Technical terms with underscores
-        
-        # Filter and clean
-        key_concepts = []
-        for word in words + technical_terms:
-            if len(word) > 3 and word.lower() not in ['page', 'chapter', 'section']:
-                key_concepts.append(word)
-        
-        return list(set(key_concepts))[:10]  # Return top 10 unique concepts
+        return key_concepts(chunk)  # Top 10 unique concepts
     
     def identify_academic_elements(self, chunk: str) -> List[str]:
         """Identify academic elements like definitions, examples, etc."""
-        elements = []
-        chunk_lower = chunk.lower()
-        
-        for element_type, keywords in self.academic_keywords.items():
-            if any(keyword in chunk_lower for keyword in keywords):
-                elements.append(element_type)
-        
-        # Check for additional elements
-        if re.search(r'\d+\.\s|\•\s|\*\s', chunk):
-            elements.append('list')
-        if re.search(r'figure\s+\d+|table\s+\d+|diagram', chunk_lower):
-            elements.append('reference')
-        if '?' in chunk:
-            elements.append('question')
-        
-        return elements
+        return self.analyzer.academic_elements(chunk)
     
     def add_contextual_info(self, current_chunk: str, all_chunks: List[str], index: int) -> str:
         """Add contextual information from surrounding chunks"""
@@ -386,10 +391,7 @@ class PDFProcessor:
     
     def extract_page_number(self, chunk: str) -> str:
         """Extract page number from chunk content"""
-        page_match = re.search(r'--- Page (\d+) ---', chunk)
-        if page_match:
-            return page_match.group(1)
-        return 'Unknown'
+        return self.analyzer.page_number(chunk)
         text = text.replace('\\n', '\n')
         text = text.replace('\\t', '\t')
         
@@ -399,6 +401,7 @@ class PDFProcessor:
         
         return '\n'.join(cleaned_lines)
     
+    @traced("pdf_processor.process_pdf")
     def process_pdf(self, pdf_path: str) -> List[Dict]:
         """Enhanced PDF processing with detailed feedback and multi-library support"""
         filename = pdf_path.split('/')[-1]
@@ -406,21 +409,20 @@ class PDFProcessor:
         
         # Extract text using enhanced multi-library approach
         try:
-            full_text = self.extract_text_from_pdf(pdf_path)
+            pages = self.extract_pages(pdf_path)
+            full_text, page_map, chunks, records = self.split_pages(pages)
             
             if not full_text.strip():
                 raise Exception("❌ No text could be extracted from the PDF. This might be a scanned document requiring OCR or a corrupted file.")
             
-            print(f"✅ Successfully extracted {len(full_text)} characters from {filename}")
-            
-            # Split into chunks
-            chunks = self.text_splitter.split_text(full_text)
+            print(f"✅ Successfully extracted {len(full_text)} characters from {len(page_map)} pages of {filename}")
             print(f"📄 Created {len(chunks)} text chunks for processing")
             
             # Create document objects with enhanced metadata
             documents = []
             for i, chunk in enumerate(chunks):
                 # Enhanced metadata with text quality assessment
+                features = self.analyzer.analyze(chunk)
                 doc = {
                     'content': chunk,
                     'metadata': {
@@ -428,11 +430,12 @@ class PDFProcessor:
                         'chunk_id': i,
                         'total_chunks': len(chunks),
                         'chunk_size': len(chunk),
-                        'text_quality': self._assess_text_quality(chunk),
-                        'content_type': self.identify_content_type(chunk),
-                        'word_count': len(chunk.split()),
+                        'text_quality': features['text_quality'],
+                        'content_type': features['content_type'],
+                        'word_count': features['word_count'],
                         'has_tables': '[TABLE]' in chunk,
-                        'is_ocr': '(OCR)' in chunk
+                        'is_ocr': self._covers_ocr_page(page_map, records[i]),
+                        **records.metadata(i)
                     }
                 }
                 documents.append(doc)
@@ -613,43 +616,55 @@ class PDFProcessor:
             metadata['extraction_method'] = 'failed'
             return metadata
     
-    def get_page_content(self, pdf_path: str, page_num: int) -> str:
-        """Get content from a specific page"""
+    def get_page_content(self, pdf_path: str, page_num: int, page_store=None) -> str:
+        """Get content from a specific page (0-based)
+        
+        Pages of an ingested PDF come from the page store without opening the file,
+        which /upload has usually deleted by then.
+        """
+        if page_store is not None:
+            page = page_store.get_page(os.path.basename(pdf_path), page_num + 1)
+            if page is not None:
+                return page.text
+        
         try:
             with open(pdf_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
                 if 0 <= page_num < len(pdf_reader.pages):
                     page = pdf_reader.pages[page_num]
-                    return self.clean_text(page.extract_text())
+                    return self.enhanced_clean_text(page.extract_text())
                 else:
                     raise Exception(f"Page {page_num + 1} does not exist")
         except Exception as e:
             raise Exception(f"Error reading page {page_num + 1}: {str(e)}")
     
-    def search_in_pdf(self, pdf_path: str, query: str) -> List[Dict]:
-        """Search for specific text in PDF and return matching chunks"""
-        documents = self.process_pdf(pdf_path)
-        matching_chunks = []
+    def search_in_pdf(self, pdf_path: str, query: str, vector_store=None) -> List[Dict]:
+        """Search for words and quoted phrases in a PDF and return matching chunks
         
-        query_lower = query.lower()
+        A PDF already ingested into vector_store is searched through its keyword
+        index without opening the file; otherwise the PDF is processed and indexed here.
+        """
+        source = os.path.basename(pdf_path)
+        if vector_store is not None and vector_store.get_source_metadata(source):
+            return vector_store.keyword_search(query, source=source, limit=None)
         
-        for doc in documents:
-            content_lower = doc['content'].lower()
-            if query_lower in content_lower:
-                # Find the position of the match
-                match_start = content_lower.find(query_lower)
-                
-                # Extract context around the match
-                context_start = max(0, match_start - 100)
-                context_end = min(len(doc['content']), match_start + len(query) + 100)
-                context = doc['content'][context_start:context_end]
-                
-                matching_chunks.append({
-                    'content': doc['content'],
-                    'context': context,
-                    'metadata': doc['metadata'],
-                    'match_position': match_start
-                })
+        documents = self.process_pdf(pdf_path)
+        keyword_index = KeywordIndex()
+        keyword_index.add(enumerate(doc['content'] for doc in documents))
+        
+        matching_chunks = []
+        for i, spans in keyword_index.search(query):
+            doc = documents[i]
+            match = highlight(doc['content'], spans)
+            matching_chunks.append({
+                'content': doc['content'],
+                'context': match['context'],
+                'highlighted': match['highlighted'],
+                'matches': match['matches'],
+                'match_count': len(spans),
+                'metadata': doc['metadata'],
+                'match_position': match['matches'][0][0] if match['matches'] else -1
+            })
         
         return matching_chunks
 
@@ -674,6 +689,117 @@ class PDFProcessor:
         
         return documents
 
+    @traced("pdf_processor.chunk")
+    def split_pages(self, pages: List[ExtractedPage]) -> Tuple[str, PageMap, List[str], ChunkRecords]:
+        """Join pages without markers and split them into chunks with page-aware records
+        
+        Returns the joined source text, its page map, the chunks and one record per
+        chunk with its character offsets into the source text and its page span.
+        """
+        text, page_map = PageMap.join_pages(pages)
+        chunks_with_offsets = self.text_splitter.split_text_with_offsets(text)
+        records = ChunkRecords.from_offsets(chunks_with_offsets, page_map)
+        return text, page_map, [chunk for chunk, _ in chunks_with_offsets], records
+
+    def create_page_documents(self, pages: List[ExtractedPage], filename: str) -> List[Dict]:
+        """Create document chunks from extracted pages, with page numbers and offsets in the metadata"""
+        _, page_map, chunks, records = self.split_pages(pages)
+        
+        documents = []
+        for i, chunk in enumerate(chunks):
+            doc = {
+                'content': chunk,
+                'metadata': {
+                    'source': filename,
+                    'chunk_id': i,
+                    'total_chunks': len(chunks),
+                    'chunk_size': len(chunk),
+                    'is_ocr': self._covers_ocr_page(page_map, records[i]),
+                    **records.metadata(i)
+                }
+            }
+            documents.append(doc)
+        
+        return documents
+
+    @traced("pdf_processor.plan_page_update")
+    def plan_page_update(self, pages: List[ExtractedPage], filename: str, old_manifest: Optional[PageManifest] = None,
+                         old_metadata: List[Dict] = ()) -> PageUpdate:
+        """Work needed to bring a source's stored chunks up to date with a (re-)uploaded version
+        
+        Chunks lying on pages whose text is unchanged are kept, with their offsets and
+        page numbers moved to the new layout. Only text they do not cover is chunked
+        again. Without an old manifest (first upload, or chunks stored before page
+        hashing) every old chunk is replaced.
+        """
+        text, page_map, manifest = PageManifest.from_pages(pages)
+        diff = PageDiff(old_manifest, manifest) if old_manifest else None
+        
+        removed_chunk_ids = []
+        metadata_updates = {}
+        kept_spans = []
+        for metadata in old_metadata:
+            chunk_span = None
+            if diff and 'char_start' in metadata:
+                chunk_span = diff.remap(metadata['char_start'], metadata['char_end'])
+            if chunk_span is None:
+                removed_chunk_ids.append(metadata['chunk_id'])
+                continue
+            
+            updates = self._location_fields(page_map, chunk_span)
+            if 'locations' in metadata:
+                # Copies on changed pages are dropped; the re-chunked text brings them back
+                locations = []
+                for location in metadata['locations']:
+                    location_span = diff.remap(location['char_start'], location['char_end']) \
+                        if 'char_start' in location else None
+                    if location_span:
+                        locations.append(dict(location, **self._location_fields(page_map, location_span)))
+                updates.update(locations=locations, duplicate_count=max(len(locations) - 1, 0))
+            metadata_updates[metadata['chunk_id']] = updates
+            kept_spans.append(chunk_span)
+        
+        # Re-chunk only what the kept chunks leave uncovered, overlapping them like neighbors do
+        chunks_with_offsets = []
+        for region_start, region_end in uncovered_regions(text, kept_spans, self.chunk_overlap):
+            chunks_with_offsets.extend(
+                (chunk, region_start + offset)
+                for chunk, offset in self.text_splitter.split_text_with_offsets(text[region_start:region_end])
+            )
+        records = ChunkRecords.from_offsets(chunks_with_offsets, page_map)
+        
+        total_chunks = len(metadata_updates) + len(chunks_with_offsets)
+        for updates in metadata_updates.values():
+            updates['total_chunks'] = total_chunks
+        
+        first_id = max((metadata['chunk_id'] for metadata in old_metadata), default=-1) + 1
+        documents = []
+        for i, (chunk, _) in enumerate(chunks_with_offsets):
+            documents.append({
+                'content': chunk,
+                'metadata': {
+                    'source': filename,
+                    'chunk_id': first_id + i,
+                    'total_chunks': total_chunks,
+                    'chunk_size': len(chunk),
+                    'is_ocr': self._covers_ocr_page(page_map, records[i]),
+                    **records.metadata(i)
+                }
+            })
+        
+        changed_pages = diff.changed_pages if diff else list(page_map.numbers)
+        return PageUpdate(manifest, removed_chunk_ids, metadata_updates, documents, changed_pages, pages)
+
+    @staticmethod
+    def _location_fields(page_map: PageMap, char_span: Tuple[int, int]) -> Dict:
+        page_start, page_end = page_map.page_span(*char_span)
+        return {'char_start': char_span[0], 'char_end': char_span[1], 'page': page_start, 'page_end': page_end}
+
+    @staticmethod
+    def _covers_ocr_page(page_map: PageMap, record) -> bool:
+        return bool(page_map.ocr_pages) and any(
+            page in page_map.ocr_pages for page in range(record.page_start, record.page_end + 1))
+
     def chunk_text(self, text: str, filename: str = "document") -> List[Dict]:
         """Legacy method name - alias for create_document_chunks"""
         return self.create_document_chunks(text, filename)
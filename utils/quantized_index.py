@@ -0,0 +1,216 @@
+import faiss
+import numpy as np
+from typing import Optional, Tuple
+import json
+import os
+
+
+class QuantizedVectorIndex:
+    """Compressed FAISS index (SQ8 or PQ codes) with exact re-ranking from an on-disk float32 file
+
+    Only the compact codes live in RAM. The full-precision vectors are appended to
+    ``vector_path`` and memory-mapped, so re-ranking the top candidates reads a
+    handful of rows from the page cache instead of keeping every float in memory.
+    """
+
+    SUPPORTED_TYPES = ("sq8", "pq")
+
+    def __init__(self, dimension: int, index_type: str = "sq8", vector_path: str = "vectors.f32",
+                 rerank_factor: Optional[int] = None, pq_subquantizers: Optional[int] = None,
+                 min_train_size: Optional[int] = None):
+        if index_type not in self.SUPPORTED_TYPES:
+            raise ValueError(f"Unsupported quantized index type: {index_type}")
+
+        self.dimension = dimension
+        self.index_type = index_type
+        self.vector_path = vector_path
+        # PQ codes are coarser, so they need a deeper candidate list to re-rank
+        self.rerank_factor = max(1, rerank_factor or (10 if index_type == "pq" else 4))
+
+        # PQ splits each vector into sub-vectors of 4 dims by default (96 bytes for 384 dims)
+        self.pq_subquantizers = pq_subquantizers or self._default_subquantizers(dimension)
+
+        # PQ needs at least 256 points per 8-bit codebook; SQ8 only needs a value range
+        self.min_train_size = min_train_size or (1024 if index_type == "pq" else 256)
+
+        self.codes_index = self._new_codes_index()
+        self.ntotal = 0
+        self._vectors = None  # Lazily opened memmap over vector_path
+
+    @staticmethod
+    def _default_subquantizers(dimension: int) -> int:
+        """Largest sub-quantizer count giving at least 4 dims per sub-vector"""
+        for m in range(max(1, dimension // 4), 0, -1):
+            if dimension % m == 0:
+                return m
+        return 1
+
+    def _new_codes_index(self):
+        """Create an untrained codes index of the configured type"""
+        if self.index_type == "pq":
+            return faiss.IndexPQ(self.dimension, self.pq_subquantizers, 8, faiss.METRIC_INNER_PRODUCT)
+        return faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codes_index.is_trained
+
+    def float_vectors(self) -> np.ndarray:
+        """Memory-mapped view over the full-precision vectors"""
+        if self.ntotal == 0:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        if self._vectors is None or self._vectors.shape[0] != self.ntotal:
+            self._vectors = np.memmap(self.vector_path, dtype=np.float32, mode='r',
+                                      shape=(self.ntotal, self.dimension))
+        return self._vectors
+
+    def add(self, vectors: np.ndarray):
+        """Append vectors to the float file and encode them into the codes index"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.shape[0] == 0:
+            return
+
+        directory = os.path.dirname(self.vector_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Write at the logical end so stale bytes from an earlier run are overwritten
+        mode = 'r+b' if os.path.exists(self.vector_path) else 'wb'
+        with open(self.vector_path, mode) as f:
+            f.seek(self.ntotal * self.dimension * 4)
+            f.write(vectors.tobytes())
+            f.truncate()
+
+        self.ntotal += vectors.shape[0]
+        # Map eagerly so this index stays readable even if a later generation replaces the file
+        self._vectors = None
+        self.float_vectors()
+
+        if self.is_trained:
+            self.codes_index.add(vectors)
+        elif self.ntotal >= self.min_train_size:
+            self._train_and_encode()
+
+    def _train_and_encode(self):
+        """Train the quantizer on the stored vectors and encode all of them"""
+        all_vectors = self.float_vectors()
+
+        # Train on a bounded sample to keep training time independent of corpus size
+        sample_size = min(self.ntotal, 65536)
+        sample_ids = np.random.default_rng(1234).choice(self.ntotal, sample_size, replace=False)
+        self.codes_index.train(np.ascontiguousarray(all_vectors[np.sort(sample_ids)]))
+
+        for start in range(0, self.ntotal, 65536):
+            self.codes_index.add(np.ascontiguousarray(all_vectors[start:start + 65536]))
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate search over codes, then exact inner-product re-ranking of the candidates"""
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+        ids = np.full((queries.shape[0], k), -1, dtype=np.int64)
+        if self.ntotal == 0:
+            return scores, ids
+
+        all_vectors = self.float_vectors()
+
+        if self.is_trained:
+            candidate_count = min(self.ntotal, k * self.rerank_factor)
+            _, candidates = self.codes_index.search(queries, candidate_count)
+        else:
+            # Too few vectors to train yet - exact search over the float file is cheap
+            candidates = np.tile(np.arange(self.ntotal), (queries.shape[0], 1))
+
+        for row, query in enumerate(queries):
+            candidate_ids = candidates[row][candidates[row] >= 0]
+            if candidate_ids.size == 0:
+                continue
+            # Sorted ids give sequential reads from the memmap
+            candidate_ids = np.unique(candidate_ids)
+            exact_scores = all_vectors[candidate_ids] @ query
+
+            top = min(k, candidate_ids.size)
+            best = np.argpartition(-exact_scores, top - 1)[:top]
+            best = best[np.argsort(-exact_scores[best])]
+            scores[row, :top] = exact_scores[best]
+            ids[row, :top] = candidate_ids[best]
+
+        return scores, ids
+
+    def clone(self) -> 'QuantizedVectorIndex':
+        """Independent copy sharing the append-only float file
+
+        Appends from the clone land beyond this index's ``ntotal``, so rows this
+        index can see are never rewritten.
+        """
+        copy = QuantizedVectorIndex(
+            self.dimension,
+            index_type=self.index_type,
+            vector_path=self.vector_path,
+            rerank_factor=self.rerank_factor,
+            pq_subquantizers=self.pq_subquantizers,
+            min_train_size=self.min_train_size
+        )
+        copy.codes_index = faiss.clone_index(self.codes_index)
+        copy.ntotal = self.ntotal
+        copy._vectors = self._vectors
+        return copy
+
+    def reconstruct(self, idx: int) -> np.ndarray:
+        """Return the exact stored vector for a row"""
+        return np.array(self.float_vectors()[idx], dtype=np.float32)
+
+    def reset(self):
+        """Drop all vectors and codes"""
+        self.codes_index = self._new_codes_index()
+        self.ntotal = 0
+        self._vectors = None
+        if os.path.exists(self.vector_path):
+            os.remove(self.vector_path)
+
+    def memory_usage(self) -> int:
+        """Approximate resident bytes held by the codes index"""
+        return self.ntotal * self.codes_index.sa_code_size() if self.is_trained else 0
+
+    def save(self, directory: str):
+        """Persist the codes index and layout information (the float file is already on disk)"""
+        os.makedirs(directory, exist_ok=True)
+        if self.is_trained:
+            faiss.write_index(self.codes_index, os.path.join(directory, "quantized_index.bin"))
+        with open(os.path.join(directory, "quantized_index.json"), "w") as f:
+            json.dump({
+                'index_type': self.index_type,
+                'dimension': self.dimension,
+                'ntotal': self.ntotal,
+                'pq_subquantizers': self.pq_subquantizers,
+                'vector_file': os.path.basename(self.vector_path)
+            }, f, indent=2)
+
+    def load(self, directory: str) -> bool:
+        """Restore a saved index; returns False if nothing compatible is stored"""
+        info_path = os.path.join(directory, "quantized_index.json")
+        if not os.path.exists(info_path):
+            return False
+
+        with open(info_path, "r") as f:
+            info = json.load(f)
+        if info.get('index_type') != self.index_type or info.get('dimension') != self.dimension:
+            return False
+
+        vector_path = os.path.join(directory, info.get('vector_file', os.path.basename(self.vector_path)))
+        expected_bytes = info['ntotal'] * self.dimension * 4
+        if not os.path.exists(vector_path) or os.path.getsize(vector_path) < expected_bytes:
+            return False
+
+        self.vector_path = vector_path
+        self.pq_subquantizers = info.get('pq_subquantizers', self.pq_subquantizers)
+        self.ntotal = info['ntotal']
+        self._vectors = None
+
+        codes_path = os.path.join(directory, "quantized_index.bin")
+        if os.path.exists(codes_path):
+            self.codes_index = faiss.read_index(codes_path)
+        else:
+            self.codes_index = self._new_codes_index()
+            if self.ntotal >= self.min_train_size:
+                self._train_and_encode()
+        return True
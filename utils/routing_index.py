@@ -0,0 +1,85 @@
+"""
+Two-level retrieval: route a query to a few sections, then search only their chunks.
+
+Each source's chunks are cut, in text order, into sections of at most
+``section_chunks`` consecutive chunks; a short document is a single section, so
+its centroid is the document's. A section is represented by the normalized mean
+of its chunk vectors. A query is first matched against the section centroids (a
+small flat index, one entry per section instead of per chunk), and exact scores
+are then computed only for the chunks of the best sections, so search cost
+follows the routed subset rather than the corpus size.
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+# Consecutive chunks per section; about 10-20 pages of a textbook with the default chunk size
+SECTION_CHUNKS = 32
+
+
+def section_rows(document_metadata: Sequence[Dict], section_chunks: int = SECTION_CHUNKS) -> List[List[int]]:
+    """Rows of every section: each source's chunks in text order, cut every section_chunks"""
+    rows_by_source = {}
+    for row, metadata in enumerate(document_metadata):
+        rows_by_source.setdefault(metadata.get('source', 'Unknown'), []).append(row)
+
+    sections = []
+    for rows in rows_by_source.values():
+        # Page updates append a source's new chunks at the end; order by text offset instead
+        rows.sort(key=lambda row: (document_metadata[row].get('char_start', row), row))
+        sections.extend(rows[start:start + section_chunks] for start in range(0, len(rows), section_chunks))
+    return sections
+
+
+class RoutingIndex:
+    """Centroids of one generation's sections, searched to pick which chunks to score"""
+
+    def __init__(self, sections: List[List[int]], keys: List[Tuple[int, ...]], centroids: np.ndarray):
+        self.sections = [np.asarray(rows, dtype=np.int64) for rows in sections]
+        self.keys = keys  # Chunk uids of each section, to reuse centroids in the next generation
+        self.centroids = centroids
+        self.dimension = centroids.shape[1]
+        self.index = faiss.IndexFlatIP(self.dimension)
+        if len(centroids):
+            self.index.add(centroids)
+
+    def __len__(self) -> int:
+        return len(self.sections)
+
+    @classmethod
+    def build(cls, document_metadata: Sequence[Dict], row_vectors: Callable[[List[int]], np.ndarray],
+              dimension: int, section_chunks: int = SECTION_CHUNKS,
+              previous: Optional["RoutingIndex"] = None) -> "RoutingIndex":
+        """Routing index for a generation, reusing the centroids of sections unchanged since previous"""
+        sections = section_rows(document_metadata, section_chunks)
+        keys = [tuple(document_metadata[row]['chunk_uid'] for row in rows) for rows in sections]
+        centroids = np.zeros((len(sections), dimension), dtype=np.float32)
+
+        known = {}
+        if previous is not None and previous.dimension == dimension:
+            known = dict(zip(previous.keys, previous.centroids))
+        stale = []
+        for i, key in enumerate(keys):
+            if key in known:
+                centroids[i] = known[key]
+            else:
+                stale.append(i)
+
+        if stale:
+            # One bulk read of every vector that is needed, then one mean per section
+            rows = [row for i in stale for row in sections[i]]
+            vectors = np.asarray(row_vectors(rows), dtype=np.float32)
+            starts = np.cumsum([0] + [len(sections[i]) for i in stale[:-1]])
+            centroids[stale] = np.add.reduceat(vectors, starts, axis=0)
+            faiss.normalize_L2(centroids)
+
+        return cls(sections, keys, centroids)
+
+    def route(self, query: np.ndarray, num_sections: int) -> np.ndarray:
+        """Rows of the chunks in the num_sections sections closest to the query"""
+        if not len(self.sections):
+            return np.zeros(0, dtype=np.int64)
+        _, picked = self.index.search(query.reshape(1, -1).astype(np.float32), min(num_sections, len(self.sections)))
+        return np.concatenate([self.sections[i] for i in picked[0] if i >= 0])
@@ -0,0 +1,171 @@
+import faiss
+import numpy as np
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import hashlib
+import json
+import os
+import sys
+import threading
+import zlib
+
+
+class DocumentSegment:
+    """Immutable, content-addressed set of chunks with one embedding matrix and one text store"""
+
+    def __init__(self, segment_id: str, embeddings: np.ndarray, documents: List[str], metadata: List[Dict]):
+        self.segment_id = segment_id
+        self.documents = tuple(documents)
+        self.metadata = tuple(metadata)
+
+        self.index = faiss.IndexFlatIP(embeddings.shape[1])
+        if len(embeddings):
+            self.index.add(np.ascontiguousarray(embeddings, dtype=np.float32))
+
+        self.memory_bytes = (
+            self.index.ntotal * self.index.d * 4
+            + sum(sys.getsizeof(doc) for doc in self.documents)
+            + sum(sys.getsizeof(meta.get('original_content', '')) + 512 for meta in self.metadata)
+        )
+
+    def __len__(self):
+        return len(self.documents)
+
+
+class SegmentRegistry:
+    """Shares document segments between sessions so identical uploads are embedded and stored once
+
+    Every segment is written to ``segment_dir`` when it is created. Only segments
+    referenced by at least one resident session are kept in memory; the rest are
+    reloaded from disk on demand.
+    """
+
+    def __init__(self, segment_dir: str):
+        self.segment_dir = segment_dir
+        os.makedirs(segment_dir, exist_ok=True)
+
+        self._resident = {}  # segment_id -> DocumentSegment
+        self._resident_refs = {}  # segment_id -> number of resident sessions using it
+        self._pending = {}  # segment_id -> Event for segments currently being embedded
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def content_hash(model_name: str, documents: List[str]) -> str:
+        """Stable identifier for a batch of chunk texts
+
+        Only the texts count: the same chunks uploaded under another name are the same
+        segment, and what a caller says about them is kept on its segment reference.
+        """
+        digest = hashlib.sha256(model_name.encode('utf-8'))
+        for doc in documents:
+            digest.update(doc.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _segment_path(self, segment_id: str) -> str:
+        return os.path.join(self.segment_dir, f"{segment_id}.npz")
+
+    def exists(self, segment_id: str) -> bool:
+        return segment_id in self._resident or os.path.exists(self._segment_path(segment_id))
+
+    def get_or_create(self, segment_id: str, documents: List[str], metadata: List[Dict],
+                      embed_fn: Callable[[List[str]], np.ndarray]) -> Tuple[DocumentSegment, bool]:
+        """A segment, embedded only if no one has done so yet, and whether this call created it
+
+        The segment is returned acquired, so garbage collection cannot delete it before
+        the caller references it; the caller must release it if it does not.
+        """
+        while True:
+            with self._lock:
+                if self.exists(segment_id):
+                    return self._acquire(segment_id), False
+                waiter = self._pending.get(segment_id)
+                if waiter is None:
+                    # This caller embeds; concurrent uploads of the same content wait for it
+                    self._pending[segment_id] = threading.Event()
+                    break
+            waiter.wait()
+
+        try:
+            embeddings = embed_fn(documents)
+            self._write_segment(segment_id, embeddings, documents, metadata)
+            with self._lock:
+                # Acquired while still pending, so there is no moment garbage collection may delete it
+                segment = self._acquire(segment_id)
+        finally:
+            with self._lock:
+                self._pending.pop(segment_id).set()
+        return segment, True
+
+    def _write_segment(self, segment_id: str, embeddings: np.ndarray, documents: List[str], metadata: List[Dict]):
+        """Persist a new segment (write-once, atomic rename)"""
+        records = zlib.compress(json.dumps({
+            'documents': documents,
+            'metadata': metadata
+        }, default=str).encode('utf-8'))
+
+        path = self._segment_path(segment_id)
+        temp_path = path + ".tmp.npz"
+        np.savez(
+            temp_path,
+            embeddings=np.asarray(embeddings, dtype=np.float32),
+            records=np.frombuffer(records, dtype=np.uint8)
+        )
+        os.replace(temp_path, path)
+
+    def _read_segment(self, segment_id: str) -> DocumentSegment:
+        with np.load(self._segment_path(segment_id)) as stored:
+            embeddings = stored['embeddings']
+            records = json.loads(zlib.decompress(stored['records'].tobytes()).decode('utf-8'))
+        return DocumentSegment(segment_id, embeddings, records['documents'], records['metadata'])
+
+    def acquire(self, segment_id: str) -> DocumentSegment:
+        """Take a resident reference to a segment, loading it if needed"""
+        with self._lock:
+            return self._acquire(segment_id)
+
+    def _acquire(self, segment_id: str) -> DocumentSegment:
+        segment = self._resident.get(segment_id)
+        if segment is None:
+            segment = self._read_segment(segment_id)
+            self._resident[segment_id] = segment
+        self._resident_refs[segment_id] = self._resident_refs.get(segment_id, 0) + 1
+        return segment
+
+    def get(self, segment_id: str) -> Optional[DocumentSegment]:
+        """Resident segment for an id already acquired by the caller"""
+        return self._resident.get(segment_id)
+
+    def release(self, segment_id: str):
+        """Drop a resident reference; unused segments leave memory but stay on disk"""
+        with self._lock:
+            refs = self._resident_refs.get(segment_id, 0) - 1
+            if refs > 0:
+                self._resident_refs[segment_id] = refs
+            else:
+                self._resident_refs.pop(segment_id, None)
+                self._resident.pop(segment_id, None)
+
+    def resident_memory_bytes(self) -> int:
+        """Memory held by resident segments, each counted once however many sessions share it"""
+        with self._lock:
+            return sum(segment.memory_bytes for segment in self._resident.values())
+
+    def collect_garbage(self, live_segment_ids: Iterable[str]):
+        """Delete on-disk segments that no session (resident or spilled) references"""
+        live = set(live_segment_ids)
+        with self._lock:
+            live.update(self._resident)
+            live.update(self._pending)
+            for filename in os.listdir(self.segment_dir):
+                if not filename.endswith(".npz") or ".tmp" in filename:
+                    continue
+                if filename[:-len(".npz")] not in live:
+                    os.remove(os.path.join(self.segment_dir, filename))
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'resident_segments': len(self._resident),
+                'shared_references': sum(self._resident_refs.values()),
+                'resident_memory_bytes': sum(segment.memory_bytes for segment in self._resident.values())
+            }
@@ -0,0 +1,269 @@
+"""
+Session index service shared by all web workers.
+
+One long-running process owns a SessionVectorStore (session indexes, the
+embedding model, the memory budget and eviction) and answers calls over an
+authenticated Unix socket. Web workers use ``SessionServiceClient``, which has the
+same methods as SessionVectorStore, so an upload handled by one worker and the
+next question handled by another see the same session without sticky routing.
+
+Run the service next to the web server:
+
+    python -m utils.session_service --socket /run/studymate/sessions.sock
+
+and point the workers at it with SESSION_SERVICE_SOCKET. The authkey is taken
+from SESSION_SERVICE_AUTHKEY, or generated by the service and written to
+``<socket>.key`` (readable by its user only) where clients find it. On SIGTERM
+resident sessions are spilled to the spill directory, so a restarted service
+still serves them.
+"""
+
+from typing import Dict, List, Optional
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+import argparse
+import os
+import queue
+import secrets
+import signal
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+SOCKET_ENV = "SESSION_SERVICE_SOCKET"
+AUTHKEY_ENV = "SESSION_SERVICE_AUTHKEY"
+
+# SessionVectorStore methods callable through the service
+REMOTE_METHODS = (
+    'create_session', 'get_session', 'clear_session', 'add_documents', 'search',
+    'get_session_stats', 'list_active_sessions', 'get_memory_stats', 'get_all_documents',
+    'resident_memory_bytes', 'embed_text', 'embed_texts'
+)
+
+
+class SessionServiceError(RuntimeError):
+    """The session service is unreachable or failed a call"""
+
+
+def _key_path(socket_path: str) -> str:
+    return socket_path + ".key"
+
+
+def _read_authkey(socket_path: str) -> bytes:
+    authkey = os.getenv(AUTHKEY_ENV)
+    if authkey:
+        return bytes.fromhex(authkey)
+    try:
+        with open(_key_path(socket_path)) as f:
+            return bytes.fromhex(f.read().strip())
+    except OSError:
+        raise SessionServiceError(f"No authkey: set {AUTHKEY_ENV} or start the service at {socket_path}")
+
+
+def _serve_connection(connection, store):
+    """Answer calls from one worker connection until it closes"""
+    handlers = {name: getattr(store, name) for name in REMOTE_METHODS}
+    handlers['info'] = lambda: {'model_name': store.model_name, 'dimension': store.dimension}
+    handlers['ping'] = lambda: 'pong'
+    while True:
+        try:
+            operation, args, kwargs = connection.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            reply = ('ok', handlers[operation](*args, **kwargs))
+        except Exception as e:
+            reply = ('error', type(e).__name__, str(e))
+        try:
+            connection.send(reply)
+        except OSError:
+            return
+
+
+def _claim_socket(socket_path: str):
+    """Remove a socket left by a dead service; refuse to start next to a live one"""
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(socket_path)
+        return
+    finally:
+        probe.close()
+    raise SessionServiceError(f"A session service is already running at {socket_path}")
+
+
+def run_service(socket_path: str, model_name: str = "all-MiniLM-L6-v2", max_memory_mb: int = 1024,
+                spill_dir: Optional[str] = None):
+    """Entry point of the session service process"""
+    from utils.session_vector_store import SessionVectorStore
+
+    _claim_socket(socket_path)
+    authkey = os.getenv(AUTHKEY_ENV)
+    if authkey:
+        authkey = bytes.fromhex(authkey)
+    else:
+        authkey = secrets.token_bytes(16)
+        # Only this user can read the key, and so connect to the socket
+        descriptor = os.open(_key_path(socket_path), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "w") as f:
+            f.write(authkey.hex())
+
+    store = SessionVectorStore(model_name=model_name, max_memory_mb=max_memory_mb, spill_dir=spill_dir)
+    listener = Listener(socket_path, family='AF_UNIX', authkey=authkey)
+    os.chmod(socket_path, 0o600)
+
+    def shutdown(signum, frame):
+        store.close()
+        store.spill_all()
+        listener.close()
+        print("🛑 Session service stopped; resident sessions were spilled to disk")
+        sys.stdout.flush()
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    print(f"✅ Session service listening on {socket_path} ({model_name}, {max_memory_mb} MB budget)")
+
+    while True:
+        try:
+            connection = listener.accept()
+        except (AuthenticationError, OSError):
+            continue  # A client with the wrong key, or one that hung up during the handshake
+        threading.Thread(target=_serve_connection, args=(connection, store), daemon=True).start()
+
+
+class SessionServiceClient:
+    """SessionVectorStore interface backed by the shared session service"""
+
+    def __init__(self, socket_path: Optional[str] = None, authkey: Optional[bytes] = None,
+                 connections: int = 8, connect_timeout: float = 10.0):
+        self.socket_path = socket_path or os.getenv(SOCKET_ENV)
+        if not self.socket_path:
+            raise SessionServiceError(f"Set {SOCKET_ENV} to the session service socket")
+        self.authkey = authkey or _read_authkey(self.socket_path)
+        self.connect_timeout = connect_timeout
+
+        # Connections are opened lazily, at most one per concurrent call up to the pool size
+        self._pool = queue.LifoQueue()
+        for _ in range(max(1, connections)):
+            self._pool.put(None)
+
+        info = self._call('info')
+        self.model_name = info['model_name']
+        self.dimension = info['dimension']
+
+    def _connect(self):
+        deadline = time.time() + self.connect_timeout
+        while True:
+            try:
+                return Client(self.socket_path, family='AF_UNIX', authkey=self.authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.time() > deadline:
+                    raise SessionServiceError(f"No session service at {self.socket_path}")
+                time.sleep(0.05)
+            except AuthenticationError:
+                raise SessionServiceError(f"The session service at {self.socket_path} rejected the authkey")
+
+    def _call(self, operation: str, *args, **kwargs):
+        connection = self._pool.get()
+        try:
+            if connection is None:
+                connection = self._connect()
+            try:
+                connection.send((operation, args, kwargs))
+            except OSError:
+                # A pooled connection to a service that has since restarted; nothing was sent
+                connection.close()
+                connection = self._connect()
+                connection.send((operation, args, kwargs))
+            reply = connection.recv()
+        except (EOFError, OSError) as e:
+            if connection is not None:
+                connection.close()
+            connection = None
+            raise SessionServiceError(f"Session service call {operation} failed: {e}")
+        finally:
+            self._pool.put(connection)
+
+        if reply[0] == 'ok':
+            return reply[1]
+        _, error_type, message = reply
+        if error_type == 'ValueError':
+            raise ValueError(message)  # e.g. an unknown session, as from SessionVectorStore
+        raise SessionServiceError(f"{operation} failed in the session service: {error_type}: {message}")
+
+    def create_session(self) -> str:
+        return self._call('create_session')
+
+    def get_session(self, session_id: str) -> Optional[Dict]:
+        return self._call('get_session', session_id)
+
+    def clear_session(self, session_id: str):
+        return self._call('clear_session', session_id)
+
+    def add_documents(self, session_id: str, documents: List[str], metadata: List[Dict] = None):
+        return self._call('add_documents', session_id, documents, metadata)
+
+    def search(self, session_id: str, query: str, k: int = 5) -> List[Dict]:
+        return self._call('search', session_id, query, k)
+
+    def get_session_stats(self, session_id: str) -> Dict:
+        return self._call('get_session_stats', session_id)
+
+    def list_active_sessions(self) -> List[Dict]:
+        return self._call('list_active_sessions')
+
+    def get_memory_stats(self) -> Dict:
+        return self._call('get_memory_stats')
+
+    def get_all_documents(self, session_id: str) -> List[Dict]:
+        return self._call('get_all_documents', session_id)
+
+    def resident_memory_bytes(self) -> int:
+        return self._call('resident_memory_bytes')
+
+    def embed_text(self, text: str) -> np.ndarray:
+        return self._call('embed_text', text)
+
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        return self._call('embed_texts', texts)
+
+    def close(self):
+        """Close this worker's connections; the service and its sessions keep running"""
+        while True:
+            try:
+                connection = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            if connection is not None:
+                connection.close()
+
+
+def open_session_store(**kwargs):
+    """The shared session service when SESSION_SERVICE_SOCKET is set, else an in-process store"""
+    if os.getenv(SOCKET_ENV):
+        return SessionServiceClient()
+    from utils.session_vector_store import SessionVectorStore
+    return SessionVectorStore(**kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="StudyMate session index service")
+    parser.add_argument("--socket", default=os.getenv(SOCKET_ENV))
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    parser.add_argument("--max-memory-mb", type=int, default=1024)
+    parser.add_argument("--spill-dir", help="Where idle and evicted sessions are kept")
+    arguments = parser.parse_args()
+    if not arguments.socket:
+        parser.error(f"--socket or {SOCKET_ENV} is required")
+    try:
+        run_service(arguments.socket, arguments.model, arguments.max_memory_mb, arguments.spill_dir)
+    except SessionServiceError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
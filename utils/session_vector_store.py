@@ -2,16 +2,32 @@ import faiss
 import numpy as np
 from sentence_transformers import SentenceTransformer
 from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+import heapq
 import json
 import re
 import uuid
 import os
+import tempfile
+import threading
 from datetime import datetime, timedelta
+from utils.segment_store import SegmentRegistry
 
 class SessionVectorStore:
-    """Session-based vector storage that clears when browser/session closes"""
+    """Session-based vector storage that clears when browser/session closes
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    Sessions do not own vectors or text. Each upload becomes an immutable,
+    content-hashed document segment in a shared SegmentRegistry, and a session is
+    just a list of segment references, so identical uploads from many sessions
+    cost one embedding pass and one copy in RAM.
+    
+    Resident sessions are kept in LRU order under a global memory budget. When the
+    budget is exceeded, or a session sits idle, it is spilled to a compact snapshot
+    in ``spill_dir`` and transparently reloaded on its next access.
+    """
+    
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", max_memory_mb: int = 1024,
+                 spill_dir: Optional[str] = None, reaper_interval: int = 60):
         self.model_name = model_name
         
         # Set Hugging Face token if available
@@ -22,21 +38,41 @@ class SessionVectorStore:
         self.embedding_model = SentenceTransformer(model_name)
         self.dimension = self.embedding_model.get_sentence_embedding_dimension()
         
-        # Session-based storage (in memory only)
-        self.sessions = {}  # session_id -> session_data
+        # Resident sessions in LRU order (least recently used first)
+        self.sessions = OrderedDict()  # session_id -> session_data
+        # Sessions spilled to disk: session_id -> snapshot info
+        self.spilled_sessions = {}
         self.cleanup_interval = timedelta(hours=2)  # Auto cleanup after 2 hours
+        self.idle_spill_after = timedelta(minutes=15)  # Idle sessions are moved to disk
+        
+        # Global memory budget shared by all resident sessions
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self.spill_dir = spill_dir or os.path.join(tempfile.gettempdir(), "studymate_sessions")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        
+        # Shared, content-addressed document segments
+        self.segments = SegmentRegistry(os.path.join(self.spill_dir, "segments"))
+        
+        self._lock = threading.RLock()
+        self._discover_snapshots()
+        
+        # Background reaper expires old sessions and spills idle ones
+        self._stop_event = threading.Event()
+        self._reaper = None
+        if reaper_interval:
+            self._reaper = threading.Thread(target=self._reaper_loop, args=(reaper_interval,), daemon=True)
+            self._reaper.start()
         
     def create_session(self) -> str:
         """Create a new session and return session ID"""
         session_id = str(uuid.uuid4())
         
-        self.sessions[session_id] = {
-            'index': faiss.IndexFlatIP(self.dimension),
-            'documents': [],
-            'metadata': [],
-            'created_at': datetime.now(),
-            'last_accessed': datetime.now()
-        }
+        with self._lock:
+            self.sessions[session_id] = {
+                'segments': [],  # [{'segment_id': ..., 'added_at': ..., 'metadata': [per chunk]}]
+                'created_at': datetime.now(),
+                'last_accessed': datetime.now()
+            }
         
         # Cleanup old sessions
         self._cleanup_old_sessions()
@@ -45,31 +81,204 @@ class SessionVectorStore:
         return session_id
     
     def _cleanup_old_sessions(self):
-        """Remove sessions older than cleanup_interval"""
+        """Remove sessions (resident or spilled) older than cleanup_interval"""
         current_time = datetime.now()
-        expired_sessions = []
         
-        for session_id, session_data in self.sessions.items():
-            if current_time - session_data['last_accessed'] > self.cleanup_interval:
-                expired_sessions.append(session_id)
-        
-        for session_id in expired_sessions:
-            del self.sessions[session_id]
-            print(f"🧹 Cleaned up expired session: {session_id[:8]}...")
+        with self._lock:
+            expired_sessions = [
+                session_id for session_id, session_data in self.sessions.items()
+                if current_time - session_data['last_accessed'] > self.cleanup_interval
+            ]
+            expired_sessions.extend(
+                session_id for session_id, info in self.spilled_sessions.items()
+                if current_time - info['last_accessed'] > self.cleanup_interval
+            )
+            
+            for session_id in expired_sessions:
+                self._drop_session(session_id)
+                print(f"🧹 Cleaned up expired session: {session_id[:8]}...")
+            
+            if expired_sessions:
+                self.segments.collect_garbage(self._referenced_segment_ids())
+    
+    def _drop_session(self, session_id: str):
+        """Remove a session from memory and delete its snapshot"""
+        session = self.sessions.pop(session_id, None)
+        if session:
+            self._release_segments(session)
+        info = self.spilled_sessions.pop(session_id, None)
+        if info and os.path.exists(info['path']):
+            os.remove(info['path'])
+    
+    def _release_segments(self, session: Dict):
+        """Give back the session's resident references to its shared segments"""
+        for ref in session['segments']:
+            self.segments.release(ref['segment_id'])
+    
+    def _referenced_segment_ids(self) -> set:
+        """Segment ids referenced by any resident or spilled session"""
+        referenced = set()
+        for session in self.sessions.values():
+            referenced.update(ref['segment_id'] for ref in session['segments'])
+        for info in self.spilled_sessions.values():
+            referenced.update(ref['segment_id'] for ref in info['segments'])
+        return referenced
+    
+    def _session_segments(self, session: Dict):
+        """Yield (reference, segment) pairs for a resident session"""
+        for ref in session['segments']:
+            yield ref, self.segments.get(ref['segment_id'])
+    
+    def _session_document_count(self, session: Dict) -> int:
+        return sum(len(segment) for _, segment in self._session_segments(session))
     
     def get_session(self, session_id: str) -> Optional[Dict]:
-        """Get session data and update last accessed time"""
-        if session_id not in self.sessions:
-            return None
-        
-        self.sessions[session_id]['last_accessed'] = datetime.now()
-        return self.sessions[session_id]
+        """Get session data and update last accessed time, reloading it from disk if spilled"""
+        with self._lock:
+            if session_id in self.sessions:
+                self.sessions.move_to_end(session_id)
+            elif session_id in self.spilled_sessions:
+                self._reload_session(session_id)
+            else:
+                return None
+            
+            session = self.sessions[session_id]
+            session['last_accessed'] = datetime.now()
+            return session
     
     def clear_session(self, session_id: str):
         """Clear a specific session"""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-            print(f"🗑️  Cleared session: {session_id[:8]}...")
+        with self._lock:
+            if session_id in self.sessions or session_id in self.spilled_sessions:
+                self._drop_session(session_id)
+                print(f"🗑️  Cleared session: {session_id[:8]}...")
+    
+    def close(self):
+        """Stop the background reaper"""
+        self._stop_event.set()
+        if self._reaper:
+            self._reaper.join(timeout=5)
+
+    def spill_all(self):
+        """Spill every resident session, so a restarted store picks them up from spill_dir"""
+        with self._lock:
+            for session_id in list(self.sessions.keys()):
+                self._spill_session(session_id)
+
+    def _reaper_loop(self, interval: int):
+        """Periodically expire old sessions and spill idle ones"""
+        while not self._stop_event.wait(interval):
+            try:
+                self._cleanup_old_sessions()
+                self._spill_idle_sessions()
+            except Exception as e:
+                print(f"⚠️ Session reaper error: {e}")
+    
+    def _spill_idle_sessions(self):
+        """Move sessions that have not been used recently to disk"""
+        current_time = datetime.now()
+        with self._lock:
+            idle_sessions = [
+                session_id for session_id, session_data in self.sessions.items()
+                if current_time - session_data['last_accessed'] > self.idle_spill_after
+            ]
+            for session_id in idle_sessions:
+                self._spill_session(session_id)
+    
+    def resident_memory_bytes(self) -> int:
+        """Total estimated memory held by resident segments (shared segments count once)"""
+        return self.segments.resident_memory_bytes()
+    
+    def _enforce_memory_budget(self, keep_session_id: Optional[str] = None):
+        """Spill least recently used sessions until resident memory fits the budget"""
+        for session_id in list(self.sessions.keys()):
+            if self.resident_memory_bytes() <= self.max_memory_bytes:
+                break
+            # Empty sessions free nothing, so leave them resident
+            if session_id == keep_session_id or not self.sessions[session_id]['segments']:
+                continue
+            self._spill_session(session_id)
+        
+        total = self.resident_memory_bytes()
+        if total > self.max_memory_bytes:
+            print(f"⚠️ Session memory {total / 1e6:.1f} MB exceeds budget even after eviction")
+    
+    def _snapshot_path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{session_id}.json")
+    
+    def _spill_session(self, session_id: str):
+        """Write a session's segment references to a snapshot and release its memory"""
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return
+        
+        freed_before = self.resident_memory_bytes()
+        document_count = self._session_document_count(session)
+        self._release_segments(session)
+        
+        snapshot = {
+            'session_id': session_id,
+            'created_at': session['created_at'].isoformat(),
+            'last_accessed': session['last_accessed'].isoformat(),
+            'model_name': self.model_name,
+            'document_count': document_count,
+            'segments': session['segments']
+        }
+        
+        # Write to a temporary file first so a crash never leaves a truncated snapshot
+        path = self._snapshot_path(session_id)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(snapshot, f, default=str)
+        os.replace(temp_path, path)
+        
+        self.spilled_sessions[session_id] = {
+            'path': path,
+            'created_at': session['created_at'],
+            'last_accessed': session['last_accessed'],
+            'document_count': document_count,
+            'segments': session['segments']
+        }
+        freed = freed_before - self.resident_memory_bytes()
+        print(f"💾 Spilled session {session_id[:8]}... to disk ({freed / 1e6:.1f} MB freed)")
+    
+    def _reload_session(self, session_id: str):
+        """Restore a spilled session into memory"""
+        info = self.spilled_sessions.pop(session_id)
+        for ref in info['segments']:
+            self.segments.acquire(ref['segment_id'])
+        
+        self.sessions[session_id] = {
+            'segments': info['segments'],
+            'created_at': info['created_at'],
+            'last_accessed': datetime.now()
+        }
+        if os.path.exists(info['path']):
+            os.remove(info['path'])
+        
+        self._enforce_memory_budget(keep_session_id=session_id)
+        print(f"📂 Reloaded session {session_id[:8]}... from disk")
+    
+    def _discover_snapshots(self):
+        """Register snapshots left by a previous run so their sessions stay reachable"""
+        for filename in os.listdir(self.spill_dir):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(self.spill_dir, filename)
+            try:
+                with open(path, "r") as f:
+                    snapshot = json.load(f)
+                if snapshot.get('model_name') != self.model_name:
+                    continue
+                self.spilled_sessions[snapshot['session_id']] = {
+                    'path': path,
+                    'created_at': datetime.fromisoformat(snapshot['created_at']),
+                    'last_accessed': datetime.fromisoformat(snapshot['last_accessed']),
+                    'document_count': snapshot.get('document_count'),
+                    'segments': snapshot['segments']
+                }
+            except Exception:
+                continue
     
     def embed_text(self, text: str) -> np.ndarray:
         """Generate embedding for a single text"""
@@ -85,16 +294,17 @@ class SessionVectorStore:
     
     def add_documents(self, session_id: str, documents: List[str], metadata: List[Dict] = None):
         """Add documents to a specific session"""
-        session = self.get_session(session_id)
-        if not session:
+        if not self.get_session(session_id):
             raise ValueError(f"Session {session_id} not found")
         
         if not documents:
             return
         
         # Process documents and remove any OS unit-1.pdf references
+        original_documents = []
         processed_documents = []
         processed_metadata = []
+        session_metadata = []
         
         for i, doc in enumerate(documents):
             # Skip any document that mentions OS unit-1.pdf
@@ -107,34 +317,50 @@ class SessionVectorStore:
             
             # Enhanced preprocessing for better embeddings
             processed_doc = self._preprocess_document(doc)
+            original_documents.append(doc)
             processed_documents.append(processed_doc)
             
-            # Enhanced metadata
-            enhanced_metadata = {
+            # Enhanced metadata (the processed text is already kept in the segment's documents).
+            # Only what follows from the text is shared; the caller's metadata (source, page)
+            # lives on this session's segment reference.
+            processed_metadata.append({
                 'original_content': doc,
-                'processed_content': processed_doc,
                 'content_type': self._identify_content_type(doc),
-                'word_count': len(doc.split()),
-                'session_id': session_id,
-                'added_at': datetime.now().isoformat(),
-                **doc_meta
-            }
-            processed_metadata.append(enhanced_metadata)
+                'word_count': len(doc.split())
+            })
+            session_metadata.append(doc_meta)
         
         if not processed_documents:
             print("📝 No valid documents to add (OS unit-1.pdf filtered out)")
             return
         
-        # Generate embeddings
-        embeddings = self.embed_texts(processed_documents)
-        
-        # Add to session's index
-        session['index'].add(embeddings)
-        session['documents'].extend(processed_documents)
-        session['metadata'].extend(processed_metadata)
+        # Identical content from any session maps to the same segment and is embedded once.
+        # Embedding happens outside the store lock so other sessions are not blocked.
+        segment_id = SegmentRegistry.content_hash(self.model_name, original_documents)
+        _, created = self.segments.get_or_create(segment_id, processed_documents, processed_metadata, self.embed_texts)
+        
+        with self._lock:
+            # The session may have been spilled while embedding; get_session reloads it
+            session = self.get_session(session_id)
+            # The segment comes acquired: the session keeps that reference, or it is given back
+            if not session or any((ref['segment_id'], ref.get('metadata')) == (segment_id, session_metadata)
+                                  for ref in session['segments']):
+                self.segments.release(segment_id)
+                if not session:
+                    raise ValueError(f"Session {session_id} not found")
+            else:
+                session['segments'].append({
+                    'segment_id': segment_id,
+                    'added_at': datetime.now().isoformat(),
+                    'metadata': session_metadata
+                })
+            
+            self._enforce_memory_budget(keep_session_id=session_id)
+            document_count = self._session_document_count(session)
         
-        print(f"✅ Added {len(processed_documents)} documents to session {session_id[:8]}...")
-        print(f"📊 Session now contains {len(session['documents'])} total documents")
+        action = "Added" if created else "Linked shared copy of"
+        print(f"✅ {action} {len(processed_documents)} documents to session {session_id[:8]}...")
+        print(f"📊 Session now contains {document_count} total documents")
     
     def _preprocess_document(self, document: str) -> str:
         """Preprocess document for better embedding quality"""
@@ -175,10 +401,6 @@ class SessionVectorStore:
     
     def search(self, session_id: str, query: str, k: int = 5) -> List[Dict]:
         """Search for similar documents in a specific session"""
-        session = self.get_session(session_id)
-        if not session or len(session['documents']) == 0:
-            return []
-        
         # Remove OS unit-1.pdf references from query
         clean_query = re.sub(r'OS\s+unit-1\.pdf', '', query, flags=re.IGNORECASE)
         clean_query = re.sub(r'OS\s+unit\s*-?\s*1', '', clean_query, flags=re.IGNORECASE)
@@ -186,20 +408,34 @@ class SessionVectorStore:
         # Generate query embedding
         query_embedding = self.embed_text(clean_query).reshape(1, -1)
         
-        # Search in session's index
-        k = min(k, len(session['documents']))
-        scores, indices = session['index'].search(query_embedding, k)
+        with self._lock:
+            session = self.get_session(session_id)
+            if not session:
+                return []
+            
+            # Search every referenced segment and keep the overall top-k
+            candidates = []
+            for ref, segment in self._session_segments(session):
+                segment_k = min(k, len(segment))
+                if segment_k == 0:
+                    continue
+                scores, indices = segment.index.search(query_embedding, segment_k)
+                for score, idx in zip(scores[0], indices[0]):
+                    if 0 <= idx < len(segment):
+                        candidates.append((float(score), ref, segment, int(idx)))
+            
+            hits = heapq.nlargest(k, candidates, key=lambda candidate: candidate[0])
         
         results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < len(session['documents']):
-                result = {
-                    'content': session['documents'][idx],
-                    'metadata': session['metadata'][idx],
-                    'similarity_score': float(score),
-                    'relevance': self._calculate_relevance(clean_query, session['documents'][idx])
-                }
-                results.append(result)
+        for score, ref, segment, idx in hits:
+            document = segment.documents[idx]
+            result = {
+                'content': document,
+                'metadata': self._session_metadata(session_id, ref, segment.metadata[idx], idx),
+                'similarity_score': score,
+                'relevance': self._calculate_relevance(clean_query, document)
+            }
+            results.append(result)
         
         # Sort by relevance score (combination of similarity and relevance)
         results.sort(key=lambda x: x['similarity_score'] + x['relevance'], reverse=True)
@@ -207,6 +443,18 @@ class SessionVectorStore:
         print(f"🔍 Found {len(results)} results for query in session {session_id[:8]}...")
         return results
     
+    def _session_metadata(self, session_id: str, ref: Dict, shared_metadata: Dict, row: int) -> Dict:
+        """Per-session view of a shared chunk's metadata (the shared copy is never mutated)"""
+        # References made before caller metadata moved onto them have it in the segment
+        session_metadata = ref['metadata'][row] if ref.get('metadata') else {}
+        return {
+            **shared_metadata,
+            **session_metadata,
+            'session_id': session_id,
+            'added_at': ref['added_at'],
+            'segment_id': ref['segment_id']
+        }
+    
     def _calculate_relevance(self, query: str, document: str) -> float:
         """Calculate relevance based on query-document word overlap"""
         query_words = set(query.lower().split())
@@ -222,40 +470,72 @@ class SessionVectorStore:
     
     def get_session_stats(self, session_id: str) -> Dict:
         """Get statistics for a specific session"""
-        session = self.get_session(session_id)
-        if not session:
-            return {'error': 'Session not found'}
-        
-        return {
-            'session_id': session_id,
-            'document_count': len(session['documents']),
-            'created_at': session['created_at'].isoformat(),
-            'last_accessed': session['last_accessed'].isoformat(),
-            'sources': list(set(meta.get('source', 'Unknown') for meta in session['metadata'])),
-            'content_types': list(set(meta.get('content_type', 'unknown') for meta in session['metadata']))
-        }
+        with self._lock:
+            session = self.get_session(session_id)
+            if not session:
+                return {'error': 'Session not found'}
+            
+            all_metadata = [self._session_metadata(session_id, ref, meta, row)
+                            for ref, segment in self._session_segments(session)
+                            for row, meta in enumerate(segment.metadata)]
+            return {
+                'session_id': session_id,
+                'document_count': len(all_metadata),
+                'segment_count': len(session['segments']),
+                'created_at': session['created_at'].isoformat(),
+                'last_accessed': session['last_accessed'].isoformat(),
+                'sources': list(set(meta.get('source', 'Unknown') for meta in all_metadata)),
+                'content_types': list(set(meta.get('content_type', 'unknown') for meta in all_metadata))
+            }
     
     def list_active_sessions(self) -> List[Dict]:
-        """List all active sessions"""
+        """List all active sessions, including those spilled to disk"""
         sessions = []
-        for session_id, session_data in self.sessions.items():
-            sessions.append({
-                'session_id': session_id,
-                'document_count': len(session_data['documents']),
-                'created_at': session_data['created_at'].isoformat(),
-                'last_accessed': session_data['last_accessed'].isoformat()
-            })
+        with self._lock:
+            for session_id, session_data in self.sessions.items():
+                sessions.append({
+                    'session_id': session_id,
+                    'document_count': self._session_document_count(session_data),
+                    'created_at': session_data['created_at'].isoformat(),
+                    'last_accessed': session_data['last_accessed'].isoformat(),
+                    'resident': True
+                })
+            for session_id, info in self.spilled_sessions.items():
+                sessions.append({
+                    'session_id': session_id,
+                    'document_count': info['document_count'],
+                    'created_at': info['created_at'].isoformat(),
+                    'last_accessed': info['last_accessed'].isoformat(),
+                    'resident': False
+                })
         
         return sessions
     
+    def get_memory_stats(self) -> Dict:
+        """Memory usage of the session store against its budget"""
+        with self._lock:
+            return {
+                'resident_sessions': len(self.sessions),
+                'spilled_sessions': len(self.spilled_sessions),
+                'resident_memory_bytes': self.resident_memory_bytes(),
+                'max_memory_bytes': self.max_memory_bytes,
+                **self.segments.get_stats()
+            }
+    
     def get_all_documents(self, session_id: str) -> List[Dict]:
         """Get all documents from a session for summary/quiz generation"""
-        session = self.get_session(session_id)
-        if not session:
-            return []
+        with self._lock:
+            session = self.get_session(session_id)
+            if not session:
+                return []
+            pairs = [
+                (doc, self._session_metadata(session_id, ref, meta, row))
+                for ref, segment in self._session_segments(session)
+                for row, (doc, meta) in enumerate(zip(segment.documents, segment.metadata))
+            ]
         
         documents = []
-        for i, (doc, meta) in enumerate(zip(session['documents'], session['metadata'])):
+        for i, (doc, meta) in enumerate(pairs):
             documents.append({
                 'content': doc,
                 'metadata': meta,
@@ -0,0 +1,506 @@
+"""
+Multi-process sharded vector search.
+
+Chunks are partitioned by source across N local worker processes, each owning its
+own FAISS index. Queries are scattered to every shard in parallel and the per-shard
+top-k lists are merged with a heap. Shards are rebalanced by moving whole sources
+when new sources make them uneven.
+
+Each write is tagged with a new epoch and every worker keeps a snapshot per epoch
+that a live generation still reads. A search or fetch runs as of its generation's
+epoch, so moving or deleting a source never changes what an older generation sees;
+snapshots are dropped once no generation pins them.
+
+Workers are started as ``python -m utils.sharded_search`` subprocesses and talk to
+the parent over authenticated Unix sockets, so they never re-import the web app.
+"""
+
+import faiss
+import numpy as np
+from typing import Dict, List, Tuple
+from collections import Counter, deque
+from itertools import islice
+from multiprocessing.connection import Client, Listener
+import argparse
+import atexit
+import heapq
+import os
+import queue
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import weakref
+import zlib
+
+AUTHKEY_ENV = "STUDYMATE_SHARD_AUTHKEY"
+
+
+class _ShardState:
+    """Index owned by one worker process, kept as one immutable snapshot per write epoch
+
+    Every write publishes a new snapshot tagged with the parent's epoch; readers
+    never lock. A read names the epoch of the generation it runs against and sees
+    the newest snapshot at or before it, so a source moved to another shard, or
+    deleted, stays visible to searches of older generations until they are done.
+    """
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        # (epoch, (index, uids, sources)), oldest first; replaced, never mutated, so readers need no lock
+        self.snapshots = [(0, (faiss.IndexFlatIP(dimension), np.zeros(0, dtype=np.int64), []))]
+        self.write_lock = threading.Lock()
+
+    def _at(self, epoch: int):
+        snapshots = self.snapshots
+        for snapshot_epoch, snapshot in reversed(snapshots):
+            if snapshot_epoch <= epoch:
+                return snapshot
+        return snapshots[0][1]
+
+    def _publish(self, epoch: int, snapshot):
+        snapshots = [entry for entry in self.snapshots if entry[0] < epoch]
+        self.snapshots = snapshots + [(epoch, snapshot)]
+
+    def prune(self, pinned, as_of: int):
+        """Drop snapshots that no pinned epoch reads; ones newer than as_of may have been pinned since"""
+        with self.write_lock:
+            snapshots = self.snapshots
+            needed = {len(snapshots) - 1}
+            for epoch in set(pinned) | {as_of}:
+                position = 0
+                for i, (snapshot_epoch, _) in enumerate(snapshots):
+                    if snapshot_epoch <= epoch:
+                        position = i
+                needed.add(position)
+            kept = [entry for i, entry in enumerate(snapshots) if i in needed or entry[0] > as_of]
+            if len(kept) < len(snapshots):
+                self.snapshots = kept
+
+    def _vectors(self, index) -> np.ndarray:
+        if index.ntotal == 0:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return faiss.rev_swig_ptr(index.get_xb(), index.ntotal * self.dimension).reshape(index.ntotal, self.dimension)
+
+    def _keep_rows(self, epoch: int, keep: np.ndarray):
+        """Publish a snapshot containing only the selected rows of the latest one"""
+        index, uids, sources = self.snapshots[-1][1]
+        new_index = faiss.IndexFlatIP(self.dimension)
+        if keep.any():
+            new_index.add(np.ascontiguousarray(self._vectors(index)[keep]))
+        self._publish(epoch, (new_index, uids[keep], [source for source, kept in zip(sources, keep) if kept]))
+
+    def add(self, epoch, uids, vectors, sources):
+        with self.write_lock:
+            index, current_uids, current_sources = self.snapshots[-1][1]
+            new_index = faiss.clone_index(index)
+            new_index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+            self._publish(epoch, (
+                new_index,
+                np.concatenate([current_uids, np.asarray(uids, dtype=np.int64)]),
+                current_sources + list(sources)
+            ))
+        return new_index.ntotal
+
+    def remove_sources(self, epoch, sources):
+        remove = set(sources)
+        with self.write_lock:
+            current_sources = self.snapshots[-1][1][2]
+            keep = np.array([source not in remove for source in current_sources], dtype=bool)
+            if keep.all():
+                return 0
+            self._keep_rows(epoch, keep)
+            return int((~keep).sum())
+
+    def remove_uids(self, epoch, removed_uids):
+        with self.write_lock:
+            keep = ~np.isin(self.snapshots[-1][1][1], np.asarray(removed_uids, dtype=np.int64))
+            if keep.all():
+                return 0
+            self._keep_rows(epoch, keep)
+            return int((~keep).sum())
+
+    def source_vectors(self, source):
+        """Uids and vectors of one source in the latest snapshot (used for rebalancing)"""
+        index, uids, sources = self.snapshots[-1][1]
+        selected = np.array([row_source == source for row_source in sources], dtype=bool)
+        if not selected.any():
+            return np.zeros(0, dtype=np.int64), np.zeros((0, self.dimension), dtype=np.float32)
+        return uids[selected].copy(), np.array(self._vectors(index)[selected])
+
+    def fetch(self, epoch, requested_uids):
+        index, uids, _ = self._at(epoch)
+        rows = np.nonzero(np.isin(uids, np.asarray(requested_uids, dtype=np.int64)))[0]
+        return uids[rows].copy(), np.array(self._vectors(index)[rows])
+
+    def search(self, epoch, queries, k):
+        index, uids, _ = self._at(epoch)
+        if index.ntotal == 0:
+            return np.zeros((len(queries), 0), dtype=np.float32), np.zeros((len(queries), 0), dtype=np.int64)
+        scores, rows = index.search(np.ascontiguousarray(queries, dtype=np.float32), min(k, index.ntotal))
+        return scores, np.where(rows >= 0, uids[np.maximum(rows, 0)], -1)
+
+    def dump(self):
+        index, uids, sources = self.snapshots[-1][1]
+        return uids.copy(), np.array(self._vectors(index)), list(sources)
+
+    def reset(self, epoch):
+        with self.write_lock:
+            self._publish(epoch, (faiss.IndexFlatIP(self.dimension), np.zeros(0, dtype=np.int64), []))
+
+    def stats(self):
+        index, _, sources = self.snapshots[-1][1]
+        counts = {}
+        for source in sources:
+            counts[source] = counts.get(source, 0) + 1
+        return {'ntotal': index.ntotal, 'sources': counts, 'snapshots': len(self.snapshots)}
+
+
+def _serve_connection(connection, state: _ShardState):
+    """Answer requests from one parent channel until it closes"""
+    handlers = {
+        'add': state.add,
+        'remove_sources': state.remove_sources,
+        'remove_uids': state.remove_uids,
+        'source_vectors': state.source_vectors,
+        'fetch': state.fetch,
+        'search': state.search,
+        'dump': state.dump,
+        'reset': state.reset,
+        'stats': state.stats,
+        'ping': lambda: 'pong'
+    }
+    while True:
+        try:
+            operation, args, (pinned, as_of) = connection.recv()
+        except (EOFError, OSError):
+            return
+        try:
+            # Every request carries the epochs the parent still reads, so stale snapshots go promptly
+            state.prune(pinned, as_of)
+            connection.send(('ok', handlers[operation](*args)))
+        except Exception as e:
+            connection.send(('error', f"{type(e).__name__}: {e}"))
+
+
+def run_worker(socket_path: str, dimension: int):
+    """Entry point of a shard worker process"""
+    faiss.omp_set_num_threads(1)  # Parallelism comes from shards and concurrent channels
+    state = _ShardState(dimension)
+    listener = Listener(socket_path, family='AF_UNIX', authkey=bytes.fromhex(os.environ[AUTHKEY_ENV]))
+
+    # Exit when the parent goes away instead of lingering as an orphan
+    parent_pid = os.getppid()
+
+    def watch_parent():
+        while True:
+            time.sleep(2)
+            if os.getppid() != parent_pid:
+                os._exit(0)
+
+    threading.Thread(target=watch_parent, daemon=True).start()
+
+    while True:
+        connection = listener.accept()
+        threading.Thread(target=_serve_connection, args=(connection, state), daemon=True).start()
+
+
+class ShardedVectorSearch:
+    """Scatter/gather vector search over local shard worker processes"""
+
+    def __init__(self, dimension: int, num_shards: int = 2, connections_per_shard: int = 4,
+                 rebalance_tolerance: float = 0.25, startup_timeout: float = 30.0):
+        self.dimension = dimension
+        self.num_shards = num_shards
+        self.rebalance_tolerance = rebalance_tolerance
+
+        self.source_shards = {}  # source -> shard number
+        self.shard_loads = [0] * num_shards  # chunks per shard
+        self.source_sizes = {}  # source -> chunk count
+        self._write_lock = threading.RLock()
+
+        # Every write is tagged with a new epoch; each ShardedIndex reads the shards as of its own
+        self.epoch = 0
+        self._pins = Counter()  # epoch -> live ShardedIndex objects reading it
+        self._unpinned = deque()  # Epochs of collected ShardedIndex objects, appended by finalizers
+        self._pin_lock = threading.Lock()
+
+        authkey = secrets.token_bytes(16)
+        socket_dir = tempfile.mkdtemp(prefix="studymate-shards-")
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, **{AUTHKEY_ENV: authkey.hex()})
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [repo_root, env.get('PYTHONPATH')]))
+
+        self._processes = []
+        self._socket_paths = []
+        for shard in range(num_shards):
+            socket_path = os.path.join(socket_dir, f"shard-{shard}.sock")
+            self._socket_paths.append(socket_path)
+            self._processes.append(subprocess.Popen(
+                [sys.executable, "-m", "utils.sharded_search", "--socket", socket_path,
+                 "--dimension", str(dimension)],
+                cwd=repo_root, env=env
+            ))
+
+        # Each channel holds one connection per shard; concurrent searches use different channels
+        self._channels = queue.Queue()
+        for _ in range(max(1, connections_per_shard)):
+            self._channels.put([
+                self._connect(socket_path, authkey, startup_timeout) for socket_path in self._socket_paths
+            ])
+
+        atexit.register(self.close)
+        print(f"✅ Started {num_shards} vector search shard workers")
+
+    @staticmethod
+    def _connect(socket_path: str, authkey: bytes, timeout: float):
+        deadline = time.time() + timeout
+        while True:
+            try:
+                return Client(socket_path, family='AF_UNIX', authkey=authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.time() > deadline:
+                    raise TimeoutError(f"Shard worker at {socket_path} did not start")
+                time.sleep(0.05)
+
+    def pin(self) -> int:
+        """The current epoch, kept readable on the workers until unpin"""
+        with self._pin_lock:
+            self._pins[self.epoch] += 1
+            return self.epoch
+
+    def unpin(self, epoch: int):
+        # Runs from garbage collection finalizers, so it must not take a lock
+        self._unpinned.append(epoch)
+
+    def _pinned(self) -> Tuple[Tuple[int, ...], int]:
+        """(epochs still read, current epoch) for the workers to prune their snapshots"""
+        with self._pin_lock:
+            while self._unpinned:
+                epoch = self._unpinned.popleft()
+                self._pins[epoch] -= 1
+                if self._pins[epoch] <= 0:
+                    del self._pins[epoch]
+            return tuple(self._pins), self.epoch
+
+    def _next_epoch(self) -> int:
+        with self._pin_lock:
+            self.epoch += 1
+            return self.epoch
+
+    def _scatter(self, requests: Dict[int, Tuple[str, tuple]]) -> Dict[int, object]:
+        """Send requests to several shards at once, then gather all replies"""
+        pinned = self._pinned()
+        channel = self._channels.get()
+        try:
+            for shard, (operation, args) in requests.items():
+                channel[shard].send((operation, args, pinned))
+            replies = {shard: channel[shard].recv() for shard in requests}
+        finally:
+            self._channels.put(channel)
+
+        results = {}
+        for shard, (status, result) in replies.items():
+            if status != 'ok':
+                raise RuntimeError(f"Shard {shard} failed: {result}")
+            results[shard] = result
+        return results
+
+    def _all(self, operation: str, *args) -> Dict[int, object]:
+        return self._scatter({shard: (operation, args) for shard in range(self.num_shards)})
+
+    def _hash_shard(self, source: str) -> int:
+        return zlib.crc32(source.encode('utf-8')) % self.num_shards
+
+    def _place_source(self, source: str, size: int) -> int:
+        """Home shard by source hash, unless that shard is already overloaded"""
+        shard = self._hash_shard(source)
+        average = (sum(self.shard_loads) + size) / self.num_shards
+        if self.shard_loads[shard] + size > average * (1 + self.rebalance_tolerance):
+            shard = min(range(self.num_shards), key=lambda s: self.shard_loads[s])
+        return shard
+
+    def add(self, uids: List[int], vectors: np.ndarray, sources: List[str]):
+        """Add vectors, keeping every chunk of a source on the same shard"""
+        with self._write_lock:
+            batch_sizes = Counter(sources)
+            for source, size in batch_sizes.items():
+                if source not in self.source_shards:
+                    self.source_shards[source] = self._place_source(source, size)
+                    self.source_sizes[source] = 0
+                # Count each placement right away so the next new source sees it
+                self.shard_loads[self.source_shards[source]] += size
+                self.source_sizes[source] += size
+
+            by_shard = {}
+            for row, source in enumerate(sources):
+                by_shard.setdefault(self.source_shards[source], []).append(row)
+
+            epoch = self._next_epoch()
+            requests = {}
+            for shard, rows in by_shard.items():
+                requests[shard] = ('add', (
+                    epoch,
+                    [uids[row] for row in rows],
+                    np.ascontiguousarray(vectors[rows], dtype=np.float32),
+                    [sources[row] for row in rows]
+                ))
+            self._scatter(requests)
+
+            self.rebalance()
+
+    def remove_sources(self, sources: List[str]):
+        with self._write_lock:
+            affected = {self.source_shards[source] for source in sources if source in self.source_shards}
+            if not affected:
+                return
+            epoch = self._next_epoch()
+            self._scatter({shard: ('remove_sources', (epoch, list(sources))) for shard in affected})
+            for source in sources:
+                if source in self.source_shards:
+                    self.shard_loads[self.source_shards.pop(source)] -= self.source_sizes.pop(source)
+
+            self.rebalance()
+
+    def remove_uids(self, uids_by_source: Dict[str, List[int]]):
+        """Remove single chunks, given per source"""
+        with self._write_lock:
+            by_shard = {}
+            for source, uids in uids_by_source.items():
+                if source in self.source_shards and uids:
+                    by_shard.setdefault(self.source_shards[source], []).extend(uids)
+            epoch = self._next_epoch()
+            removed = self._scatter({shard: ('remove_uids', (epoch, uids)) for shard, uids in by_shard.items()})
+            for source, uids in uids_by_source.items():
+                if source in self.source_shards:
+                    self.source_sizes[source] -= len(uids)
+                    self.shard_loads[self.source_shards[source]] -= len(uids)
+            return sum(removed.values())
+
+    def rebalance(self):
+        """Move whole sources from the heaviest to the lightest shard until loads are even
+
+        A move copies the source to the lightest shard and then drops it from the
+        heaviest, both in a new epoch; generations published before it keep reading
+        the old placement until they are released.
+        """
+        with self._write_lock:
+            for _ in range(len(self.source_shards)):
+                heaviest = max(range(self.num_shards), key=lambda s: self.shard_loads[s])
+                lightest = min(range(self.num_shards), key=lambda s: self.shard_loads[s])
+                gap = self.shard_loads[heaviest] - self.shard_loads[lightest]
+                average = sum(self.shard_loads) / self.num_shards
+                if gap <= max(1.0, average * self.rebalance_tolerance):
+                    return
+
+                # The source closest to half the gap evens the two shards out the most
+                candidates = [source for source, shard in self.source_shards.items()
+                              if shard == heaviest and self.source_sizes[source] < gap]
+                if not candidates:
+                    return
+                source = min(candidates, key=lambda s: abs(self.source_sizes[s] - gap / 2))
+
+                uids, vectors = self._scatter({heaviest: ('source_vectors', (source,))})[heaviest]
+                epoch = self._next_epoch()
+                self._scatter({lightest: ('add', (epoch, list(uids), vectors, [source] * len(uids)))})
+                self._scatter({heaviest: ('remove_sources', (epoch, [source]))})
+                self.source_shards[source] = lightest
+                self.shard_loads[heaviest] -= len(uids)
+                self.shard_loads[lightest] += len(uids)
+
+    def search(self, queries: np.ndarray, k: int, epoch: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Scatter queries to all shards and merge the per-shard top-k lists, as of an epoch (default: latest)"""
+        queries = np.ascontiguousarray(queries, dtype=np.float32).reshape(-1, self.dimension)
+        replies = self._all('search', self.epoch if epoch is None else epoch, queries, k)
+
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        uids = np.full((len(queries), k), -1, dtype=np.int64)
+        for row in range(len(queries)):
+            # Each shard list is already sorted, so a lazy heap merge only touches k items
+            merged = heapq.merge(
+                *[zip(shard_scores[row], shard_uids[row]) for shard_scores, shard_uids in replies.values()],
+                key=lambda item: item[0], reverse=True
+            )
+            for position, (score, uid) in enumerate(islice((item for item in merged if item[1] >= 0), k)):
+                scores[row, position] = score
+                uids[row, position] = uid
+        return scores, uids
+
+    def fetch(self, uids: List[int], epoch: int = None) -> Dict[int, np.ndarray]:
+        """Exact vectors for the given uids as of an epoch (default: latest), wherever they live"""
+        vectors = {}
+        for found_uids, found_vectors in self._all('fetch', self.epoch if epoch is None else epoch,
+                                                   list(uids)).values():
+            vectors.update(zip(found_uids.tolist(), found_vectors))
+        return vectors
+
+    def dump(self):
+        """Yield (uids, vectors, sources) per shard, for persistence"""
+        for shard in range(self.num_shards):
+            yield self._scatter({shard: ('dump', ())})[shard]
+
+    def reset(self):
+        with self._write_lock:
+            self._all('reset', self._next_epoch())
+            self.source_shards = {}
+            self.source_sizes = {}
+            self.shard_loads = [0] * self.num_shards
+
+    def get_stats(self) -> Dict:
+        return {
+            'num_shards': self.num_shards,
+            'shard_sizes': list(self.shard_loads),
+            'sources_per_shard': [
+                sum(1 for shard in self.source_shards.values() if shard == s) for s in range(self.num_shards)
+            ]
+        }
+
+    def close(self):
+        """Stop the worker processes"""
+        for process in self._processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in self._processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for socket_path in self._socket_paths:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+
+
+class ShardedIndex:
+    """Index facade for one VectorStore generation, mapping shard uids back to generation rows"""
+
+    def __init__(self, shards: ShardedVectorSearch, row_uids: List[int]):
+        self.shards = shards
+        self.row_uids = list(row_uids)
+        self.uid_rows = {uid: row for row, uid in enumerate(self.row_uids)}
+        self.ntotal = len(self.row_uids)
+        self.d = shards.dimension
+        # The shards are read as of this epoch for as long as this generation is referenced
+        self.epoch = shards.pin()
+        weakref.finalize(self, shards.unpin, self.epoch)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores, uids = self.shards.search(queries, k, self.epoch)
+        # At this epoch the shards hold exactly this generation's uids; -1 (fewer than k hits) stays -1
+        rows = np.vectorize(lambda uid: self.uid_rows.get(int(uid), -1), otypes=[np.int64])(uids)
+        return scores, rows
+
+    def reconstruct_rows(self, rows: List[int]) -> np.ndarray:
+        """Exact vectors for generation rows, fetched from the shards"""
+        fetched = self.shards.fetch([self.row_uids[row] for row in rows], self.epoch)
+        return np.vstack([fetched[self.row_uids[row]] for row in rows]).astype(np.float32) if rows else \
+            np.zeros((0, self.d), dtype=np.float32)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="StudyMate vector search shard worker")
+    parser.add_argument("--socket", required=True)
+    parser.add_argument("--dimension", type=int, required=True)
+    arguments = parser.parse_args()
+    run_worker(arguments.socket, arguments.dimension)
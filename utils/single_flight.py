@@ -0,0 +1,82 @@
+"""
+Single-flight coalescing of identical concurrent requests.
+
+When many callers ask for the same key at once (a lecture hall submitting the same
+question), the first one computes the result and the others wait for it instead
+of repeating the work. Nothing is cached: once the computation finishes, the next
+call for the key starts a new one, so results are never older than the requests
+that receive them.
+"""
+
+from typing import Callable, Dict, Hashable
+import re
+import threading
+
+from utils.tracing import span
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Case, spacing and closing ?!. folded away; every other character (2+2, C++) still counts"""
+    return _WHITESPACE_PATTERN.sub(" ", question.lower()).strip().rstrip("?!.").rstrip()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Runs one computation per key at a time and hands its outcome to every concurrent caller"""
+
+    def __init__(self, name: str = "single_flight"):
+        self.name = name
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self.computed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, compute: Callable[[], object]):
+        """compute()'s result, shared with every caller that asks for key while it runs
+
+        Exceptions are shared too: every waiter of a failed computation raises it.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.computed += 1
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            with span(f"{self.name}.wait"):
+                flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = compute()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            # Later callers start a new computation; the current waiters still get this one
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            in_flight = len(self._flights)
+            waiting = sum(flight.waiters for flight in self._flights.values())
+        return {'computed': self.computed, 'coalesced': self.coalesced,
+                'in_flight': in_flight, 'waiting': waiting}
@@ -0,0 +1,246 @@
+"""
+Portable snapshots of a saved vector index.
+
+A snapshot is one uncompressed tar file: a manifest first, then every file of the
+index directory (vectors, documents, metadata, page and table stores) under
+``index/``. The manifest records the snapshot format, the embedding model and
+index layout that produced the vectors, and the size and SHA-256 of every file.
+Build an index once, export it, and let any number of read-serving nodes import
+it and swap to it while they keep answering requests.
+
+Importing streams the bundle into a private directory, checks every file against
+the manifest on the way, and only then renames the directory into place, so a
+truncated or tampered bundle never becomes a loadable index.
+"""
+
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import tarfile
+import time
+
+SNAPSHOT_FORMAT = 1
+MANIFEST_NAME = "snapshot.json"
+INDEX_PREFIX = "index/"
+# Describes the index written by VectorStore.save_index
+INDEX_INFO_FILE = "index_info.json"
+# Local to the machine that built the index (paths of ingested files), not part of the index
+EXCLUDED_FILES = {"bulk_ingest_checkpoint.jsonl"}
+# Subdirectory holding the indexes of other namespaces (utils/namespaces.py); each is exported on its own
+NAMESPACES_DIR = "namespaces"
+READ_SIZE = 1 << 20
+# Snapshot ids become directory names when imported
+SNAPSHOT_ID_PATTERN = re.compile(r"[\w-][\w.-]*")
+
+
+class SnapshotError(Exception):
+    """A bundle that is malformed, corrupt or does not fit the store"""
+
+
+def _file_digest(path: str) -> Tuple[int, str]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_SIZE), b""):
+            digest.update(block)
+            size += len(block)
+    return size, digest.hexdigest()
+
+
+def _index_files(index_path: str) -> List[str]:
+    """Relative paths of the files making up a saved index (temporary files are skipped)"""
+    files = []
+    for directory, subdirectories, filenames in os.walk(index_path):
+        subdirectories[:] = sorted(name for name in subdirectories if not name.startswith(".")
+                                   and not (directory == index_path and name == NAMESPACES_DIR))
+        for filename in sorted(filenames):
+            if filename.startswith(".") or filename in EXCLUDED_FILES:
+                continue
+            files.append(os.path.relpath(os.path.join(directory, filename), index_path).replace(os.sep, "/"))
+    return files
+
+
+def export_snapshot(index_path: str, bundle_path: str) -> Dict:
+    """Write the index saved in a directory to a snapshot bundle and return its manifest
+
+    The directory must not be written to meanwhile; VectorStore.export_snapshot
+    takes care of that for a live store.
+    """
+    info_path = os.path.join(index_path, INDEX_INFO_FILE)
+    if not os.path.exists(info_path):
+        raise SnapshotError(f"{index_path} has no {INDEX_INFO_FILE}; open and save it with VectorStore first")
+    with open(info_path, "r") as f:
+        info = json.load(f)
+
+    files = {}
+    for name in _index_files(index_path):
+        size, sha256 = _file_digest(os.path.join(index_path, name))
+        files[name] = {'size': size, 'sha256': sha256}
+
+    # Export time plus a content digest: ids sort by age and differ whenever the index does
+    content = hashlib.sha256(json.dumps(files, sort_keys=True).encode('utf-8')).hexdigest()
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'snapshot_id': f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{content[:12]}",
+        'created_at': time.time(),
+        'index': info,
+        'files': files
+    }
+
+    temp_path = f"{bundle_path}.tmp"
+    with tarfile.open(temp_path, "w") as bundle:
+        manifest_bytes = json.dumps(manifest, indent=2).encode('utf-8')
+        member = tarfile.TarInfo(MANIFEST_NAME)
+        member.size = len(manifest_bytes)
+        member.mtime = int(manifest['created_at'])
+        bundle.addfile(member, io.BytesIO(manifest_bytes))
+        for name in files:
+            bundle.add(os.path.join(index_path, name), arcname=INDEX_PREFIX + name, recursive=False)
+    os.replace(temp_path, bundle_path)
+    return manifest
+
+
+def _read_manifest(bundle: tarfile.TarFile) -> Dict:
+    member = bundle.next()
+    if member is None or member.name != MANIFEST_NAME:
+        raise SnapshotError(f"Not a snapshot bundle: {MANIFEST_NAME} must come first")
+    manifest = json.load(bundle.extractfile(member))
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format')}")
+    if not SNAPSHOT_ID_PATTERN.fullmatch(str(manifest.get('snapshot_id', ''))):
+        raise SnapshotError(f"Invalid snapshot id {manifest.get('snapshot_id')!r}")
+    return manifest
+
+
+def read_manifest(bundle_path: str) -> Dict:
+    """Manifest of a bundle, without checking its files"""
+    try:
+        with tarfile.open(bundle_path, "r") as bundle:
+            return _read_manifest(bundle)
+    except (tarfile.TarError, ValueError, KeyError) as e:
+        raise SnapshotError(f"Unreadable bundle {bundle_path}: {e}")
+
+
+def _check_files(bundle: tarfile.TarFile, manifest: Dict, target_dir: Optional[str] = None):
+    """Check every file of a bundle against the manifest, writing them under target_dir if given"""
+    expected = manifest['files']
+    seen = set()
+    for member in bundle:
+        if member.offset == 0 and member.name == MANIFEST_NAME:
+            continue  # Iteration starts over at the manifest read by _read_manifest
+        name = member.name[len(INDEX_PREFIX):] if member.name.startswith(INDEX_PREFIX) else None
+        # Only regular files listed in the manifest are accepted; nothing can land outside target_dir
+        if not member.isfile() or name not in expected or name in seen:
+            raise SnapshotError(f"Unexpected entry {member.name!r} in bundle")
+        seen.add(name)
+
+        digest = hashlib.sha256()
+        size = 0
+        source = bundle.extractfile(member)
+        target = None
+        if target_dir:
+            path = os.path.join(target_dir, *name.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            target = open(path, "wb")
+        try:
+            for block in iter(lambda: source.read(READ_SIZE), b""):
+                digest.update(block)
+                size += len(block)
+                if target:
+                    target.write(block)
+        finally:
+            if target:
+                target.close()
+        if size != expected[name]['size'] or digest.hexdigest() != expected[name]['sha256']:
+            raise SnapshotError(f"Checksum mismatch for {name}")
+
+    missing = set(expected) - seen
+    if missing:
+        raise SnapshotError(f"Bundle is missing {len(missing)} files, e.g. {sorted(missing)[0]}")
+
+
+def verify_snapshot(bundle_path: str) -> Dict:
+    """Manifest of a bundle after checking every file's size and checksum"""
+    try:
+        with tarfile.open(bundle_path, "r") as bundle:
+            manifest = _read_manifest(bundle)
+            _check_files(bundle, manifest)
+    except (tarfile.TarError, ValueError, KeyError) as e:
+        raise SnapshotError(f"Unreadable bundle {bundle_path}: {e}")
+    return manifest
+
+
+def import_snapshot(bundle_path: str, snapshots_dir: str) -> Tuple[str, Dict]:
+    """Verify and unpack a bundle into snapshots_dir/<snapshot id>; returns that directory and the manifest
+
+    Importing a snapshot that is already there returns the existing directory.
+    """
+    os.makedirs(snapshots_dir, exist_ok=True)
+    manifest = read_manifest(bundle_path)
+    target = os.path.join(snapshots_dir, manifest['snapshot_id'])
+    if os.path.isdir(target):
+        return target, manifest
+
+    partial = os.path.join(snapshots_dir, f".{manifest['snapshot_id']}.partial")
+    shutil.rmtree(partial, ignore_errors=True)
+    try:
+        with tarfile.open(bundle_path, "r") as bundle:
+            _read_manifest(bundle)
+            _check_files(bundle, manifest, partial)
+        with open(os.path.join(partial, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(partial, target)
+    except (tarfile.TarError, ValueError, KeyError) as e:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise SnapshotError(f"Unreadable bundle {bundle_path}: {e}")
+    except Exception:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    return target, manifest
+
+
+def compatibility_problems(manifest: Dict, store_info: Dict) -> List[str]:
+    """Why a snapshot's vectors cannot be served by a store (VectorStore.index_info()), empty if they can"""
+    info = manifest.get('index') or {}
+    problems = []
+    for key in ('embedder', 'model_name', 'dimension', 'index_type'):
+        if info.get(key) != store_info.get(key):
+            problems.append(f"{key} is {info.get(key)!r} in the snapshot but {store_info.get(key)!r} here")
+    # A sharded store can load a flat index file, but not the other way round
+    if info.get('sharded') and not store_info.get('sharded'):
+        problems.append("the snapshot was saved by a sharded store")
+    return problems
+
+
+def activate_snapshot(vector_store, bundle_path: str, snapshots_dir: str, keep: int = 2) -> Dict:
+    """Import a bundle and switch a running store to it; returns the manifest
+
+    The most recent ``keep`` snapshot directories, including the new one, are kept
+    so that readers still on the previous one are unaffected; older ones are removed.
+    """
+    manifest = read_manifest(bundle_path)
+    problems = compatibility_problems(manifest, vector_store.index_info())
+    if problems:
+        raise SnapshotError("Snapshot does not fit this store: " + "; ".join(problems))
+
+    snapshot_path, manifest = import_snapshot(bundle_path, snapshots_dir)
+    vector_store.swap_index(snapshot_path)
+    prune_snapshots(snapshots_dir, keep, current=snapshot_path)
+    return manifest
+
+
+def prune_snapshots(snapshots_dir: str, keep: int, current: str = None):
+    """Remove all but the newest ``keep`` imported snapshots (never the current one)"""
+    snapshots = sorted(
+        (os.path.join(snapshots_dir, name) for name in os.listdir(snapshots_dir)
+         if not name.startswith(".") and os.path.isfile(os.path.join(snapshots_dir, name, MANIFEST_NAME))),
+        key=os.path.getmtime, reverse=True
+    )
+    current = os.path.abspath(current) if current else None
+    for path in snapshots[keep:]:
+        if os.path.abspath(path) != current:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,114 @@
+"""
+Structured store of the tables extracted from each source.
+
+Cleaning flattens a table's ``[TABLE]`` block into running text, which is fine for
+embedding but loses rows and columns. The table store keeps each table's cells,
+page and bounding box, plus the offsets of its block in the joined source text.
+Chunks are linked to tables through those offsets: a chunk covers a table when
+their character ranges overlap, so links stay right when a re-upload moves chunks.
+"""
+
+from typing import Dict, List, Optional
+import json
+import os
+import threading
+
+from utils.chunk_records import ExtractedPage, PageMap
+from utils.page_store import source_path
+
+TABLE_START = "[TABLE]"
+TABLE_END = "[/TABLE]"
+
+
+def table_records(pages: List[ExtractedPage]) -> List[Dict]:
+    """Every table of a document with its page and its offsets in the joined page text
+
+    The k-th table of a page is matched with the k-th [TABLE] block of the page's
+    text; a table whose block did not survive cleaning gets no offsets.
+    """
+    _, page_map = PageMap.join_pages(pages)
+    records = []
+    for page in pages:
+        if not page.tables:
+            continue
+        page_start = page_map.page_bounds(page.number)[0] if page.text else None
+        cursor = 0
+        for index, table in enumerate(page.tables):
+            record = {
+                'table_id': len(records),
+                'page': page.number,
+                'index': index,
+                'bbox': list(table.bbox),
+                'rows': table.rows
+            }
+            start = page.text.find(TABLE_START, cursor) if page_start is not None else -1
+            if start >= 0:
+                end = page.text.find(TABLE_END, start)
+                end = len(page.text) if end < 0 else end + len(TABLE_END)
+                record['char_start'], record['char_end'] = page_start + start, page_start + end
+                cursor = end
+            records.append(record)
+    return records
+
+
+class TableStore:
+    """Tables of every ingested source, one JSON file per source"""
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        self._tables: Dict[str, List[Dict]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, source: str) -> str:
+        return source_path(self.store_dir, source, ".tables.json")
+
+    def write(self, source: str, pages: List[ExtractedPage]):
+        """Store a source's tables, replacing any earlier version of them"""
+        records = table_records(pages)
+        path = self._path(source)
+        with self._lock:
+            if records:
+                os.makedirs(self.store_dir, exist_ok=True)
+                with open(f"{path}.tmp", "w") as f:
+                    json.dump({'source': source, 'tables': records}, f)
+                os.replace(f"{path}.tmp", path)
+            elif os.path.exists(path):
+                os.remove(path)
+            self._tables[source] = records
+
+    def _load(self, source: str) -> List[Dict]:
+        with self._lock:
+            tables = self._tables.get(source)
+            if tables is None:
+                path = self._path(source)
+                tables = []
+                if os.path.exists(path):
+                    with open(path, "r") as f:
+                        tables = json.load(f)['tables']
+                self._tables[source] = tables
+            return tables
+
+    def get_tables(self, source: str, page: Optional[int] = None) -> List[Dict]:
+        """All tables of a source, or those on one page"""
+        return [table for table in self._load(source) if page is None or table['page'] == page]
+
+    def get_table(self, source: str, table_id: int) -> Optional[Dict]:
+        tables = self._load(source)
+        return tables[table_id] if 0 <= table_id < len(tables) else None
+
+    def tables_in_range(self, source: str, start: int, end: int) -> List[Dict]:
+        """Tables whose block overlaps text [start, end) - the tables a chunk covers"""
+        return [table for table in self._load(source)
+                if 'char_start' in table and table['char_start'] < end and start < table['char_end']]
+
+    def delete(self, source: str):
+        with self._lock:
+            self._tables.pop(source, None)
+            path = self._path(source)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self):
+        """Forget cached tables (the caller removes the directory)"""
+        with self._lock:
+            self._tables.clear()
@@ -0,0 +1,115 @@
+"""
+Streaming text cleaning for extracted PDF text.
+
+``PDFProcessor.enhanced_clean_text`` used to run six ``re.sub`` passes over the whole
+document, each allocating a new copy. ``TextCleaner`` applies the same normalizations
+in a single regex pass per block and only ever holds one block of working state, so
+time is linear in the document size and extra memory stays flat.
+"""
+
+from typing import Iterable, Iterator
+import re
+
+# One alternation for every normalization, tried left to right at each position:
+#   hyphen   - words split across lines ("exam-\n ple" -> "example")
+#   sentence - whitespace (or nothing) after . ! ? before a capital becomes a paragraph break
+#   space    - any other whitespace run collapses to one space (single spaces are left alone)
+#   drop     - characters outside the academic symbol set are removed
+CLEAN_PATTERN = re.compile(
+    r"(?P<hyphen>(?<=\w)-\s*\n\s*(?=\w))"
+    r"|(?P<sentence>(?<=[.!?])\s*(?=[A-Z]))"
+    r"|(?P<space>[^\S ]\s*| \s+)"
+    r"|(?P<drop>[^\w\s.,;:!?()\-+=/'\"°%$#@&\[\]{}]+)"
+)
+REPLACEMENTS = {'hyphen': '', 'sentence': '\n\n', 'space': ' ', 'drop': ''}
+
+# Blocks are only cut between two word characters, where no rule can match across the cut
+SAFE_CUT_PATTERN = re.compile(r'\w(?=\w)')
+
+
+def _replace(match) -> str:
+    return REPLACEMENTS[match.lastgroup]
+
+
+class TextCleaner:
+    """Cleans text incrementally: feed pages or blocks, collect cleaned pieces
+
+    ``feed``/``finish`` keep per-stream state, so use one instance per document for
+    streaming; ``clean`` works on a private stream and can be shared.
+
+    Matches the old sequential passes exactly, except that a run of several words
+    hyphenated across consecutive lines is now joined throughout instead of only at
+    every other break.
+    """
+
+    def __init__(self, block_size: int = 64 * 1024):
+        self.block_size = block_size
+        self._pending = []  # Input not yet cleaned
+        self._pending_size = 0
+        self._at_start = True
+
+    def feed(self, text: str) -> str:
+        """Add raw text; returns the cleaned output that is final so far"""
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self._pending_size < self.block_size:
+            return ''
+
+        buffered = ''.join(self._pending)
+        cut = self._safe_cut(buffered)
+        if cut is None:
+            # No safe cut point yet (e.g. a long run of symbols); keep buffering
+            self._pending = [buffered]
+            return ''
+
+        self._pending = [buffered[cut:]]
+        self._pending_size = len(buffered) - cut
+        return self._clean_block(buffered[:cut])
+
+    def finish(self) -> str:
+        """Clean whatever is still buffered; the cleaner can be reused afterwards"""
+        cleaned = self._clean_block(''.join(self._pending)).rstrip()
+        self._pending = []
+        self._pending_size = 0
+        self._at_start = True
+        return cleaned
+
+    def _clean_block(self, block: str) -> str:
+        cleaned = CLEAN_PATTERN.sub(_replace, block)
+        if self._at_start:
+            cleaned = cleaned.lstrip()
+            self._at_start = not cleaned
+        return cleaned
+
+    @staticmethod
+    def _safe_cut(text: str):
+        """Last position inside the text that sits between two word characters"""
+        window = 256
+        while window < len(text) * 2:
+            start = max(0, len(text) - window)
+            last = None
+            for last in SAFE_CUT_PATTERN.finditer(text, start):
+                pass
+            if last is not None:
+                return last.end()
+            window *= 4
+        return None
+
+    def clean_pieces(self, pieces: Iterable[str]) -> Iterator[str]:
+        """Stream cleaned output for an iterable of raw text pieces"""
+        for piece in pieces:
+            cleaned = self.feed(piece)
+            if cleaned:
+                yield cleaned
+        yield self.finish()
+
+    def clean(self, text: str) -> str:
+        """Clean a whole document, block by block (safe to call from several threads)"""
+        stream = TextCleaner(self.block_size)
+        return ''.join(stream.clean_pieces(text[i:i + self.block_size]
+                                           for i in range(0, len(text), self.block_size)))
+
+
+def clean_text(text: str) -> str:
+    """Clean a document with a default TextCleaner"""
+    return TextCleaner().clean(text)
@@ -0,0 +1,205 @@
+"""
+Native recursive text splitter.
+
+Produces the same chunks as LangChain's ``RecursiveCharacterTextSplitter`` with
+literal separators kept at the start of each piece (the configuration PDFProcessor
+used), without importing LangChain. Pieces are tracked as (start, end) offsets into
+the original string, located with ``str.find``; merging adjacent pieces is a single
+slice of the original text instead of a join of re-split substrings.
+
+With the default ``len`` length function, piece boundaries come from one C-level
+``str.split`` plus ``accumulate`` per level, and each greedy merge step is a bisect
+over those offsets, so Python-level work is per chunk rather than per piece.
+"""
+
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, repeat
+from operator import add
+from typing import Callable, List, Optional, Tuple
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", " ", ""]
+
+
+class FastTextSplitter:
+    """Recursive character splitter working on offsets into the original text"""
+
+    def __init__(self, chunk_size: int = 4000, chunk_overlap: int = 200,
+                 length_function: Callable[[str], int] = len, separators: Optional[List[str]] = None,
+                 strip_whitespace: bool = True):
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be > 0, got {chunk_size}")
+        if chunk_overlap < 0:
+            raise ValueError(f"chunk_overlap must be >= 0, got {chunk_overlap}")
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"Got a larger chunk overlap ({chunk_overlap}) than chunk size ({chunk_size}), should be smaller."
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_function = length_function
+        self.separators = separators or DEFAULT_SEPARATORS
+        self.strip_whitespace = strip_whitespace
+        self._joiner_length = length_function("")
+
+    @classmethod
+    def from_tokenizer(cls, tokenizer, **kwargs) -> "FastTextSplitter":
+        """Splitter measuring chunk_size and chunk_overlap in tokens of a Hugging Face tokenizer
+
+        The embedding model's tokenizer (``SentenceTransformer.tokenizer``) keeps
+        chunks inside the model's input window.
+        """
+        def token_length(text: str) -> int:
+            return len(tokenizer.encode(text, add_special_tokens=False))
+
+        return cls(length_function=token_length, **kwargs)
+
+    def split_text(self, text: str) -> List[str]:
+        """Split text into chunks"""
+        return [chunk for chunk, _ in self.split_text_with_offsets(text)]
+
+    def split_text_with_offsets(self, text: str) -> List[Tuple[str, int]]:
+        """Split text into (chunk, start offset in text) pairs"""
+        if not text:
+            return []
+        chunks = []
+        self._split(text, 0, len(text), 0, chunks)
+        return chunks
+
+    def _measure(self, text: str, start: int, end: int) -> int:
+        if self.length_function is len:
+            return end - start
+        return self.length_function(text[start:end])
+
+    def _pieces(self, text: str, start: int, end: int, separator: str) -> List[Tuple[int, int]]:
+        """Offsets of the non-empty pieces, each starting with its separator"""
+        if not separator:
+            return [(i, i + 1) for i in range(start, end)]
+
+        pieces = []
+        piece_start = start
+        position = text.find(separator, start, end)
+        while position != -1:
+            if position > piece_start:
+                pieces.append((piece_start, position))
+            piece_start = position
+            position = text.find(separator, position + len(separator), end)
+        if end > piece_start:
+            pieces.append((piece_start, end))
+        return pieces
+
+    @staticmethod
+    def _boundaries(text: str, start: int, end: int, separator: str) -> List[int]:
+        """Piece boundaries for ``len`` lengths: piece i spans boundaries[i]:boundaries[i + 1]"""
+        if not separator:
+            return list(range(start, end + 1))
+        parts = text[start:end].split(separator)
+        # Each part plus the separator that follows it; starting one separator early makes
+        # the running sums land on the separator positions, and the last one on end
+        boundaries = list(accumulate(map(add, map(len, parts), repeat(len(separator))),
+                                     initial=start - len(separator)))
+        boundaries[0] = start
+        if len(boundaries) > 1 and boundaries[1] == start:
+            del boundaries[0]  # Text starts with the separator: no empty first piece
+        return boundaries
+
+    def _split(self, text: str, start: int, end: int, level: int, chunks: List[Tuple[str, int]]):
+        # Use the first separator that occurs in this range; finer ones split long pieces
+        separator = self.separators[-1]
+        next_level = None
+        for i in range(level, len(self.separators)):
+            candidate = self.separators[i]
+            if candidate == "":
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                next_level = i + 1
+                break
+        if next_level is not None and next_level >= len(self.separators):
+            next_level = None
+
+        if self.length_function is len and self._joiner_length == 0:
+            self._split_by_offsets(text, start, end, separator, next_level, chunks)
+            return
+
+        good_pieces = []
+        for piece_start, piece_end in self._pieces(text, start, end, separator):
+            length = self._measure(text, piece_start, piece_end)
+            if length < self.chunk_size:
+                good_pieces.append((piece_start, piece_end, length))
+                continue
+
+            if good_pieces:
+                self._merge(text, good_pieces, chunks)
+                good_pieces = []
+            if next_level is None:
+                chunks.append((text[piece_start:piece_end], piece_start))
+            else:
+                self._split(text, piece_start, piece_end, next_level, chunks)
+
+        if good_pieces:
+            self._merge(text, good_pieces, chunks)
+
+    def _split_by_offsets(self, text: str, start: int, end: int, separator: str, next_level: Optional[int],
+                          chunks: List[Tuple[str, int]]):
+        """Same as the generic path, for character lengths measured from offsets"""
+        boundaries = self._boundaries(text, start, end, separator)
+        chunk_size = self.chunk_size
+        run_start = 0  # First piece of the current run of short pieces
+        for piece in range(len(boundaries) - 1):
+            piece_start, piece_end = boundaries[piece], boundaries[piece + 1]
+            if piece_end - piece_start < chunk_size:
+                continue
+            if piece > run_start:
+                self._merge_offsets(text, boundaries, run_start, piece, chunks)
+            if next_level is None:
+                chunks.append((text[piece_start:piece_end], piece_start))
+            else:
+                self._split(text, piece_start, piece_end, next_level, chunks)
+            run_start = piece + 1
+        if len(boundaries) - 1 > run_start:
+            self._merge_offsets(text, boundaries, run_start, len(boundaries) - 1, chunks)
+
+    def _merge_offsets(self, text: str, boundaries: List[int], first: int, stop: int,
+                       chunks: List[Tuple[str, int]]):
+        """Greedy merge of pieces first..stop-1 by bisecting their boundary offsets"""
+        chunk_size, chunk_overlap = self.chunk_size, self.chunk_overlap
+        while True:
+            # Last boundary the chunk can reach: pieces first..last-1 fit in chunk_size
+            last = min(bisect_right(boundaries, boundaries[first] + chunk_size, first + 1, stop + 1), stop + 1) - 1
+            if last >= stop:
+                self._emit(text, boundaries[first], boundaries[stop], chunks)
+                return
+            self._emit(text, boundaries[first], boundaries[last], chunks)
+            # Keep at most chunk_overlap characters, and leave room for the next piece
+            first = min(last, max(
+                first,
+                bisect_left(boundaries, boundaries[last] - chunk_overlap, first, last + 1),
+                bisect_left(boundaries, boundaries[last + 1] - chunk_size, first, last + 1)
+            ))
+
+    def _merge(self, text: str, pieces: List[Tuple[int, int, int]], chunks: List[Tuple[str, int]]):
+        """Greedily pack adjacent pieces into chunks, carrying up to chunk_overlap into the next"""
+        # Pieces keep their separators, so joining adds nothing - but measure it like LangChain does
+        joiner = self._joiner_length
+        first = 0  # Index of the first piece in the current chunk
+        total = 0
+        for index, (_, _, length) in enumerate(pieces):
+            if total + length + (joiner if index > first else 0) > self.chunk_size and index > first:
+                self._emit(text, pieces[first][0], pieces[index - 1][1], chunks)
+                # Drop pieces from the front until the carried-over part fits the overlap
+                while total > self.chunk_overlap or (
+                        total + length + (joiner if index > first else 0) > self.chunk_size and total > 0):
+                    total -= pieces[first][2] + (joiner if index - first > 1 else 0)
+                    first += 1
+            total += length + (joiner if index > first else 0)
+        self._emit(text, pieces[first][0], pieces[-1][1], chunks)
+
+    def _emit(self, text: str, start: int, end: int, chunks: List[Tuple[str, int]]):
+        chunk = text[start:end]
+        if self.strip_whitespace:
+            stripped = chunk.lstrip()
+            start += len(chunk) - len(stripped)
+            chunk = stripped.rstrip()
+        if chunk:
+            chunks.append((chunk, start))
@@ -0,0 +1,185 @@
+"""
+Lightweight stage tracing.
+
+``span("vector_store.search")`` times a block of work. Every span feeds a latency
+histogram per stage, exposed in the Prometheus text format by ``render_metrics``
+(served at ``/metrics``). While a trace is active, spans are also recorded with
+their nesting so a single request can return its own timeline for debugging.
+Traces are scoped with contextvars, so concurrent requests never mix their spans.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, List, Optional
+import bisect
+import threading
+import time
+
+# Upper bounds in seconds, from cache hits to slow model generations
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram for one stage"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot: above every bound (+Inf)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def cumulative(self) -> List[int]:
+        totals, running = [], 0
+        for count in self.counts:
+            running += count
+            totals.append(running)
+        return totals
+
+
+class Trace:
+    """Spans recorded for one request, in start order"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []
+        self.stack = []  # Indexes of the open spans
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'spans': self.spans
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar('studymate_trace', default=None)
+
+
+class Tracer:
+    """Collects stage histograms and error counts for the whole process"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.histograms: Dict[str, Histogram] = {}
+        self.errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, error: bool = False):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            if error:
+                self.errors[stage] = self.errors.get(stage, 0) + 1
+
+    @contextmanager
+    def span(self, stage: str, **attributes):
+        """Time a stage; recorded in the stage histogram and the active trace, if any"""
+        trace = _current_trace.get()
+        record = None
+        if trace is not None:
+            record = {
+                'stage': stage,
+                'start_ms': round((time.perf_counter() - trace.started) * 1000, 3),
+                'parent': trace.spans[trace.stack[-1]]['stage'] if trace.stack else None
+            }
+            if attributes:
+                record['attributes'] = attributes
+            trace.stack.append(len(trace.spans))
+            trace.spans.append(record)
+
+        start = time.perf_counter()
+        error = False
+        try:
+            yield record
+        except BaseException:
+            error = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe(stage, seconds, error)
+            if record is not None:
+                record['duration_ms'] = round(seconds * 1000, 3)
+                if error:
+                    record['error'] = True
+                trace.stack.pop()
+
+    def render(self) -> str:
+        """All histograms in the Prometheus text exposition format"""
+        with self._lock:
+            snapshot = {stage: (histogram.cumulative(), histogram.sum, histogram.count)
+                        for stage, histogram in self.histograms.items()}
+            errors = dict(self.errors)
+
+        lines = [
+            "# HELP studymate_stage_duration_seconds Time spent in each processing stage",
+            "# TYPE studymate_stage_duration_seconds histogram"
+        ]
+        for stage in sorted(snapshot):
+            cumulative, total, count = snapshot[stage]
+            label = _escape(stage)
+            for bound, bucket_count in zip(self.buckets, cumulative):
+                lines.append(f'studymate_stage_duration_seconds_bucket{{stage="{label}",le="{bound}"}} {bucket_count}')
+            lines.append(f'studymate_stage_duration_seconds_bucket{{stage="{label}",le="+Inf"}} {cumulative[-1]}')
+            lines.append(f'studymate_stage_duration_seconds_sum{{stage="{label}"}} {total}')
+            lines.append(f'studymate_stage_duration_seconds_count{{stage="{label}"}} {count}')
+
+        lines.append("# HELP studymate_stage_errors_total Stages that ended with an exception")
+        lines.append("# TYPE studymate_stage_errors_total counter")
+        for stage in sorted(errors):
+            lines.append(f'studymate_stage_errors_total{{stage="{_escape(stage)}"}} {errors[stage]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.errors.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Process-wide tracer used by the module-level helpers
+TRACER = Tracer()
+
+
+def span(stage: str, **attributes):
+    return TRACER.span(stage, **attributes)
+
+
+def traced(stage: str):
+    """Decorator form of span"""
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with TRACER.span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def start_trace(name: str):
+    """Begin recording spans in the current context; returns the trace and a token for end_trace"""
+    trace = Trace(name)
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def render_metrics() -> str:
+    return TRACER.render()
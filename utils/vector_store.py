@@ -1,151 +1,481 @@
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import pickle
 import os
 import json
 import re
+import threading
 from dotenv import load_dotenv
+from utils.embedding_model import Embedder, load_embedder
+from utils.chunk_analyzer import KeywordMatcher, LIST_PATTERN, key_phrases
+from utils.quantized_index import QuantizedVectorIndex
+from utils.sharded_search import ShardedIndex, ShardedVectorSearch
+from utils.chunk_records import format_pages
+from utils.dedup import NearDuplicateDetector, collapse_duplicates, mmr
+from utils.page_diff import PageManifest, PageUpdate
+from utils.keyword_index import KeywordIndex, highlight
+from utils.page_store import PageStore
+from utils.table_store import TableStore
+from utils.snapshot import NAMESPACES_DIR, export_snapshot
+from utils.model_migration import ModelMigration
+from utils.routing_index import SECTION_CHUNKS, RoutingIndex
+from utils.tracing import span, traced
 
 load_dotenv()
 
+# Content markers and metadata flags found with one keyword scan per document
+DOCUMENT_MARKERS = KeywordMatcher({
+    'definition_marker': ['define', 'definition', 'is defined as'],
+    'example_marker': ['example', 'for instance', 'such as'],
+    'process_marker': ['process', 'steps', 'procedure'],
+    'has_definition': ['define', 'definition'],
+    'has_example': ['example', 'for instance'],
+    'has_process': ['process', 'steps']
+})
+
+# Decorations _enhance_document_content adds around the original chunk text
+CONTENT_TAG_PATTERN = re.compile(r'^\[(?:DEFINITION|EXAMPLE|PROCESS)\] ')
+KEY_TERMS_SUFFIX = "\n[KEY_TERMS] "
+# How long shard workers of a swapped-out index keep serving searches already running on it
+SWAP_GRACE_SECONDS = 30.0
+
+class IndexGeneration:
+    """Immutable snapshot of the index, documents and metadata that searches run against
+    
+    Writers never modify a published generation. They build the next one and swap it
+    in with a single reference assignment, so readers need no lock and never see a
+    half-built index or lists of mismatched length.
+    """
+    
+    def __init__(self, index, documents: tuple = (), document_metadata: tuple = (), version: int = 0,
+                 embedder: Embedder = None, keyword_index: KeywordIndex = None, page_store: PageStore = None,
+                 table_store: TableStore = None):
+        self.index = index
+        self.documents = tuple(documents)
+        self.document_metadata = tuple(document_metadata)
+        self.version = version
+        # The model that embedded these vectors; queries against them must use it too
+        self.embedder = embedder
+        # Keyword postings (by chunk uid) and stored pages and tables (by source) of this corpus.
+        # Generations of one corpus share them; a swapped-in corpus brings its own, published
+        # together with its chunks so readers never mix the uids or sources of two corpora
+        self.keyword_index = keyword_index
+        self.page_store = page_store
+        self.table_store = table_store
+        self._rows_by_uid = None
+        # Section centroids for routed search, built on first use (see VectorStore._routing_index)
+        self.routing = None
+    
+    def rows_by_uid(self) -> Dict[int, int]:
+        """chunk_uid -> row, built on first use (a cache, not a change to the snapshot)"""
+        if self._rows_by_uid is None:
+            self._rows_by_uid = {metadata.get('chunk_uid'): row for row, metadata in enumerate(self.document_metadata)}
+        return self._rows_by_uid
+
+
 class VectorStore:
-    """Manages vector storage and similarity search for documents"""
+    """Manages vector storage and similarity search for documents
+    
+    Reads are lock-free against the current IndexGeneration; writes are serialized
+    by a writer lock and publish a new generation atomically.
+    """
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", index_path: str = "vector_index"):
-        self.model_name = model_name
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", index_path: str = "vector_index",
+                 index_type: str = "flat", num_shards: int = 0, dedup_threshold: float = 0.95,
+                 dedup_method: str = "embedding", mmr_lambda: float = 0.7, route_sections: int = 0,
+                 embedder: Embedder = None):
         self.index_path = index_path
+        # "flat" keeps exact float vectors in RAM; "sq8"/"pq" keep compressed codes and re-rank from disk
+        self.index_type = index_type
+        # With num_shards > 0 vectors live in that many worker processes instead of this one
+        self.num_shards = num_shards
+        # Near-duplicate chunks of a document are stored once (None disables deduplication)
+        self.deduplicator = NearDuplicateDetector(dedup_threshold, dedup_method) if dedup_threshold else None
+        # Relevance vs diversity trade-off used to fill get_relevant_context (1.0: plain top-k)
+        self.mmr_lambda = mmr_lambda
+        # With route_sections > 0 a query only scores the chunks of that many best-matching sections
+        self.route_sections = route_sections
+        self._routing_lock = threading.Lock()
+        # (embedder, routing index) of the last routed generation, whose unchanged sections are reused
+        self._last_routing = None
         
-        # Set Hugging Face token if available
-        hf_token = os.getenv("HF_TOKEN")
-        if hf_token:
-            os.environ["HUGGINGFACE_HUB_TOKEN"] = hf_token
-            print("✅ Using Hugging Face token for enhanced model access")
+        # The requested model; a saved index built with another one is served with that one until migrated.
+        # An embedder passed in is shared with other stores (e.g. namespaces) instead of loading the model again
+        self.target_embedder = embedder.fresh() if embedder else load_embedder(model_name)
+        # Background re-embedding with another model, if one was started
+        self.migration = None
         
-        try:
-            print(f"🔄 Loading embedding model: {model_name}")
-            # Add timeout for model loading to avoid hanging
-            import signal
-            
-            def timeout_handler(signum, frame):
-                raise TimeoutError("Model loading timed out")
-            
-            # Set timeout for 30 seconds
-            signal.signal(signal.SIGALRM, timeout_handler)
-            signal.alarm(30)
-            
-            try:
-                self.embedding_model = SentenceTransformer(model_name)
-                self.dimension = self.embedding_model.get_sentence_embedding_dimension()
-                signal.alarm(0)  # Cancel timeout
-                print(f"✅ Embedding model loaded successfully with dimension: {self.dimension}")
-            except (TimeoutError, Exception) as model_error:
-                signal.alarm(0)  # Cancel timeout
-                raise model_error
-                
-        except Exception as e:
-            print(f"⚠️ Error loading embedding model: {e}")
-            print("🔄 Falling back to simple TF-IDF embeddings...")
-            self.embedding_model = None
-            self.dimension = 512  # Fixed dimension for TF-IDF
+        # Serializes writers; readers only ever touch self._generation
+        self._write_lock = threading.RLock()
         
-        # Initialize FAISS index
-        self.index = faiss.IndexFlatIP(self.dimension)  # Inner product for cosine similarity
-        self.documents = []  # Store original documents
-        self.document_metadata = []  # Store metadata
+        # Sharded mode: vectors live in worker processes, addressed by chunk uid
+        self.shards = ShardedVectorSearch(self.target_embedder.dimension, num_shards) if num_shards > 0 else None
+        # Every chunk gets a stable uid so shard and keyword results map back to generation rows
+        self._next_uid = 0
+        
+        # Page hashes of each ingested source, so a re-upload only re-embeds changed pages
+        self.page_manifests = {}
+        
+        # Initialize FAISS index (inner product for cosine similarity) with no documents.
+        # Beside it: exact word and phrase search over the same chunks, built at ingest; the
+        # compressed text of every ingested page, for page views and citation previews; and
+        # the rows and cells of extracted tables, linked to chunks by text offsets
+        self._generation = IndexGeneration(self._create_index(dimension=self.target_embedder.dimension),
+                                           embedder=self.target_embedder,
+                                           keyword_index=KeywordIndex(),
+                                           page_store=PageStore(os.path.join(index_path, "pages")),
+                                           table_store=TableStore(os.path.join(index_path, "tables")))
         
         # Load existing index if available
         self.load_index()
     
-    def embed_text(self, text: str) -> np.ndarray:
-        """Generate embedding for a single text"""
-        if self.embedding_model:
-            embedding = self.embedding_model.encode([text])
-            # Normalize for cosine similarity
-            faiss.normalize_L2(embedding)
-            return embedding[0]
-        else:
-            # Simple TF-IDF fallback
-            return self._simple_embedding(text)
+    @property
+    def index(self):
+        return self._generation.index
+    
+    @property
+    def documents(self) -> tuple:
+        return self._generation.documents
+    
+    @property
+    def document_metadata(self) -> tuple:
+        return self._generation.document_metadata
+    
+    @property
+    def version(self) -> int:
+        """Monotonic corpus version, bumped by every published write"""
+        return self._generation.version
+    
+    @property
+    def embedder(self) -> Embedder:
+        """The model the current generation was embedded with"""
+        return self._generation.embedder
+    
+    @property
+    def model_name(self) -> str:
+        return self._generation.embedder.model_name
+    
+    @property
+    def embedding_model(self):
+        return self._generation.embedder.model
     
+    @property
+    def fallback_embedder(self):
+        return self._generation.embedder.fallback
+    
+    @property
+    def dimension(self) -> int:
+        return self._generation.embedder.dimension
+    
+    @property
+    def keyword_index(self) -> KeywordIndex:
+        return self._generation.keyword_index
+    
+    @property
+    def page_store(self) -> PageStore:
+        return self._generation.page_store
+    
+    @property
+    def table_store(self) -> TableStore:
+        return self._generation.table_store
+    
+    def _create_index(self, version: int = 0, dimension: int = None):
+        """Create an empty index of the configured type (for the current model unless a dimension is given)"""
+        dimension = dimension or self.dimension
+        if self.shards:
+            return ShardedIndex(self.shards, [])
+        if self.index_type == "flat":
+            return faiss.IndexFlatIP(dimension)
+        # Each rebuilt generation gets its own vector file so older readers keep a valid mapping
+        vector_file = "vectors.f32" if version == 0 else f"vectors-{version}.f32"
+        return QuantizedVectorIndex(
+            dimension,
+            index_type=self.index_type,
+            vector_path=os.path.join(self.index_path, vector_file)
+        )
+    
+    def _clone_index(self, index):
+        """Copy an index so the next generation can be extended without touching the live one"""
+        if isinstance(index, QuantizedVectorIndex):
+            return index.clone()
+        return faiss.clone_index(index)
+    
+    def _index_vectors(self, index) -> np.ndarray:
+        """Zero-copy view of every stored vector, in row order"""
+        if index.ntotal == 0:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        if isinstance(index, QuantizedVectorIndex):
+            return index.float_vectors()
+        if isinstance(index, ShardedIndex):
+            return index.reconstruct_rows(list(range(index.ntotal)))
+        return faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+    
+    def _publish(self, index, documents, document_metadata, embedder: Embedder = None,
+                 keyword_index: KeywordIndex = None, page_store: PageStore = None, table_store: TableStore = None):
+        """Atomically swap in a new generation (caller holds the write lock)
+        
+        The keyword index and page and table stores carry over unless another corpus brings its own.
+        """
+        current = self._generation
+        self._generation = IndexGeneration(index, documents, document_metadata, current.version + 1,
+                                           embedder or current.embedder,
+                                           keyword_index or current.keyword_index,
+                                           page_store or current.page_store,
+                                           table_store or current.table_store)
+    
+    @traced("vector_store.embed_query")
+    def embed_text(self, text: str, embedder: Embedder = None) -> np.ndarray:
+        """Embed a query (with the current model unless another is given)"""
+        return (embedder or self.embedder).encode_queries([text])[0]
+    
+    @traced("vector_store.embed_documents")
     def embed_texts(self, texts: List[str]) -> np.ndarray:
         """Generate embeddings for multiple texts"""
-        if self.embedding_model:
-            embeddings = self.embedding_model.encode(texts)
-            # Normalize for cosine similarity
-            faiss.normalize_L2(embeddings)
-            return embeddings
-        else:
-            # Simple TF-IDF fallback
-            embeddings = []
-            for text in texts:
-                embeddings.append(self._simple_embedding(text))
-            return np.array(embeddings)
+        return self.embedder.encode(texts)
     
     def _simple_embedding(self, text: str) -> np.ndarray:
-        """Simple hash-based embedding as fallback"""
-        words = text.lower().split()
-        # Create a simple feature vector based on word hashes
-        embedding = np.zeros(self.dimension)
-        for i, word in enumerate(words[:50]):  # Use first 50 words
-            word_hash = hash(word) % self.dimension
-            embedding[word_hash] += 1.0
-        # Normalize
-        norm = np.linalg.norm(embedding)
-        if norm > 0:
-            embedding = embedding / norm
-        return embedding
+        """Hash-based embedding used as fallback (kept for backward compatibility)"""
+        return self.fallback_embedder.transform([text])[0]
     
+    @traced("vector_store.add_documents")
     def add_documents(self, documents: List[str], metadata: List[Dict] = None):
         """Add documents to the vector store with enhanced processing"""
         if not documents:
             return
         
+        processed_documents, processed_metadata = self._prepare_documents(documents, metadata)
+        
+        with self._write_lock:
+            processed_documents, processed_metadata, embeddings = self._embed_documents(
+                processed_documents, processed_metadata)
+            self._assign_uids(processed_metadata)
+            
+            # Build the next generation next to the live one, then swap it in
+            current = self._generation
+            if self.shards:
+                index = self._add_to_shards(current.index, embeddings, processed_metadata)
+            else:
+                index = self._clone_index(current.index)
+                index.add(embeddings.astype('float32'))
+            self._publish(
+                index,
+                current.documents + tuple(processed_documents),
+                current.document_metadata + tuple(processed_metadata)
+            )
+            self._index_keywords(processed_documents, processed_metadata)
+            
+            # Save the updated index
+            self.save_index()
+    
+    def _prepare_documents(self, documents: List[str], metadata: List[Dict] = None):
+        """Enhanced content and metadata for new documents"""
         # Enhanced preprocessing for better embeddings
         processed_documents = []
         processed_metadata = []
         
         for i, doc in enumerate(documents):
+            # Analyze each document once and share the result between content and metadata
+            analysis = self._analyze_document(doc)
+            
             # Enhance document content for better similarity search
-            enhanced_doc = self._enhance_document_content(doc)
+            enhanced_doc = self._enhance_document_content(doc, analysis)
             processed_documents.append(enhanced_doc)
             
             # Enhanced metadata with content analysis
             doc_metadata = metadata[i] if metadata and i < len(metadata) else {}
-            enhanced_metadata = self._enhance_metadata(doc, doc_metadata)
+            enhanced_metadata = self._enhance_metadata(doc, doc_metadata, analysis)
             processed_metadata.append(enhanced_metadata)
         
+        return processed_documents, processed_metadata
+    
+    def _embed_documents(self, documents: List[str], metadata: List[Dict], embeddings: np.ndarray = None):
+        """Embed prepared documents, collapsing near-duplicates (caller holds the write lock)
+        
+        Embeddings computed elsewhere (by the same model) can be passed in.
+        """
         # Generate embeddings for processed documents
-        embeddings = self.embed_texts(processed_documents)
+        if embeddings is None:
+            embeddings = self.embed_texts(documents) if documents else np.zeros((0, self.dimension), dtype=np.float32)
         
-        # Add to FAISS index
-        if self.index.ntotal == 0:
-            self.index.add(embeddings.astype('float32'))
-        else:
-            self.index.add(embeddings.astype('float32'))
+        if self.deduplicator and len(documents) > 1:
+            documents, metadata, embeddings = self._collapse_duplicates(documents, metadata, embeddings)
+        
+        # Fallback queries are weighted by the IDF of the stored chunks (collapsed ones are not stored)
+        if self.fallback_embedder and documents:
+            self.fallback_embedder.partial_fit(documents)
+        return documents, metadata, embeddings
+    
+    def get_page_manifest(self, source: str):
+        """Page hashes stored for a source, or None if it was ingested without them"""
+        manifest = self.page_manifests.get(source)
+        return PageManifest.from_dict(manifest) if manifest else None
+    
+    def get_source_metadata(self, source: str) -> List[Dict]:
+        return [metadata for metadata in self._generation.document_metadata if metadata.get('source') == source]
+    
+    def apply_page_update(self, source: str, update: PageUpdate):
+        """Replace a source's changed chunks in one published generation
+        
+        Kept chunks keep their vectors and get their new offsets and pages; removed
+        chunks are dropped and the update's new chunks are embedded and added.
+        """
+        self.apply_page_updates({source: update})
+    
+    @traced("vector_store.apply_page_update")
+    def apply_page_updates(self, updates: Dict[str, PageUpdate], prepared: Dict[str, tuple] = None,
+                           embedded_by: str = None):
+        """Apply the page updates of several sources in one published generation and one save
+        
+        prepared optionally gives, per source, the update's documents already run through
+        _prepare_documents and embedded, as (documents, metadata, embeddings) - bulk
+        ingestion does that work in worker processes. Those embeddings are recomputed if
+        the store no longer uses the model named by embedded_by.
+        """
+        prepared = prepared or {}
+        pending = {}
+        for source, update in updates.items():
+            if update.is_noop and source in self.page_manifests:
+                # Sources ingested before the page store existed get their pages stored now
+                if update.pages and not self.page_store.has_source(source):
+                    self.page_store.write(source, update.pages)
+                    self.table_store.write(source, update.pages)
+                print(f"✅ {source} is unchanged - nothing to re-embed")
+            else:
+                pending[source] = update
+        if not pending:
+            return
         
-        # Store documents and metadata
-        self.documents.extend(processed_documents)
-        self.document_metadata.extend(processed_metadata)
+        # Preparation needs no lock; embeddings are computed below, in one batch
+        new_documents, new_metadata = [], []
+        ready_documents, ready_metadata, ready_vectors = [], [], []
+        for source, update in pending.items():
+            if source in prepared:
+                documents, metadata, vectors = prepared[source]
+                ready_documents.extend(documents)
+                ready_metadata.extend(metadata)
+                ready_vectors.append(vectors)
+            else:
+                documents, metadata = self._prepare_documents(
+                    [doc['content'] for doc in update.documents], [doc['metadata'] for doc in update.documents])
+                new_documents.extend(documents)
+                new_metadata.extend(metadata)
+        removed = {source: set(update.removed_chunk_ids) for source, update in pending.items()}
         
-        # Save the updated index
-        self.save_index()
+        with self._write_lock:
+            current = self._generation
+            keep, removed_uids, removed_documents = [], {}, []
+            for i, metadata in enumerate(current.document_metadata):
+                source = metadata.get('source')
+                if source in removed and metadata.get('chunk_id') in removed[source]:
+                    removed_uids.setdefault(source, []).append(metadata['chunk_uid'])
+                    removed_documents.append(current.documents[i])
+                else:
+                    keep.append(i)
+            
+            processed_documents, processed_metadata, embeddings = self._embed_documents(new_documents, new_metadata)
+            if ready_documents:
+                ready_vectors = np.vstack(ready_vectors).astype('float32') if embedded_by in (None, self.model_name) else None
+                documents, metadata, vectors = self._embed_documents(ready_documents, ready_metadata, ready_vectors)
+                processed_documents = list(processed_documents) + list(documents)
+                processed_metadata = list(processed_metadata) + list(metadata)
+                embeddings = np.vstack([embeddings, vectors])
+            self._assign_uids(processed_metadata)
+            
+            # Surviving vectors are reused as they are - only new chunks were embedded
+            if self.shards:
+                self.shards.remove_uids(removed_uids)
+                index = ShardedIndex(self.shards, [current.index.row_uids[i] for i in keep])
+                if processed_documents:
+                    index = self._add_to_shards(index, embeddings, processed_metadata)
+            else:
+                index = self._create_index(current.version + 1)
+                vectors = [self._index_vectors(current.index)[keep]] if keep else []
+                if processed_documents:
+                    vectors.append(embeddings)
+                if vectors:
+                    index.add(np.ascontiguousarray(np.vstack(vectors), dtype=np.float32))
+            
+            document_metadata = []
+            for i in keep:
+                metadata = current.document_metadata[i]
+                update = pending.get(metadata.get('source'))
+                if update is not None:
+                    metadata = dict(metadata, **update.metadata_updates.get(metadata.get('chunk_id'), {}))
+                document_metadata.append(metadata)
+            document_metadata.extend(processed_metadata)
+            
+            documents = [current.documents[i] for i in keep] + list(processed_documents)
+            document_metadata = [dict(metadata, doc_id=row) for row, metadata in enumerate(document_metadata)]
+            for source, update in pending.items():
+                self.page_manifests[source] = update.manifest.to_dict()
+            self._publish(index, documents, document_metadata)
+            if self.fallback_embedder:
+                self.fallback_embedder.remove(removed_documents)
+            self.keyword_index.remove(uid for uids in removed_uids.values() for uid in uids)
+            self._index_keywords(processed_documents, processed_metadata)
+            for source, update in pending.items():
+                if update.pages:
+                    self.page_store.write(source, update.pages)
+                    self.table_store.write(source, update.pages)
+            self.save_index()
+        
+        added = {}
+        for metadata in processed_metadata:
+            added[metadata.get('source')] = added.get(metadata.get('source'), 0) + 1
+        for source, update in pending.items():
+            print(f"♻️ Updated {source}: {len(update.changed_pages)} changed pages, "
+                  f"{len(removed[source])} chunks replaced by {added.get(source, 0)}")
+    
+    def _collapse_duplicates(self, documents: List[str], metadata: List[Dict], embeddings: np.ndarray):
+        """Store each set of near-duplicate chunks of a source as one vector listing all their locations"""
+        representative = self.deduplicator.representatives(
+            embeddings=embeddings,
+            texts=documents,
+            groups=[m.get('source', 'Unknown') for m in metadata]
+        )
+        documents, metadata, embeddings = collapse_duplicates(documents, metadata, embeddings, representative)
+        collapsed = len(representative) - len(documents)
+        if collapsed:
+            print(f"🧹 Collapsed {collapsed} near-duplicate chunks into their first occurrence")
+        return documents, metadata, embeddings
+    
+    def _assign_uids(self, metadata: List[Dict]):
+        """Give new chunks their stable uids (caller holds the write lock)"""
+        for chunk_metadata in metadata:
+            chunk_metadata['chunk_uid'] = self._next_uid
+            self._next_uid += 1
+    
+    def _add_to_shards(self, current_index, embeddings: np.ndarray, metadata: List[Dict]) -> ShardedIndex:
+        """Send new chunks' vectors to the shard workers and return the next index facade"""
+        uids = [chunk_metadata['chunk_uid'] for chunk_metadata in metadata]
+        self.shards.add(uids, embeddings.astype('float32'), [m.get('source', 'Unknown') for m in metadata])
+        return ShardedIndex(self.shards, current_index.row_uids + uids)
+    
+    def _analyze_document(self, document: str) -> Dict:
+        """Keyword markers and key phrases of a document, computed in one pass"""
+        return {
+            'markers': DOCUMENT_MARKERS.match(document.lower()),
+            'key_phrases': self._extract_key_phrases(document)
+        }
     
-    def _enhance_document_content(self, document: str) -> str:
+    def _enhance_document_content(self, document: str, analysis: Dict = None) -> str:
         """Enhance document content for better embeddings and search"""
+        analysis = analysis or self._analyze_document(document)
+        markers = analysis['markers']
+        
         # Extract key phrases and concepts
-        key_phrases = self._extract_key_phrases(document)
+        key_phrases = analysis['key_phrases']
         
         # Add semantic markers for better understanding
         enhanced_content = document
         
         # Add content type indicators
-        if any(keyword in document.lower() for keyword in ['define', 'definition', 'is defined as']):
+        if 'definition_marker' in markers:
             enhanced_content = f"[DEFINITION] {enhanced_content}"
-        elif any(keyword in document.lower() for keyword in ['example', 'for instance', 'such as']):
+        elif 'example_marker' in markers:
             enhanced_content = f"[EXAMPLE] {enhanced_content}"
-        elif any(keyword in document.lower() for keyword in ['process', 'steps', 'procedure']):
+        elif 'process_marker' in markers:
             enhanced_content = f"[PROCESS] {enhanced_content}"
         
         # Add key phrases as searchable terms
@@ -154,81 +484,128 @@ class VectorStore:
         
         return enhanced_content
     
-    def _enhance_metadata(self, document: str, existing_metadata: Dict) -> Dict:
+    def _enhance_metadata(self, document: str, existing_metadata: Dict, analysis: Dict = None) -> Dict:
         """Enhance metadata with content analysis"""
+        analysis = analysis or self._analyze_document(document)
+        markers = analysis['markers']
         enhanced_metadata = existing_metadata.copy()
+        word_count = len(document.split())
         
         # Add content analysis
         enhanced_metadata.update({
-            'word_count': len(document.split()),
-            'sentence_count': len([s for s in document.split('.') if s.strip()]),
-            'has_definition': any(keyword in document.lower() for keyword in ['define', 'definition']),
-            'has_example': any(keyword in document.lower() for keyword in ['example', 'for instance']),
-            'has_process': any(keyword in document.lower() for keyword in ['process', 'steps']),
-            'has_list': bool(re.search(r'\d+\.\s|\•\s|\*\s', document)),
-            'content_density': len(document.split()) / max(len(document), 1),  # Words per character
-            'key_phrases': self._extract_key_phrases(document)
+            'word_count': word_count,
+            'sentence_count': sum(1 for s in document.split('.') if s.strip()),
+            'has_definition': 'has_definition' in markers,
+            'has_example': 'has_example' in markers,
+            'has_process': 'has_process' in markers,
+            'has_list': bool(LIST_PATTERN.search(document)),
+            'content_density': word_count / max(len(document), 1),  # Words per character
+            'key_phrases': analysis['key_phrases']
         })
         
         return enhanced_metadata
     
     def _extract_key_phrases(self, text: str) -> List[str]:
         """Extract key phrases from text for better searchability"""
-        # Simple key phrase extraction
-        # Look for capitalized terms, technical terms, and important phrases
-        phrases = []
-        
-        # Capitalized multi-word terms
-        cap_phrases = re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)+\b', text)
-        phrases.extend(cap_phrases)
-        
-        # Technical terms (words with underscores or camelCase)
-        tech_terms = re.findall(r'\b[a-z]+(?:_[a-z]+)+\b|\b[a-z]+[A-Z][a-z]+\b', text)
-        phrases.extend(tech_terms)
+        # Capitalized multi-word terms, technical terms and up to 5 important words
+        return key_phrases(text)  # Return top 15 phrases
+    
+    def _search_rows(self, generation: IndexGeneration, query: str, k: int,
+                     mmr_lambda: float = None) -> List[tuple]:
+        """(score, row) pairs of the best matches, diversified with MMR when mmr_lambda is given"""
+        # Generate query embedding
+        query_embedding = self.embed_text(query, generation.embedder).astype('float32')
         
-        # Important single words (longer than 5 characters, not common words)
-        important_words = re.findall(r'\b[a-zA-Z]{6,}\b', text)
-        common_words = {'system', 'process', 'example', 'definition', 'important', 'different', 'various', 'general'}
-        important_words = [word for word in important_words if word.lower() not in common_words]
-        phrases.extend(important_words[:5])  # Limit to 5 important words
+        # With MMR, fetch a wider candidate pool and pick k of them that are not redundant
+        fetch_k = k if mmr_lambda is None else max(k * 4, 20)
+        with span("vector_store.search"):
+            if self.route_sections and generation.index.ntotal > self.route_sections * SECTION_CHUNKS:
+                scores, indices = self._routed_search(generation, query_embedding, fetch_k)
+            else:
+                scores, indices = generation.index.search(
+                    query_embedding.reshape(1, -1),
+                    min(fetch_k, generation.index.ntotal)
+                )
+        matches = [(float(score), int(idx)) for score, idx in zip(scores[0], indices[0])
+                   if 0 <= idx < len(generation.documents)]
+        if mmr_lambda is None or len(matches) <= 1:
+            return matches
         
-        # Clean and deduplicate
-        unique_phrases = list(set([phrase.strip() for phrase in phrases if len(phrase.strip()) > 3]))
+        rows = [idx for _, idx in matches]
+        with span("vector_store.mmr"):
+            picked = mmr(query_embedding, self._row_vectors(generation.index, rows), k, mmr_lambda,
+                         relevance=np.array([score for score, _ in matches], dtype=np.float32))
+        return [matches[i] for i in picked]
+    
+    def _routed_search(self, generation: IndexGeneration, query_embedding: np.ndarray, k: int):
+        """Exact top-k among the chunks of the sections closest to the query, shaped like index.search"""
+        with span("vector_store.route"):
+            rows = self._routing_index(generation).route(query_embedding, self.route_sections)
+        scores = self._row_vectors(generation.index, rows.tolist()) @ query_embedding
+        top = np.argsort(-scores)[:k]
+        return scores[top].reshape(1, -1), rows[top].reshape(1, -1)
+    
+    def _routing_index(self, generation: IndexGeneration) -> RoutingIndex:
+        """Section centroids of a generation, built on its first routed search
         
-        return unique_phrases[:15]  # Return top 15 phrases
+        Sections whose chunks did not change keep the centroids computed for the
+        previous generation, so an upload only costs the new document's sections.
+        """
+        if generation.routing is None:
+            with self._routing_lock:
+                if generation.routing is None:
+                    # Centroids are only comparable when the same model embedded both generations
+                    previous = None
+                    if self._last_routing is not None and self._last_routing[0] is generation.embedder:
+                        previous = self._last_routing[1]
+                    with span("vector_store.build_routing"):
+                        generation.routing = RoutingIndex.build(
+                            generation.document_metadata,
+                            lambda rows: self._row_vectors(generation.index, rows),
+                            generation.embedder.dimension,
+                            previous=previous
+                        )
+                    self._last_routing = (generation.embedder, generation.routing)
+        return generation.routing
+    
+    def _row_vectors(self, index, rows: List[int]) -> np.ndarray:
+        """Stored vectors of some rows"""
+        if isinstance(index, ShardedIndex):
+            return index.reconstruct_rows(rows)
+        return np.asarray(self._index_vectors(index)[rows], dtype=np.float32)
     
-    def similarity_search(self, query: str, k: int = 5, threshold: float = 0.3) -> List[Dict]:
-        """Search for similar documents"""
-        if self.index.ntotal == 0:
+    def similarity_search(self, query: str, k: int = 5, threshold: float = 0.3,
+                          mmr_lambda: float = None) -> List[Dict]:
+        """Search for similar documents (diversified with MMR when mmr_lambda is given)"""
+        # Pin one generation for the whole search; concurrent writes publish a new one
+        generation = self._generation
+        if generation.index.ntotal == 0:
             return []
         
-        # Generate query embedding
-        query_embedding = self.embed_text(query)
-        
-        # Search in FAISS index
-        scores, indices = self.index.search(
-            query_embedding.reshape(1, -1).astype('float32'), 
-            min(k, self.index.ntotal)
-        )
-        
         # Filter by threshold and prepare results
         results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if score >= threshold and idx < len(self.documents):
+        for score, idx in self._search_rows(generation, query, k, mmr_lambda):
+            if score >= threshold:
                 result = Document(
-                    content=self.documents[idx],
-                    metadata=self.document_metadata[idx].copy(),
-                    similarity_score=float(score)
+                    content=generation.documents[idx],
+                    metadata=generation.document_metadata[idx].copy(),
+                    similarity_score=score
                 )
-                result.metadata['similarity_score'] = float(score)
+                result.metadata['similarity_score'] = score
                 results.append(result)
         
         return results
     
+    @traced("vector_store.retrieve_context")
     def get_relevant_context(self, query: str, max_tokens: int = 3000) -> str:
         """Get relevant context for a query, respecting token limits"""
-        relevant_docs = self.similarity_search(query, k=10)
-        
+        # Diversified so each context slot adds information instead of repeating a neighbor
+        relevant_docs = self.similarity_search(query, k=10, mmr_lambda=self.mmr_lambda)
+        return self._pack_context(relevant_docs, max_tokens)
+    
+    @traced("vector_store.context_packing")
+    def _pack_context(self, relevant_docs: List["Document"], max_tokens: int) -> str:
+        """Join retrieved chunks with their citations until the token budget is used"""
         context_parts = []
         current_tokens = 0
         
@@ -243,138 +620,503 @@ class VectorStore:
                 
                 if remaining_chars > 100:  # Only add if substantial content fits
                     partial_content = doc.content[:remaining_chars] + "..."
-                    context_parts.append(f"Source: {doc.metadata.get('source', 'Unknown')}\n{partial_content}")
+                    context_parts.append(f"Source: {self._citation(doc.metadata)}\n{partial_content}")
                 
                 break
             
-            context_parts.append(f"Source: {doc.metadata.get('source', 'Unknown')}\n{doc.content}")
+            context_parts.append(f"Source: {self._citation(doc.metadata)}\n{doc.content}")
             current_tokens += doc_tokens
         
         return "\n\n---\n\n".join(context_parts)
     
+    @staticmethod
+    def _citation(metadata: Dict) -> str:
+        """Source name, with the chunk's pages when ingestion recorded them"""
+        source = metadata.get('source', 'Unknown')
+        # A collapsed chunk cites every page it appeared on
+        pages = ', '.join(dict.fromkeys(filter(None, map(format_pages, metadata.get('locations') or [metadata]))))
+        return f"{source} ({pages})" if pages else source
+    
+    @traced("vector_store.delete_source")
     def delete_documents_by_source(self, source_name: str):
         """Delete all documents from a specific source"""
-        # Find indices to remove
-        indices_to_remove = []
-        for i, metadata in enumerate(self.document_metadata):
-            if metadata.get('source') == source_name:
-                indices_to_remove.append(i)
-        
-        if not indices_to_remove:
-            return
-        
-        # Remove from documents and metadata (in reverse order to maintain indices)
-        for idx in reversed(indices_to_remove):
-            del self.documents[idx]
-            del self.document_metadata[idx]
-        
-        # Rebuild the FAISS index
-        self._rebuild_index()
+        with self._write_lock:
+            current = self._generation
+            
+            # Find rows to keep
+            keep = [i for i, metadata in enumerate(current.document_metadata) if metadata.get('source') != source_name]
+            self.page_manifests.pop(source_name, None)
+            self.page_store.delete(source_name)
+            self.table_store.delete(source_name)
+            if len(keep) == len(current.documents):
+                return
+            
+            # Build the next index from the surviving vectors - no re-embedding needed
+            version = current.version + 1
+            if self.shards:
+                self.shards.remove_sources([source_name])
+                index = ShardedIndex(self.shards, [current.index.row_uids[i] for i in keep])
+            else:
+                index = self._create_index(version)
+                if keep:
+                    index.add(np.ascontiguousarray(self._index_vectors(current.index)[keep], dtype=np.float32))
+            
+            # Update document IDs in metadata (copies, the live generation is left untouched)
+            documents = [current.documents[i] for i in keep]
+            document_metadata = [dict(current.document_metadata[i], doc_id=new_id) for new_id, i in enumerate(keep)]
+            self._publish(index, documents, document_metadata)
+            if self.fallback_embedder:
+                self.fallback_embedder.remove([current.documents[i] for i, metadata in enumerate(current.document_metadata)
+                                               if metadata.get('source') == source_name])
+            self.keyword_index.remove(metadata.get('chunk_uid') for metadata in current.document_metadata
+                                      if metadata.get('source') == source_name)
+            self.save_index()
     
     def _rebuild_index(self):
-        """Rebuild the FAISS index from current documents"""
-        if not self.documents:
-            self.index = faiss.IndexFlatIP(self.dimension)
-            return
-        
-        # Generate embeddings for all documents
-        embeddings = self.embed_texts(self.documents)
-        
-        # Create new index
-        self.index = faiss.IndexFlatIP(self.dimension)
-        self.index.add(embeddings.astype('float32'))
-        
-        # Update document IDs in metadata
-        for i, metadata in enumerate(self.document_metadata):
-            metadata['doc_id'] = i
+        """Rebuild the FAISS index by re-embedding all current documents"""
+        with self._write_lock:
+            current = self._generation
+            index = self._create_index(current.version + 1)
+            
+            # Update document IDs in metadata
+            document_metadata = [dict(metadata, doc_id=i) for i, metadata in enumerate(current.document_metadata)]
+            
+            if current.documents:
+                # Generate embeddings for all documents
+                embeddings = self.embed_texts(list(current.documents))
+                if self.shards:
+                    self.shards.reset()
+                    index = self._add_to_shards(index, embeddings, document_metadata)
+                else:
+                    index.add(embeddings.astype('float32'))
+            self._publish(index, current.documents, document_metadata)
     
     def get_stats(self) -> Dict:
         """Get statistics about the vector store"""
+        generation = self._generation
         sources = {}
-        for metadata in self.document_metadata:
+        for metadata in generation.document_metadata:
             source = metadata.get('source', 'Unknown')
             sources[source] = sources.get(source, 0) + 1
         
-        return {
-            'total_documents': len(self.documents),
+        stats = {
+            'total_documents': len(generation.documents),
             'total_sources': len(sources),
             'sources': sources,
-            'index_size': self.index.ntotal,
-            'embedding_dimension': self.dimension
+            'index_size': generation.index.ntotal,
+            'version': generation.version,
+            'index_type': self.index_type,
+            'embedding_model': self.model_name,
+            'embedding_dimension': self.dimension,
+            'collapsed_duplicates': sum(m.get('duplicate_count', 0) for m in generation.document_metadata),
+            'keyword_terms': len(generation.keyword_index.postings)
         }
+        if self.shards:
+            stats['shards'] = self.shards.get_stats()
+        if self.migration:
+            stats['model_migration'] = self.migration.progress()
+        if generation.routing is not None:
+            stats['routing_sections'] = len(generation.routing)
+        return stats
+    
+    def resident_memory_bytes(self) -> int:
+        """Estimated memory held by this process for the current vectors and chunks"""
+        generation = self._generation
+        if self.shards:
+            vector_bytes = 0  # Held by the shard worker processes
+        elif self.index_type == "flat":
+            vector_bytes = generation.index.ntotal * generation.index.d * 4
+        else:
+            vector_bytes = generation.index.memory_usage()
+        # Chunk text is held twice (documents and keyword postings), plus about as much again for metadata
+        text_bytes = sum(len(document) for document in generation.documents)
+        return vector_bytes + 3 * text_bytes
+    
+    def close(self):
+        """Stop a running model migration and the shard workers; the saved index stays on disk"""
+        if self.migration:
+            self.migration.cancel()
+        with self._write_lock:
+            if self.shards:
+                self.shards.close()
+                self.shards = None
     
+    @traced("vector_store.save_index")
     def save_index(self):
         """Save the vector index and metadata to disk"""
         try:
-            # Create directory if it doesn't exist
-            os.makedirs(self.index_path, exist_ok=True)
-            
-            # Save FAISS index
-            faiss.write_index(self.index, os.path.join(self.index_path, "faiss_index.bin"))
-            
-            # Save documents and metadata
-            with open(os.path.join(self.index_path, "documents.pkl"), "wb") as f:
-                pickle.dump(self.documents, f)
-            
-            with open(os.path.join(self.index_path, "metadata.json"), "w") as f:
-                json.dump(self.document_metadata, f, indent=2, default=str)
+            with self._write_lock:
+                generation = self._generation
+                
+                # Create directory if it doesn't exist
+                os.makedirs(self.index_path, exist_ok=True)
+                
+                # Save FAISS index (quantized indexes keep their float vectors on disk already)
+                if self.shards:
+                    self._save_shards()
+                elif self.index_type == "flat":
+                    faiss.write_index(generation.index, self._temp_path("faiss_index.bin"))
+                    self._commit_temp("faiss_index.bin")
+                else:
+                    generation.index.save(self.index_path)
+                    self._remove_stale_vector_files(generation.index)
+                
+                # Save documents and metadata
+                with open(self._temp_path("documents.pkl"), "wb") as f:
+                    pickle.dump(list(generation.documents), f)
+                self._commit_temp("documents.pkl")
+                
+                with open(self._temp_path("metadata.json"), "w") as f:
+                    json.dump(list(generation.document_metadata), f, indent=2, default=str)
+                self._commit_temp("metadata.json")
+                
+                with open(self._temp_path("page_manifests.json"), "w") as f:
+                    json.dump(self.page_manifests, f)
+                self._commit_temp("page_manifests.json")
+                
+                # What produced the vectors, so a copied index can be checked against a store
+                with open(self._temp_path("index_info.json"), "w") as f:
+                    json.dump(self.index_info(), f, indent=2)
+                self._commit_temp("index_info.json")
+                
+                # Save fallback embedder statistics so queries embed the same way after a restart
+                if self.fallback_embedder:
+                    self.fallback_embedder.save(os.path.join(self.index_path, "hashing_idf.npz"))
             
         except Exception as e:
             # Silently handle save errors - index will be rebuilt if needed
             pass
     
+    def export_snapshot(self, bundle_path: str) -> Dict:
+        """Save the index and write it to a portable snapshot bundle (see utils/snapshot.py)
+        
+        Writers wait until the bundle is written, so it holds one consistent
+        generation; searches carry on meanwhile.
+        """
+        with self._write_lock:
+            self.save_index()
+            return export_snapshot(self.index_path, bundle_path)
+    
+    def index_info(self) -> Dict:
+        """Embedding model and index layout; vectors are only comparable between stores that agree on it"""
+        return {
+            **self.embedder.info(),
+            'index_type': self.index_type,
+            'sharded': bool(self.shards),
+            'version': self.version
+        }
+    
+    @property
+    def migration_due(self) -> bool:
+        """Whether the index was built with another model than the one this store was created with"""
+        return not self.target_embedder.matches(self.embedder.info())
+    
+    def migrate_model(self, model_name: str = None, batch_size: int = 64,
+                      max_chunks_per_second: float = None) -> ModelMigration:
+        """Start re-embedding every chunk with another model in a background thread
+        
+        Defaults to the model this store was created with. The current index keeps
+        serving, and stays writable, until the new vectors are complete; then both
+        switch over in one published generation. Progress is in get_stats().
+        """
+        with self._write_lock:
+            if self.migration and self.migration.is_running():
+                raise ValueError(f"A migration to {self.migration.model_name} is already running")
+            if model_name in (None, self.target_embedder.model_name):
+                if not self.target_embedder.model:
+                    raise ValueError(f"{self.target_embedder.model_name} is unavailable; "
+                                     "refusing to migrate to hashing fallback embeddings")
+                self.migration = ModelMigration(self, self.target_embedder.model_name, self.target_embedder,
+                                                batch_size, max_chunks_per_second)
+            else:
+                self.migration = ModelMigration(self, model_name, None, batch_size, max_chunks_per_second)
+            self.migration.start()
+            return self.migration
+    
+    def _cut_over_model(self, embedder: Embedder, vectors_by_uid: Dict[int, np.ndarray]) -> int:
+        """Publish the current chunks with another model's vectors (the last step of a ModelMigration)
+        
+        Chunks added since the migration last looked are embedded here, under the write
+        lock, so the new generation is complete. Returns how many that were.
+        """
+        shards = ShardedVectorSearch(embedder.dimension, self.num_shards) if self.num_shards > 0 else None
+        try:
+            with self._write_lock:
+                current = self._generation
+                missing = [row for row, metadata in enumerate(current.document_metadata)
+                           if metadata['chunk_uid'] not in vectors_by_uid]
+                if missing:
+                    embeddings = embedder.encode([current.documents[row] for row in missing])
+                    for row, vector in zip(missing, embeddings):
+                        vectors_by_uid[current.document_metadata[row]['chunk_uid']] = vector
+                vectors = np.zeros((len(current.documents), embedder.dimension), dtype=np.float32)
+                for row, metadata in enumerate(current.document_metadata):
+                    vectors[row] = vectors_by_uid[metadata['chunk_uid']]
+                
+                previous_shards = self.shards
+                self.shards = shards
+                try:
+                    index = self._create_index(current.version + 1, embedder.dimension)
+                    if len(vectors):
+                        if shards:
+                            index = self._add_to_shards(index, vectors, list(current.document_metadata))
+                        else:
+                            index.add(vectors)
+                except Exception:
+                    self.shards = previous_shards
+                    raise
+                self._publish(index, current.documents, current.document_metadata, embedder)
+                self._last_routing = None  # Centroids of the old model's vectors
+                self.target_embedder = embedder
+                self.save_index()
+        except Exception:
+            if shards:
+                shards.close()
+            raise
+        
+        if previous_shards:
+            closer = threading.Timer(SWAP_GRACE_SECONDS, previous_shards.close)
+            closer.daemon = True
+            closer.start()
+        return len(missing)
+    
+    def _save_shards(self):
+        """Write each shard's uids and vectors to its own file, one shard in memory at a time"""
+        shard_dir = os.path.join(self.index_path, "shards")
+        os.makedirs(shard_dir, exist_ok=True)
+        
+        saved = set()
+        for shard, (uids, vectors, _) in enumerate(self.shards.dump()):
+            filename = f"shard-{shard}.npz"
+            temp_path = os.path.join(shard_dir, f".{filename}.tmp.npz")
+            np.savez(temp_path, uids=uids, vectors=vectors)
+            os.replace(temp_path, os.path.join(shard_dir, filename))
+            saved.add(filename)
+        
+        # Drop files from an earlier run with more shards
+        for filename in os.listdir(shard_dir):
+            if filename.endswith(".npz") and filename not in saved:
+                os.remove(os.path.join(shard_dir, filename))
+    
+    def _load_shards(self, index_path: str, shards: ShardedVectorSearch, document_metadata: List[Dict]) -> ShardedIndex:
+        """Distribute saved vectors over the shard workers
+        
+        Works whatever the shard count was when the files were written, and migrates a
+        saved flat index the first time sharding is switched on.
+        """
+        row_uids = [metadata['chunk_uid'] for metadata in document_metadata]
+        uid_sources = {metadata['chunk_uid']: metadata.get('source', 'Unknown') for metadata in document_metadata}
+        
+        shards.reset()
+        shard_dir = os.path.join(index_path, "shards")
+        if os.path.isdir(shard_dir):
+            for filename in sorted(os.listdir(shard_dir)):
+                if not filename.startswith("shard-") or not filename.endswith(".npz"):
+                    continue
+                with np.load(os.path.join(shard_dir, filename)) as stored:
+                    uids, vectors = stored['uids'], stored['vectors']
+                if len(uids):
+                    shards.add(uids.tolist(), vectors, [uid_sources.get(uid, 'Unknown') for uid in uids.tolist()])
+        else:
+            flat_index = faiss.read_index(os.path.join(index_path, "faiss_index.bin"))
+            if flat_index.ntotal:
+                vectors = faiss.rev_swig_ptr(flat_index.get_xb(), flat_index.ntotal * flat_index.d)
+                vectors = vectors.reshape(flat_index.ntotal, flat_index.d)
+                shards.add(row_uids, vectors, [uid_sources[uid] for uid in row_uids])
+        
+        return ShardedIndex(shards, row_uids)
+    
+    def _temp_path(self, filename: str) -> str:
+        return os.path.join(self.index_path, f".{filename}.tmp")
+    
+    def _commit_temp(self, filename: str):
+        """Replace a saved file in one step so other processes never read a partial write"""
+        os.replace(self._temp_path(filename), os.path.join(self.index_path, filename))
+    
+    def _remove_stale_vector_files(self, index):
+        """Delete float files left behind by earlier quantized generations"""
+        current_file = os.path.basename(index.vector_path)
+        for filename in os.listdir(self.index_path):
+            if filename.startswith("vectors") and filename.endswith(".f32") and filename != current_file:
+                os.remove(os.path.join(self.index_path, filename))
+    
+    @traced("vector_store.load_index")
     def load_index(self):
         """Load the vector index and metadata from disk"""
         try:
-            faiss_path = os.path.join(self.index_path, "faiss_index.bin")
-            docs_path = os.path.join(self.index_path, "documents.pkl")
-            metadata_path = os.path.join(self.index_path, "metadata.json")
-            
-            if os.path.exists(faiss_path) and os.path.exists(docs_path) and os.path.exists(metadata_path):
-                # Load FAISS index
-                self.index = faiss.read_index(faiss_path)
-                
-                # Load documents
-                with open(docs_path, "rb") as f:
-                    self.documents = pickle.load(f)
+            with self._write_lock:
+                embedder = self._stored_embedder(self.index_path, self.target_embedder)
+                if self.shards and self.shards.dimension != embedder.dimension:
+                    self.shards.close()
+                    self.shards = ShardedVectorSearch(embedder.dimension, self.num_shards)
+                state = self._read_index(self.index_path, self.shards, embedder)
+                if state is None:
+                    return
+                index, documents, document_metadata, page_manifests = state
+                self._next_uid = max((metadata['chunk_uid'] for metadata in document_metadata), default=-1) + 1
+                self.page_manifests = page_manifests
+                self._publish(index, documents, document_metadata, embedder)
+                self._last_routing = None
                 
-                # Load metadata
-                with open(metadata_path, "r") as f:
-                    self.document_metadata = json.load(f)
-                
-                # Index loaded successfully - documents available
+                # The keyword index is rebuilt from the stored chunks rather than saved
+                self.keyword_index.clear()
+                self._index_keywords(documents, document_metadata)
+            
+            # Index loaded successfully - documents available
             
         except Exception as e:
             # Initialize empty index on error - silently handle
-            self.index = faiss.IndexFlatIP(self.dimension)
-            self.documents = []
-            self.document_metadata = []
+            with self._write_lock:
+                if self.shards:
+                    self.shards.reset()
+                self._publish(self._create_index(), (), ())
+                self.page_manifests = {}
+                self.keyword_index.clear()
+                if self.fallback_embedder:
+                    self.fallback_embedder.reset()
     
-    def search_similar(self, query: str, k: int = 5, threshold: float = 0.3) -> List[Dict]:
-        """Search for similar documents and return as dictionaries"""
-        if self.index.ntotal == 0:
-            return []
+    def _stored_embedder(self, index_path: str, embedder: Embedder) -> Embedder:
+        """The embedder that built the index saved in a directory
         
-        # Generate query embedding
-        query_embedding = self.embed_text(query)
+        That is the given one unless the directory's index_info.json names another
+        model, which is then loaded so the index can be served until it is migrated.
+        """
+        info_path = os.path.join(index_path, "index_info.json")
+        if not os.path.exists(info_path):
+            return embedder  # Saved before models were recorded
+        with open(info_path, "r") as f:
+            info = json.load(f)
+        if embedder.matches(info):
+            return embedder
         
-        # Search in FAISS index
-        scores, indices = self.index.search(
-            query_embedding.reshape(1, -1).astype('float32'), 
-            min(k, self.index.ntotal)
-        )
+        print(f"⚠️ The index in {index_path} was built with {info['model_name']} ({info['embedder']}); "
+              f"serving it with that model until it is migrated to {embedder.model_name}")
+        if info['embedder'] == 'sentence-transformers':
+            stored = load_embedder(info['model_name'])
+        else:
+            stored = Embedder(info['model_name'], dimension=info['dimension'])
+        if not stored.matches(info):
+            raise ValueError(f"{info['model_name']}, which built the index in {index_path}, is unavailable")
+        return stored
+    
+    def _read_index(self, index_path: str, shards: Optional[ShardedVectorSearch], embedder: Embedder):
+        """(index, documents, metadata, page manifests) saved in a directory, or None if nothing is saved
+        
+        Vectors go into the given shard workers and IDF statistics into the given
+        embedder's fallback; nothing else of the live store is touched.
+        """
+        faiss_path = os.path.join(index_path, "faiss_index.bin")
+        docs_path = os.path.join(index_path, "documents.pkl")
+        metadata_path = os.path.join(index_path, "metadata.json")
+        
+        if shards:
+            index_saved = os.path.isdir(os.path.join(index_path, "shards")) or os.path.exists(faiss_path)
+        elif self.index_type == "flat":
+            index_saved = os.path.exists(faiss_path)
+        else:
+            index_saved = os.path.exists(os.path.join(index_path, "quantized_index.json"))
+        
+        if not (index_saved and os.path.exists(docs_path) and os.path.exists(metadata_path)):
+            return None
+        
+        # Load documents
+        with open(docs_path, "rb") as f:
+            documents = pickle.load(f)
+        
+        # Load metadata
+        with open(metadata_path, "r") as f:
+            document_metadata = json.load(f)
+        
+        # Page manifests (stores saved before page hashing have none)
+        manifests_path = os.path.join(index_path, "page_manifests.json")
+        page_manifests = {}
+        if os.path.exists(manifests_path):
+            with open(manifests_path, "r") as f:
+                page_manifests = json.load(f)
+        
+        # Stores written before chunk uids existed get their rows numbered
+        for row, metadata in enumerate(document_metadata):
+            metadata.setdefault('chunk_uid', row)
+        
+        # Load FAISS index
+        if shards:
+            index = self._load_shards(index_path, shards, document_metadata)
+        elif self.index_type == "flat":
+            index = faiss.read_index(faiss_path)
+        else:
+            index = self._create_index(dimension=embedder.dimension)
+            if not index.load(index_path):
+                raise ValueError("Stored quantized index does not match this configuration")
+        if index.ntotal != len(documents) or getattr(index, 'd', embedder.dimension) != embedder.dimension:
+            raise ValueError(f"Stored index in {index_path} does not match its documents or its embedding model")
+        
+        # Restore fallback IDF statistics, or rebuild them from the stored documents
+        if embedder.fallback:
+            if not embedder.fallback.load(os.path.join(index_path, "hashing_idf.npz")):
+                embedder.fallback.partial_fit(list(documents))
+        
+        return index, documents, document_metadata, page_manifests
+    
+    def swap_index(self, index_path: str):
+        """Serve the index saved in another directory, e.g. an imported snapshot, without a restart
+        
+        The new index is loaded completely beside the live one (with its own shard
+        workers in sharded mode) and published in one step. Searches already running
+        finish on the old generation; the old shard workers are stopped after a grace
+        period. Raises if the directory cannot be loaded, leaving the live index as it was.
+        """
+        embedder = self._stored_embedder(index_path, self.embedder.fresh())
+        shards = ShardedVectorSearch(embedder.dimension, self.num_shards) if self.num_shards > 0 else None
+        try:
+            state = self._read_index(index_path, shards, embedder)
+            if state is None:
+                raise ValueError(f"No saved {self.index_type} index in {index_path}")
+        except Exception:
+            if shards:
+                shards.close()
+            raise
+        index, documents, document_metadata, page_manifests = state
+        keyword_index = KeywordIndex()
+        self._index_keywords(documents, document_metadata, keyword_index)
+        
+        with self._write_lock:
+            previous_shards = self.shards
+            previous_page_store = self.page_store
+            self.index_path = index_path
+            self.shards = shards
+            self.page_manifests = page_manifests
+            self._next_uid = max((metadata['chunk_uid'] for metadata in document_metadata), default=-1) + 1
+            self._publish(index, documents, document_metadata, embedder, keyword_index,
+                          PageStore(os.path.join(index_path, "pages")), TableStore(os.path.join(index_path, "tables")))
+            # Chunk uids restart with the new corpus, so its sections must not match the old ones
+            self._last_routing = None
+        
+        # The old corpus's shard workers and open page files stay up for searches still running on it
+        for close in ([previous_shards.close] if previous_shards else []) + [previous_page_store.clear]:
+            closer = threading.Timer(SWAP_GRACE_SECONDS, close)
+            closer.daemon = True
+            closer.start()
+        print(f"🔀 Now serving {len(documents)} chunks from {index_path} (version {self.version})")
+    
+    def search_similar(self, query: str, k: int = 5, threshold: float = 0.3,
+                       mmr_lambda: float = None) -> List[Dict]:
+        """Search for similar documents and return as dictionaries"""
+        # Pin one generation for the whole search; concurrent writes publish a new one
+        generation = self._generation
+        if generation.index.ntotal == 0:
+            return []
         
         # Filter by threshold and prepare results
         results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if score >= threshold and idx < len(self.documents):
-                metadata = self.document_metadata[idx].copy()
-                metadata['similarity_score'] = float(score)
+        for score, idx in self._search_rows(generation, query, k, mmr_lambda):
+            if score >= threshold:
+                metadata = generation.document_metadata[idx].copy()
+                metadata['similarity_score'] = score
                 
                 result = {
-                    'content': self.documents[idx],
+                    'content': generation.documents[idx],
                     'metadata': metadata,
-                    'similarity_score': float(score),
+                    'similarity_score': score,
                     'source': metadata.get('source', 'Unknown'),
                     'page': metadata.get('page', 'Unknown'),
                     'chunk_id': metadata.get('chunk_id', idx)
@@ -383,11 +1125,105 @@ class VectorStore:
         
         return results
     
+    @traced("vector_store.keyword_search")
+    def keyword_search(self, query: str, source: str = None, limit: int = 20, window: int = 100) -> List[Dict]:
+        """Chunks containing every word and quoted phrase of the query, with highlighted context
+        
+        Answered from the positional keyword index built at ingest, most matches first
+        (all of them when limit is None).
+        """
+        generation = self._generation
+        rows_by_uid = generation.rows_by_uid()
+        
+        results = []
+        for uid, spans in generation.keyword_index.search(query):
+            # Chunks written after this generation was pinned are not part of it yet
+            row = rows_by_uid.get(uid)
+            if row is None:
+                continue
+            metadata = generation.document_metadata[row]
+            if source and metadata.get('source') != source:
+                continue
+            
+            content = self._keyword_text(generation.documents[row])
+            match = highlight(content, spans, window)
+            results.append({
+                'content': content,
+                'context': match['context'],
+                'highlighted': match['highlighted'],
+                'matches': match['matches'],
+                'match_count': len(spans),
+                'match_position': match['matches'][0][0] if match['matches'] else -1,
+                'metadata': metadata.copy(),
+                'source': metadata.get('source', 'Unknown'),
+                'page': metadata.get('page', 'Unknown'),
+                'chunk_id': metadata.get('chunk_id', row)
+            })
+            if limit and len(results) >= limit:
+                break
+        
+        return results
+    
+    def _index_keywords(self, documents, metadata, keyword_index: KeywordIndex = None):
+        """Add chunks to the keyword index (the live one by default) under their uids"""
+        keyword_index = self.keyword_index if keyword_index is None else keyword_index
+        keyword_index.add((chunk_metadata['chunk_uid'], self._keyword_text(document))
+                               for document, chunk_metadata in zip(documents, metadata))
+    
+    @staticmethod
+    def _keyword_text(document: str) -> str:
+        """The original chunk text, without the markers added for embedding"""
+        document = CONTENT_TAG_PATTERN.sub('', document, count=1)
+        key_terms = document.rfind(KEY_TERMS_SUFFIX)
+        return document[:key_terms] if key_terms >= 0 else document
+    
+    def get_page(self, source: str, number: int) -> Optional[Dict]:
+        """Stored text of one page of an ingested source, or None"""
+        page = self._generation.page_store.get_page(source, number)
+        if page is None:
+            return None
+        return {'source': source, 'page': page.number, 'text': page.text, 'is_ocr': page.is_ocr}
+    
+    def get_citation_preview(self, source: str, chunk_id: int, context_chars: int = 200) -> Optional[Dict]:
+        """A chunk's text with the text around it on its pages, or None if the chunk is unknown"""
+        generation = self._generation
+        row = next((row for row, m in enumerate(generation.document_metadata)
+                    if m.get('source') == source and m.get('chunk_id') == chunk_id), None)
+        if row is None:
+            return None
+        metadata = generation.document_metadata[row]
+        
+        preview = {'source': source, 'citation': self._citation(metadata), 'before': '', 'after': ''}
+        start, end = metadata.get('char_start'), metadata.get('char_end')
+        page_store = generation.page_store
+        excerpt = page_store.get_text_range(source, start, end) if start is not None else ""
+        if excerpt:
+            preview['before'] = page_store.get_text_range(source, max(start - context_chars, 0), start)
+            preview['after'] = page_store.get_text_range(source, end, end + context_chars)
+        else:
+            # Chunks stored without offsets or pages only have their own text
+            excerpt = self._keyword_text(generation.documents[row])
+        preview['excerpt'] = excerpt
+        preview['tables'] = generation.table_store.tables_in_range(source, start, end) if start is not None else []
+        return preview
+    
+    def get_tables(self, source: str, page: int = None, chunk_id: int = None) -> List[Dict]:
+        """Extracted tables of a source: all of them, those on a page or those a chunk covers"""
+        generation = self._generation
+        if chunk_id is None:
+            return generation.table_store.get_tables(source, page)
+        metadata = next((m for m in generation.document_metadata
+                         if m.get('source') == source and m.get('chunk_id') == chunk_id), None)
+        if metadata is None or 'char_start' not in metadata:
+            return []
+        return generation.table_store.tables_in_range(source, metadata['char_start'], metadata['char_end'])
+    
     def get_all_chunks(self) -> List[Dict]:
         """Get all document chunks"""
+        generation = self._generation
         all_chunks = []
-        for i, doc in enumerate(self.documents):
-            metadata = self.document_metadata[i] if i < len(self.document_metadata) else {}
+        for i, doc in enumerate(generation.documents):
+            metadata = generation.document_metadata[i] if i < len(generation.document_metadata) else {}
             all_chunks.append({
                 'content': doc,
                 'source': metadata.get('source', 'Unknown'),
@@ -398,18 +1234,39 @@ class VectorStore:
 
     def clear_index(self):
         """Clear all documents from the index"""
-        self.index = faiss.IndexFlatIP(self.dimension)
-        self.documents = []
-        self.document_metadata = []
-        
-        # Remove saved files
-        try:
-            import shutil
-            if os.path.exists(self.index_path):
-                shutil.rmtree(self.index_path)
-        except Exception as e:
-            # Silently handle clear errors
-            pass
+        if self.migration:
+            self.migration.cancel()
+        with self._write_lock:
+            # An empty index needs no migration: it starts over with the requested model
+            embedder = self.target_embedder
+            if self.shards and self.shards.dimension != embedder.dimension:
+                self.shards.close()
+                self.shards = ShardedVectorSearch(embedder.dimension, self.num_shards)
+            elif self.shards:
+                self.shards.reset()
+            self._publish(self._create_index(self._generation.version + 1, embedder.dimension), (), (), embedder)
+            self.page_manifests = {}
+            self.keyword_index.clear()
+            self.page_store.clear()
+            self.table_store.clear()
+            if self.fallback_embedder:
+                self.fallback_embedder.reset()
+            
+            # Remove saved files (in-flight readers keep their open mappings), but not other namespaces
+            try:
+                import shutil
+                if os.path.exists(self.index_path):
+                    for name in os.listdir(self.index_path):
+                        path = os.path.join(self.index_path, name)
+                        if name == NAMESPACES_DIR:
+                            continue
+                        if os.path.isdir(path):
+                            shutil.rmtree(path)
+                        else:
+                            os.remove(path)
+            except Exception as e:
+                # Silently handle clear errors
+                pass
 
 
 class Document: